@@ -0,0 +1,96 @@
+"""
+NSFW LoRA Catalog Memory Benchmark
+
+Measures per-entry memory of the catalog model with tracemalloc: the original list-based
+dataclass versus the frozen, slotted NSFWLoRAModel. Entries are synthetic but shaped
+like community LoRAs (shared model ids, trigger words and creators).
+
+Usage (from backend/):
+    python benchmarks/bench_nsfw_lora_memory.py [entries]
+"""
+
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.nsfw_lora_service import NSFWLoRAModel, LoRACategory, ContentRating
+
+MODELS = ["flux-dev-uncensored", "flux-pro-uncensored", "flux2-dev", "sdxl-base", "wan-2.2"]
+TRIGGERS = ["nsfw", "nude", "adult", "explicit", "artistic", "realistic", "anime", "pose"]
+NEGATIVES = ["censored", "clothed", "covered", "modest", "low quality"]
+CREATORS = ["FluxLabs", "SDXLArt", "WANArt", "Community"]
+
+
+@dataclass
+class LegacyNSFWLoRAModel:
+    """The list-based representation the catalog used before"""
+    id: str
+    name: str
+    description: str
+    category: LoRACategory
+    rating: ContentRating
+    compatible_models: List[str]
+    strength_range: tuple
+    recommended_strength: float
+    trigger_words: List[str]
+    negative_prompts: List[str]
+    sample_prompts: List[str]
+    creator: str
+    version: str
+    file_size: str
+    download_url: Optional[str] = None
+
+
+def entry_kwargs(index: int) -> dict:
+    # Build strings at runtime, as a JSON/DB loader would, so nothing is shared by accident
+    categories = list(LoRACategory)
+    ratings = list(ContentRating)
+    return {
+        "id": f"community-lora-{index}",
+        "name": f"Community LoRA {index}",
+        "description": f"Community contributed adult LoRA number {index}",
+        "category": categories[index % len(categories)],
+        "rating": ratings[index % len(ratings)],
+        "compatible_models": ["".join(model) for model in MODELS[: 2 + index % 3]],
+        "strength_range": (0.4, 1.0),
+        "recommended_strength": 0.7,
+        "trigger_words": ["".join(word) for word in TRIGGERS[: 3 + index % 5]],
+        "negative_prompts": ["".join(word) for word in NEGATIVES],
+        "sample_prompts": [f"sample prompt {index} variant {variant}" for variant in range(3)],
+        "creator": "".join(CREATORS[index % len(CREATORS)]),
+        "version": f"{1 + index % 3}.0",
+        "file_size": f"{60 + index % 200}MB"
+    }
+
+
+def measure(factory, count: int) -> float:
+    """Average bytes retained per entry, including the parsed input it keeps alive"""
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    kwargs = [entry_kwargs(index) for index in range(count)]
+    entries = [factory(**item) for item in kwargs]
+    # Drop the loader output so only memory reachable from the entries is counted
+    del kwargs
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = current - baseline
+    del entries
+    return retained / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    legacy = measure(LegacyNSFWLoRAModel, count)
+    compact = measure(NSFWLoRAModel, count)
+    print(f"entries:            {count}")
+    print(f"legacy dataclass:   {legacy:,.0f} bytes/entry")
+    print(f"slotted dataclass:  {compact:,.0f} bytes/entry")
+    print(f"saving:             {legacy - compact:,.0f} bytes/entry ({(1 - compact / legacy) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
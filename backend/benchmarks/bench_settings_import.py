@@ -0,0 +1,57 @@
+"""
+Settings Cold-Import Benchmark
+
+Compares cold-start cost of getting at the model catalogs through `config.settings`
+(full pydantic validation at import) versus the compiled snapshot in
+settings_snapshot.py. Each sample is a fresh interpreter, so module caches never help.
+
+Usage (from the repository root or backend/):
+    python backend/benchmarks/bench_settings_import.py [runs]
+"""
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+SCENARIOS = {
+    "config (validated at import)": "import config; config.settings.video_models",
+    "snapshot (lazy section)": "import settings_snapshot; settings_snapshot.settings.video_models",
+    "python startup only": "pass"
+}
+
+
+def time_import(code: str, env: dict) -> float:
+    """Wall time of a fresh interpreter running `code`, in milliseconds"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        env = {**os.environ, "SETTINGS_SNAPSHOT_DIR": snapshot_dir, "PYTHONDONTWRITEBYTECODE": "1"}
+        subprocess.run([sys.executable, "settings_snapshot.py", snapshot_dir], cwd=REPO_ROOT, env=env, check=True)
+
+        results = {}
+        for label, code in SCENARIOS.items():
+            # One warm-up so the OS page cache is in the same state for every scenario
+            time_import(code, env)
+            samples = [time_import(code, env) for _ in range(runs)]
+            results[label] = samples
+
+    baseline = statistics.median(results["python startup only"])
+    print(f"runs per scenario: {runs}")
+    for label, samples in results.items():
+        median = statistics.median(samples)
+        print(f"{label:32s} median {median:8.1f} ms   (+{median - baseline:6.1f} ms over bare startup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Server Import-Time Profile
+
+Runs `import server` in a fresh interpreter under `python -X importtime` and reports
+the most expensive modules (cumulative microseconds, as reported by CPython) and the
+totals attributed to routes, services and third-party packages. Use it to see which
+routers are worth mounting lazily and to confirm cold-start gains.
+
+Usage (from the repository root or backend/):
+    python backend/benchmarks/profile_server_imports.py [top_n] [--eager]
+"""
+
+import os
+import sys
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+LOCAL_PACKAGES = ("routes", "services", "utils", "models", "middleware")
+
+
+def parse_importtime(stderr: str):
+    """Yield (module, self_us, cumulative_us, depth) from -X importtime output"""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        yield name.strip(), int(self_us), int(cumulative_us), depth
+
+
+def group_of(module: str) -> str:
+    package = module.split(".", 1)[0]
+    if package in LOCAL_PACKAGES:
+        return package
+    if package in ("server", "database", "settings_snapshot", "config", "model_registry"):
+        return "app"
+    return "third-party"
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    top_n = int(args[0]) if args else 25
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    if "--eager" in sys.argv:
+        env["LAZY_ROUTERS"] = "0"
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        print(completed.stderr.splitlines()[-1] if completed.stderr else "import server failed", file=sys.stderr)
+        sys.exit(completed.returncode)
+
+    records = list(parse_importtime(completed.stderr))
+    total_us = sum(self_us for _, self_us, _, _ in records)
+    by_group = defaultdict(int)
+    for module, self_us, _, _ in records:
+        by_group[group_of(module)] += self_us
+
+    print(f"modules imported: {len(records)}   total import time: {total_us / 1000:.1f} ms")
+    print("\nself time by group:")
+    for group, group_us in sorted(by_group.items(), key=lambda item: -item[1]):
+        print(f"  {group:12s} {group_us / 1000:8.1f} ms  ({group_us * 100 / max(total_us, 1):4.1f}%)")
+
+    print(f"\ntop {top_n} modules by cumulative time:")
+    for module, self_us, cumulative_us, _ in sorted(records, key=lambda record: -record[2])[:top_n]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,37 +5,53 @@ This module provides API endpoints for NSFW/adult content LoRA models,
 including model listing, compatibility checks, and content warnings.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from typing import Optional, List
 from pydantic import BaseModel, Field
 import logging
 
-from services.nsfw_lora_service import (
-    nsfw_lora_service,
-    NSFWLoRAModel,
-    LoRACategory,
-    ContentRating
-)
+from services.nsfw_lora_service import nsfw_lora_service, LoRACategory, ContentRating
+from services.nsfw_lora_search import InvalidQuery
 from middleware.auth_middleware import get_current_user
 from models.base import User
+from utils.response_cache import EncodedResponseCache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/nsfw-loras", tags=["NSFW LoRAs"])
 
+# Encoded responses for catalog-only endpoints, invalidated when the catalog changes
+catalog_response_cache = EncodedResponseCache(lambda: nsfw_lora_service.catalog_version)
+
 class LoRASearchRequest(BaseModel):
     """Request model for LoRA search"""
     model_id: Optional[str] = Field(None, description="Target model ID")
     category: Optional[str] = Field(None, description="LoRA category")
     rating: Optional[str] = Field(None, description="Content rating")
     use_case: Optional[str] = Field(None, description="Specific use case")
+    family: Optional[str] = Field(None, description="Model family (flux, sdxl, wan)")
+    query: Optional[str] = Field(None, description="Free text over name, description and trigger words")
+    sort: Optional[str] = Field(None, description="relevance, name, file_size, recommended_strength or catalog; prefix '-' for descending")
+    offset: int = Field(0, ge=0, description="Number of results to skip")
+    limit: int = Field(20, ge=1, le=100, description="Maximum results to return")
+    include_facets: bool = Field(True, description="Include facet counts for the matched set")
 
 class LoRACombinationRequest(BaseModel):
     """Request model for LoRA combination suggestions"""
     primary_lora: str = Field(..., description="Primary LoRA ID")
     model_id: str = Field(..., description="Target model ID")
 
+class LoRAPair(BaseModel):
+    """A primary/secondary LoRA pairing to score"""
+    primary: str = Field(..., description="Primary LoRA ID")
+    secondary: str = Field(..., description="Secondary LoRA ID")
+
+class LoRACombinationBatchRequest(BaseModel):
+    """Request model for batch combination scoring"""
+    pairs: List[LoRAPair] = Field(..., min_length=1, max_length=500, description="LoRA pairs to score")
+    model_id: Optional[str] = Field(None, description="Target model ID; when omitted any shared model counts")
+
 # Age verification middleware
 async def verify_adult_access(current_user: User = Depends(get_current_user)):
     """Verify user has adult content access"""
@@ -97,7 +113,8 @@ async def get_compatible_loras(
                 "sample_prompts": lora.sample_prompts,
                 "creator": lora.creator,
                 "version": lora.version,
-                "file_size": lora.file_size,
+                "file_size": lora.file_size_label,
+                "file_size_bytes": lora.file_size,
                 "content_warnings": nsfw_lora_service.get_content_warnings(lora.id)
             }
             lora_data.append(lora_dict)
@@ -116,29 +133,33 @@ async def get_compatible_loras(
 
 @router.get("/categories")
 async def get_lora_categories(
+    request: Request,
     current_user: User = Depends(verify_adult_access)
 ):
     """Get available LoRA categories"""
     try:
-        categories = [
-            {
-                "value": cat.value,
-                "label": cat.value.replace("_", " ").title(),
-                "description": {
-                    "general_nsfw": "General adult/NSFW content",
-                    "realistic_adult": "Photorealistic adult content",
-                    "anime_adult": "Anime/manga adult content",
-                    "artistic_nude": "Artistic nude and erotic art",
-                    "fetish_specific": "Fetish and kink content",
-                    "body_enhancement": "Enhanced body proportions",
-                    "pose_specific": "Intimate and explicit poses",
-                    "style_specific": "Style-focused content"
-                }.get(cat.value, "")
-            }
-            for cat in LoRACategory
-        ]
-        
-        return JSONResponse(content={"categories": categories})
+        def build():
+            categories = [
+                {
+                    "value": cat.value,
+                    "label": cat.value.replace("_", " ").title(),
+                    "description": {
+                        "general_nsfw": "General adult/NSFW content",
+                        "realistic_adult": "Photorealistic adult content",
+                        "anime_adult": "Anime/manga adult content",
+                        "artistic_nude": "Artistic nude and erotic art",
+                        "fetish_specific": "Fetish and kink content",
+                        "body_enhancement": "Enhanced body proportions",
+                        "pose_specific": "Intimate and explicit poses",
+                        "style_specific": "Style-focused content"
+                    }.get(cat.value, "")
+                }
+                for cat in LoRACategory
+            ]
+        
+            return {"categories": categories}
+        
+        return catalog_response_cache.respond(request, "categories", build)
         
     except Exception as e:
         logger.error(f"Failed to get categories: {str(e)}")
@@ -146,27 +167,31 @@ async def get_lora_categories(
 
 @router.get("/ratings")
 async def get_content_ratings(
+    request: Request,
     current_user: User = Depends(verify_adult_access)
 ):
     """Get available content ratings"""
     try:
-        ratings = [
-            {
-                "value": rating.value,
-                "label": rating.value.replace("_", " ").title(),
-                "description": {
-                    "softcore": "Suggestive content, artistic nudity",
-                    "hardcore": "Explicit adult content",
-                    "extreme": "Extreme adult content, fetish themes",
-                    "artistic_nude": "Artistic nude photography/art",
-                    "erotic_art": "Erotic and sensual art",
-                    "fetish": "Fetish and kink content"
-                }.get(rating.value, "")
-            }
-            for rating in ContentRating
-        ]
-        
-        return JSONResponse(content={"ratings": ratings})
+        def build():
+            ratings = [
+                {
+                    "value": rating.value,
+                    "label": rating.value.replace("_", " ").title(),
+                    "description": {
+                        "softcore": "Suggestive content, artistic nudity",
+                        "hardcore": "Explicit adult content",
+                        "extreme": "Extreme adult content, fetish themes",
+                        "artistic_nude": "Artistic nude photography/art",
+                        "erotic_art": "Erotic and sensual art",
+                        "fetish": "Fetish and kink content"
+                    }.get(rating.value, "")
+                }
+                for rating in ContentRating
+            ]
+        
+            return {"ratings": ratings}
+        
+        return catalog_response_cache.respond(request, "ratings", build)
         
     except Exception as e:
         logger.error(f"Failed to get ratings: {str(e)}")
@@ -179,28 +204,32 @@ async def search_loras(
 ):
     """
     Search NSFW LoRAs with multiple filters
+    
+    All given filters are combined with AND; `query` matches words (or word prefixes)
+    in the name, description and trigger words.
     """
     try:
-        results = []
-        
-        if request.model_id:
-            results = nsfw_lora_service.get_loras_by_model(request.model_id)
-        elif request.category:
-            try:
-                category_enum = LoRACategory(request.category)
-                results = nsfw_lora_service.get_loras_by_category(category_enum)
-            except ValueError:
-                raise HTTPException(status_code=400, detail=f"Invalid category: {request.category}")
-        elif request.rating:
-            try:
-                rating_enum = ContentRating(request.rating)
-                results = nsfw_lora_service.get_loras_by_rating(rating_enum)
-            except ValueError:
-                raise HTTPException(status_code=400, detail=f"Invalid rating: {request.rating}")
-        else:
-            # Get all LoRAs if no specific filter
-            all_loras = nsfw_lora_service.get_all_loras()
-            results = list(all_loras.values())
+        if request.category and request.category not in LoRACategory._value2member_map_:
+            raise HTTPException(status_code=400, detail=f"Invalid category: {request.category}")
+        if request.rating and request.rating not in ContentRating._value2member_map_:
+            raise HTTPException(status_code=400, detail=f"Invalid rating: {request.rating}")
+        
+        try:
+            results, search_result = nsfw_lora_service.search_loras(
+                {
+                    "model_id": request.model_id,
+                    "category": request.category,
+                    "rating": request.rating,
+                    "use_case": request.use_case,
+                    "family": request.family
+                },
+                text=request.query,
+                sort=request.sort,
+                offset=request.offset,
+                limit=request.limit
+            )
+        except InvalidQuery as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Convert to dict format
         lora_data = []
@@ -217,22 +246,32 @@ async def search_loras(
                 "trigger_words": lora.trigger_words,
                 "creator": lora.creator,
                 "version": lora.version,
-                "file_size": lora.file_size
+                "file_size": lora.file_size_label,
+                "file_size_bytes": lora.file_size
             }
             lora_data.append(lora_dict)
         
-        return JSONResponse(content={
+        response = {
             "search_criteria": request.dict(),
             "results": lora_data,
-            "total_count": len(lora_data)
-        })
+            "total_count": search_result.total,
+            "offset": request.offset,
+            "limit": request.limit
+        }
+        if request.include_facets:
+            response["facets"] = search_result.facets
+        
+        return JSONResponse(content=response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"LoRA search failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/recommendations/{use_case}")
 async def get_lora_recommendations(
+    request: Request,
     use_case: str,
     model_type: str = Query(default="flux", description="Model type (flux, sdxl, wan)"),
     current_user: User = Depends(verify_adult_access)
@@ -252,33 +291,38 @@ async def get_lora_recommendations(
                 detail=f"Invalid use case. Valid options: {', '.join(valid_use_cases)}"
             )
         
-        recommendations = nsfw_lora_service.get_recommended_loras(use_case, model_type)
-        
-        # Convert to dict format
-        lora_data = []
-        for lora in recommendations:
-            lora_dict = {
-                "id": lora.id,
-                "name": lora.name,
-                "description": lora.description,
-                "category": lora.category.value,
-                "rating": lora.rating.value,
-                "recommended_strength": lora.recommended_strength,
-                "trigger_words": lora.trigger_words,
-                "sample_prompts": lora.sample_prompts,
-                "creator": lora.creator,
-                "version": lora.version,
-                "content_warnings": nsfw_lora_service.get_content_warnings(lora.id)
+        def build():
+            recommendations = nsfw_lora_service.get_recommended_loras(use_case, model_type)
+        
+            # Convert to dict format
+            lora_data = []
+            for lora in recommendations:
+                lora_dict = {
+                    "id": lora.id,
+                    "name": lora.name,
+                    "description": lora.description,
+                    "category": lora.category.value,
+                    "rating": lora.rating.value,
+                    "recommended_strength": lora.recommended_strength,
+                    "trigger_words": lora.trigger_words,
+                    "sample_prompts": lora.sample_prompts,
+                    "creator": lora.creator,
+                    "version": lora.version,
+                    "content_warnings": nsfw_lora_service.get_content_warnings(lora.id)
+                }
+                lora_data.append(lora_dict)
+        
+            return {
+                "use_case": use_case,
+                "model_type": model_type,
+                "recommendations": lora_data,
+                "total_count": len(lora_data)
             }
-            lora_data.append(lora_dict)
         
-        return JSONResponse(content={
-            "use_case": use_case,
-            "model_type": model_type,
-            "recommendations": lora_data,
-            "total_count": len(lora_data)
-        })
+        return catalog_response_cache.respond(request, ("recommendations", use_case, model_type), build)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get recommendations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -294,23 +338,23 @@ async def get_lora_combinations(
     try:
         combinations = nsfw_lora_service.get_lora_combination_suggestions(request.primary_lora)
         
-        # Validate that combinations are compatible with the target model
+        # Validate that both sides of every combination support the target model
+        checks = nsfw_lora_service.compatibility.score_pairs(
+            [(request.primary_lora, combo["secondary"]) for combo in combinations],
+            request.model_id
+        )
         compatible_combinations = []
-        for combo in combinations:
-            secondary_lora_id = combo["secondary"]
-            all_loras = nsfw_lora_service.get_all_loras()
-            
-            if secondary_lora_id in all_loras:
-                secondary_lora = all_loras[secondary_lora_id]
-                if request.model_id in secondary_lora.compatible_models:
-                    compatible_combinations.append({
-                        **combo,
-                        "secondary_lora_details": {
-                            "name": secondary_lora.name,
-                            "category": secondary_lora.category.value,
-                            "rating": secondary_lora.rating.value
-                        }
-                    })
+        for combo, compatible in zip(combinations, checks["compatible"]):
+            if compatible:
+                secondary_lora = nsfw_lora_service.get_lora(combo["secondary"])
+                compatible_combinations.append({
+                    **combo,
+                    "secondary_lora_details": {
+                        "name": secondary_lora.name,
+                        "category": secondary_lora.category.value,
+                        "rating": secondary_lora.rating.value
+                    }
+                })
         
         return JSONResponse(content={
             "primary_lora": request.primary_lora,
@@ -323,8 +367,35 @@ async def get_lora_combinations(
         logger.error(f"Failed to get LoRA combinations: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/combinations/batch")
+async def score_lora_combinations(
+    request: LoRACombinationBatchRequest,
+    current_user: User = Depends(verify_adult_access)
+):
+    """
+    Score many LoRA pairings at once against the compatibility matrix
+    """
+    try:
+        pairs = [(pair.primary, pair.secondary) for pair in request.pairs]
+        results = nsfw_lora_service.score_combinations(pairs, request.model_id)
+        
+        lora_ids = list(dict.fromkeys(lora_id for pair in pairs for lora_id in pair))
+        
+        return JSONResponse(content={
+            "target_model": request.model_id,
+            "results": results,
+            "total_pairs": len(results),
+            "compatible_pairs": sum(1 for result in results if result["compatible"]),
+            "models_supporting_all": nsfw_lora_service.get_models_supporting_all(lora_ids)
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to score LoRA combinations: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/lora/{lora_id}/details")
 async def get_lora_details(
+    request: Request,
     lora_id: str,
     current_user: User = Depends(verify_adult_access)
 ):
@@ -332,93 +403,99 @@ async def get_lora_details(
     Get detailed information about a specific LoRA
     """
     try:
-        all_loras = nsfw_lora_service.get_all_loras()
+        lora = nsfw_lora_service.get_lora(lora_id)
         
-        if lora_id not in all_loras:
+        if lora is None:
             raise HTTPException(status_code=404, detail="LoRA not found")
         
-        lora = all_loras[lora_id]
-        content_warnings = nsfw_lora_service.get_content_warnings(lora_id)
-        combinations = nsfw_lora_service.get_lora_combination_suggestions(lora_id)
-        
-        lora_details = {
-            "id": lora.id,
-            "name": lora.name,
-            "description": lora.description,
-            "category": lora.category.value,
-            "rating": lora.rating.value,
-            "compatible_models": lora.compatible_models,
-            "strength_range": lora.strength_range,
-            "recommended_strength": lora.recommended_strength,
-            "trigger_words": lora.trigger_words,
-            "negative_prompts": lora.negative_prompts,
-            "sample_prompts": lora.sample_prompts,
-            "creator": lora.creator,
-            "version": lora.version,
-            "file_size": lora.file_size,
-            "content_warnings": content_warnings,
-            "combination_suggestions": combinations
-        }
+        def build():
+            content_warnings = nsfw_lora_service.get_content_warnings(lora_id)
+            combinations = nsfw_lora_service.get_lora_combination_suggestions(lora_id)
+            
+            return {
+                "id": lora.id,
+                "name": lora.name,
+                "description": lora.description,
+                "category": lora.category.value,
+                "rating": lora.rating.value,
+                "compatible_models": lora.compatible_models,
+                "strength_range": lora.strength_range,
+                "recommended_strength": lora.recommended_strength,
+                "trigger_words": lora.trigger_words,
+                "negative_prompts": lora.negative_prompts,
+                "sample_prompts": lora.sample_prompts,
+                "creator": lora.creator,
+                "version": lora.version,
+                "file_size": lora.file_size_label,
+                "file_size_bytes": lora.file_size,
+                "content_warnings": content_warnings,
+                "combination_suggestions": combinations
+            }
         
-        return JSONResponse(content=lora_details)
+        return catalog_response_cache.respond(request, ("details", lora_id), build)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get LoRA details: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/stats")
 async def get_lora_statistics(
+    request: Request,
     current_user: User = Depends(verify_adult_access)
 ):
     """
     Get statistics about available NSFW LoRAs
     """
     try:
-        all_loras = nsfw_lora_service.get_all_loras()
-        
-        stats = {
-            "total_loras": len(all_loras),
-            "by_category": {},
-            "by_rating": {},
-            "by_model_type": {
-                "flux": len(nsfw_lora_service.flux_loras),
-                "sdxl": len(nsfw_lora_service.sdxl_loras),
-                "wan": len(nsfw_lora_service.wan_loras)
-            }
-        }
+        def build():
+            all_loras = nsfw_lora_service.get_all_loras()
         
-        # Count by category
-        for category in LoRACategory:
-            category_loras = nsfw_lora_service.get_loras_by_category(category)
-            stats["by_category"][category.value] = len(category_loras)
+            stats = {
+                "total_loras": len(all_loras),
+                "by_category": {
+                    category.value: len(lora_ids)
+                    for category, lora_ids in nsfw_lora_service.ids_by_category.items()
+                },
+                "by_rating": {
+                    rating.value: len(lora_ids)
+                    for rating, lora_ids in nsfw_lora_service.ids_by_rating.items()
+                },
+                "by_model_type": {
+                    family: len(lora_ids)
+                    for family, lora_ids in nsfw_lora_service.ids_by_family.items()
+                }
+            }
         
-        # Count by rating
-        for rating in ContentRating:
-            rating_loras = nsfw_lora_service.get_loras_by_rating(rating)
-            stats["by_rating"][rating.value] = len(rating_loras)
+            return {"statistics": stats}
         
-        return JSONResponse(content={"statistics": stats})
+        return catalog_response_cache.respond(request, "stats", build)
         
     except Exception as e:
         logger.error(f"Failed to get statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check for NSFW LoRA service"""
     try:
-        all_loras = nsfw_lora_service.get_all_loras()
+        def build():
+            all_loras = nsfw_lora_service.get_all_loras()
+            families = nsfw_lora_service.ids_by_family
+            
+            return {
+                "service": "NSFW LoRA Service",
+                "status": "healthy",
+                "total_loras": len(all_loras),
+                "flux_loras": len(families.get("flux", ())),
+                "sdxl_loras": len(families.get("sdxl", ())),
+                "wan_loras": len(families.get("wan", ())),
+                "categories": len(LoRACategory),
+                "ratings": len(ContentRating)
+            }
         
-        return JSONResponse(content={
-            "service": "NSFW LoRA Service",
-            "status": "healthy",
-            "total_loras": len(all_loras),
-            "flux_loras": len(nsfw_lora_service.flux_loras),
-            "sdxl_loras": len(nsfw_lora_service.sdxl_loras),
-            "wan_loras": len(nsfw_lora_service.wan_loras),
-            "categories": len(LoRACategory),
-            "ratings": len(ContentRating)
-        })
+        return catalog_response_cache.respond(request, "health", build)
         
     except Exception as e:
         logger.error(f"NSFW LoRA service health check failed: {str(e)}")
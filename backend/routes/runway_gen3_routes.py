@@ -5,22 +5,34 @@ This module provides API endpoints for Runway Gen-3 Alpha Turbo video generation
 including text-to-video, image-to-video, task status tracking, and model management.
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks, Query, Request, Header
 from fastapi.responses import StreamingResponse, JSONResponse
-from typing import Optional, List, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
-import aiofiles
-import tempfile
+import json
+import re
+import os
+import uuid
 import asyncio
 from pathlib import Path
-import httpx
+from pydantic import ValidationError
 
 from services.runway_gen3_service import (
     runway_gen3_service,
     RunwayVideoRequest,
     TaskStatusResponse,
-    RunwayVideoResponse
+    RunwayVideoResponse,
+    RunwayBatchRequest,
+    RunwayBatchResponse
 )
+from services.runway_task_store import TERMINAL_STATUSES
+from services.runway_admission import AdmissionRejected
+from services.runway_request_dedup import IdempotencyConflict, MAX_IDEMPOTENCY_KEY_LENGTH
+from services.credit_ledger import InsufficientCredits
+from services.runway_video_cache import runway_video_cache
+from services.http_client_pool import HTTPClientPool, get_http_client_pool
+from utils.http_files import file_response, StatCache
+from utils.uploads import save_upload_streaming, UploadTooLarge
 from middleware.auth_middleware import get_current_user
 from models.base import User
 
@@ -28,6 +40,18 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/runway-gen3", tags=["Runway Gen-3"])
 
+# How long /events waits for a local event before reading the task store instead
+EVENT_STREAM_POLL_SECONDS = 5
+EVENT_STREAM_RECENT_TASKS = 20
+
+def admission_rejected(error: AdmissionRejected) -> HTTPException:
+    """429 telling the client when the generation queue should have room again"""
+    return HTTPException(
+        status_code=429,
+        detail=error.reason,
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @router.get("/health")
 async def health_check():
     """Get Runway Gen-3 service health status"""
@@ -41,6 +65,14 @@ async def health_check():
             content={"error": "Service unavailable", "details": str(e)}
         )
 
+@router.get("/http-pool/metrics")
+async def http_pool_metrics(http_pool: HTTPClientPool = Depends(get_http_client_pool)):
+    """Utilisation of the shared outbound HTTP connection pool and video cache"""
+    return JSONResponse(content={
+        "http_pool": http_pool.metrics(),
+        "video_cache": runway_video_cache.stats()
+    })
+
 @router.get("/models")
 async def list_models():
     """List available Runway models"""
@@ -72,10 +104,13 @@ async def generate_text_to_video(
     ratio: str = Form(default="16:9"),
     seed: Optional[int] = Form(None),
     model: str = Form(default="gen3a_turbo"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Generate video from text prompt using Runway Gen-3
+    Generate video from text prompt using Runway Gen-3. Retries carrying the same
+    Idempotency-Key, and identical requests while the first is still running, return
+    the existing task instead of creating a new one.
     """
     try:
         # Validate ratio
@@ -91,29 +126,28 @@ async def generate_text_to_video(
             model=model
         )
         
-        # Estimate cost and check user credits
-        cost_estimate = await runway_gen3_service.estimate_cost(duration, model)
-        if current_user.credits < cost_estimate["cost_credits"]:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient credits. Required: {cost_estimate['cost_credits']}, Available: {current_user.credits}"
-            )
-        
-        # Create generation task
+        # Create generation task; its cost is reserved against the user's credits and
+        # charged on completion (refunded on failure)
         response = await runway_gen3_service.create_video_generation_task(
             request=request,
-            user_id=str(current_user.id)
+            user_id=str(current_user.id),
+            subscription_tier=getattr(current_user, "subscription_tier", None),
+            idempotency_key=idempotency_key,
+            charge_credits=True
         )
         
-        # Deduct credits (you'll need to implement credit deduction)
-        # await deduct_user_credits(current_user.id, cost_estimate["cost_credits"])
-        
         logger.info(f"Created text-to-video task {response.task_id} for user {current_user.id}")
         
         return response
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except InsufficientCredits as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Text-to-video generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -127,10 +161,13 @@ async def generate_image_to_video(
     ratio: str = Form(default="16:9"),
     seed: Optional[int] = Form(None),
     model: str = Form(default="gen3a_turbo"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Generate video from image and text prompt using Runway Gen-3
+    Generate video from image and text prompt using Runway Gen-3. Duplicate requests
+    (same Idempotency-Key, or same parameters and image while in flight) return the
+    existing task.
     """
     try:
         # Validate image file
@@ -149,13 +186,17 @@ async def generate_image_to_video(
         temp_dir.mkdir(exist_ok=True)
         
         file_extension = Path(image_file.filename or "image.jpg").suffix
-        temp_filename = f"runway_{current_user.id}_{int(asyncio.get_event_loop().time())}{file_extension}"
+        temp_filename = f"runway_{current_user.id}_{uuid.uuid4().hex}{file_extension}"
         temp_file_path = temp_dir / temp_filename
         
         try:
-            async with aiofiles.open(temp_file_path, 'wb') as f:
-                content = await image_file.read()
-                await f.write(content)
+            # Stream to disk in chunks, hashing as we go, instead of buffering the whole image
+            try:
+                stored_upload = await save_upload_streaming(
+                    image_file, temp_file_path, max_bytes=16 * 1024 * 1024
+                )
+            except UploadTooLarge:
+                raise HTTPException(status_code=400, detail="Image file too large (max 16MB)")
             
             # Create request object
             request = RunwayVideoRequest(
@@ -166,24 +207,18 @@ async def generate_image_to_video(
                 model=model
             )
             
-            # Estimate cost and check user credits
-            cost_estimate = await runway_gen3_service.estimate_cost(duration, model)
-            if current_user.credits < cost_estimate["cost_credits"]:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Insufficient credits. Required: {cost_estimate['cost_credits']}, Available: {current_user.credits}"
-                )
-            
-            # Create generation task
+            # Create generation task; its cost is reserved against the user's credits and
+            # charged on completion (refunded on failure)
             response = await runway_gen3_service.create_video_generation_task(
                 request=request,
                 user_id=str(current_user.id),
-                image_path=str(temp_file_path)
+                image_path=str(temp_file_path),
+                image_sha256=stored_upload.sha256,
+                subscription_tier=getattr(current_user, "subscription_tier", None),
+                idempotency_key=idempotency_key,
+                charge_credits=True
             )
             
-            # Deduct credits (you'll need to implement credit deduction)
-            # await deduct_user_credits(current_user.id, cost_estimate["cost_credits"])
-            
             logger.info(f"Created image-to-video task {response.task_id} for user {current_user.id}")
             
             return response
@@ -196,10 +231,112 @@ async def generate_image_to_video(
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except InsufficientCredits as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Image-to-video generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", response_model=RunwayBatchResponse)
+async def submit_batch(
+    spec: str = Form(..., description="JSON batch spec: {\"jobs\": [...]}, or a prompt_text template with seed_range and/or ratios"),
+    image_file: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Submit many generations in one request: a list of job specs, a seed sweep or a
+    multi-ratio fan-out. The batch is validated, priced and admitted as a whole, and
+    an uploaded image is stored once and shared by every job.
+    """
+    try:
+        try:
+            batch = RunwayBatchRequest.model_validate_json(spec)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        
+        try:
+            requests = runway_gen3_service.expand_batch(batch)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        temp_file_path = None
+        stored_upload = None
+        if image_file is not None:
+            if not (image_file.content_type or "").startswith('image/'):
+                raise HTTPException(status_code=400, detail="File must be an image")
+            
+            temp_dir = Path("/tmp/runway_uploads")
+            temp_dir.mkdir(exist_ok=True)
+            file_extension = Path(image_file.filename or "image.jpg").suffix
+            temp_file_path = temp_dir / f"runway_{current_user.id}_{uuid.uuid4().hex}{file_extension}"
+        
+        try:
+            if temp_file_path is not None:
+                try:
+                    stored_upload = await save_upload_streaming(
+                        image_file, temp_file_path, max_bytes=16 * 1024 * 1024
+                    )
+                except UploadTooLarge:
+                    raise HTTPException(status_code=400, detail="Image file too large (max 16MB)")
+            
+            # Each job's cost is reserved against the user's credits and charged on completion
+            response = await runway_gen3_service.create_batch(
+                requests,
+                user_id=str(current_user.id),
+                image_path=str(temp_file_path) if temp_file_path else None,
+                image_sha256=stored_upload.sha256 if stored_upload else None,
+                subscription_tier=getattr(current_user, "subscription_tier", None),
+                charge_credits=True
+            )
+        except Exception:
+            # Clean up temp file on error
+            if temp_file_path is not None and temp_file_path.exists():
+                temp_file_path.unlink()
+            raise
+        
+        logger.info(f"Created batch {response.batch_id} with {response.accepted_jobs} tasks for user {current_user.id}")
+        
+        return response
+        
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except InsufficientCredits as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch submission failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batch/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    include_jobs: bool = Query(default=True, description="Include per-job status"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Aggregate status of a batch, with per-job task status
+    """
+    try:
+        try:
+            batch_status = await runway_gen3_service.get_batch_status(
+                batch_id, str(current_user.id), include_jobs=include_jobs
+            )
+        except LookupError:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        
+        return JSONResponse(content=batch_status)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get batch status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/task-status/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(
     task_id: str,
@@ -223,38 +360,116 @@ async def get_task_status(
         logger.error(f"Failed to get task status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/events")
+async def stream_task_events(
+    task_id: Optional[str] = Query(None, description="Watch a single task; omit to watch all of your tasks"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of task status/progress changes
+    """
+    user_id = str(current_user.id)
+    
+    if task_id:
+        task_data = await runway_gen3_service.task_store.get(task_id)
+        if task_data is None or task_data.get("user_id") != user_id:
+            raise HTTPException(status_code=404, detail="Task not found")
+    
+    def format_event(event: Dict[str, Any]) -> str:
+        payload = {key: value for key, value in event.items() if key != "user_id"}
+        return f"event: task_update\ndata: {json.dumps(payload)}\n\n"
+    
+    def state_of(event: Dict[str, Any]) -> tuple:
+        return event.get("status"), event.get("progress")
+    
+    async def stored_events() -> List[Dict[str, Any]]:
+        if task_id:
+            task_data = await runway_gen3_service.task_store.get(task_id)
+            tasks = [task_data] if task_data is not None else []
+        else:
+            tasks = await runway_gen3_service.task_store.list_by_user(user_id, limit=EVENT_STREAM_RECENT_TASKS)
+        return [runway_gen3_service.task_event(task_data) for task_data in tasks]
+    
+    async def event_streamer():
+        # Subscribe only once streaming starts, so a client that disconnects before
+        # the first chunk never leaves a subscription behind
+        if task_id:
+            subscription = runway_gen3_service.events.subscribe(task_id=task_id)
+        else:
+            subscription = runway_gen3_service.events.subscribe(user_id=user_id)
+        
+        # Last state sent per task, so store reads only emit what changed
+        sent: Dict[str, tuple] = {}
+        
+        with subscription:
+            # Snapshot after subscribing so no change falls in between
+            snapshot = await stored_events()
+            if task_id:
+                if not snapshot:
+                    return
+                yield format_event(snapshot[0])
+                if snapshot[0]["status"] in TERMINAL_STATUSES:
+                    return
+            for event in snapshot:
+                sent[event["task_id"]] = state_of(event)
+            
+            while True:
+                event = await subscription.get(timeout=EVENT_STREAM_POLL_SECONDS)
+                if event is not None:
+                    events = [event]
+                else:
+                    # The broker only sees this worker's tasks; another worker may be
+                    # running the task, so read its state from the shared store
+                    events = [
+                        stored for stored in await stored_events()
+                        if sent.get(stored["task_id"]) != state_of(stored)
+                    ]
+                    if not events:
+                        # Keep proxies and load balancers from closing an idle stream
+                        yield ": keep-alive\n\n"
+                        continue
+                
+                for event in events:
+                    sent[event["task_id"]] = state_of(event)
+                    yield format_event(event)
+                    if task_id and event["status"] in TERMINAL_STATUSES:
+                        return
+    
+    return StreamingResponse(
+        event_streamer(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @router.get("/tasks")
 async def list_user_tasks(
     current_user: User = Depends(get_current_user),
     status: Optional[str] = None,
-    limit: int = 20
+    limit: int = Query(default=20, ge=1, le=100),
+    before: Optional[str] = Query(None, description="Cursor: return tasks older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return tasks newer than this")
 ):
     """
-    List user's video generation tasks
+    List user's video generation tasks, newest first, with cursor pagination
     """
     try:
-        # Filter tasks by user and optionally by status
-        user_tasks = []
-        for task_id, task_data in runway_gen3_service.active_tasks.items():
-            if task_data.get("user_id") == str(current_user.id):
-                if status is None or task_data.get("status") == status:
-                    task_info = {
-                        "task_id": task_id,
-                        "status": task_data.get("status"),
-                        "created_at": task_data.get("created_at"),
-                        "progress": task_data.get("progress", 0),
-                        "cost_credits": task_data.get("cost_credits"),
-                        "video_url": task_data.get("video_url"),
-                        "error_message": task_data.get("error_message")
-                    }
-                    user_tasks.append(task_info)
-        
-        # Sort by creation time (newest first) and limit
-        user_tasks.sort(key=lambda x: x.get("created_at", 0), reverse=True)
-        user_tasks = user_tasks[:limit]
-        
-        return JSONResponse(content={"tasks": user_tasks, "total": len(user_tasks)})
+        if before and after:
+            raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
         
+        try:
+            page = await runway_gen3_service.list_user_tasks(
+                str(current_user.id), status=status, limit=limit, before=before, after=after
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return JSONResponse(content={**page, "total": len(page["tasks"])})
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list user tasks: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -262,10 +477,12 @@ async def list_user_tasks(
 @router.get("/video/{task_id}")
 async def stream_video(
     task_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Stream generated video content directly to the client
+    Serve generated video content from the local cache, with Range and conditional
+    request support so browsers can seek without re-downloading
     """
     try:
         task_status = await runway_gen3_service.get_task_status(task_id)
@@ -276,22 +493,26 @@ async def stream_video(
                 detail="Video not ready or failed to generate"
             )
         
-        video_url = task_status.video_url
-        
-        # Stream video from Runway's URL
-        async def video_streamer():
-            async with httpx.AsyncClient() as client:
-                async with client.stream('GET', video_url) as response:
-                    async for chunk in response.aiter_bytes():
-                        yield chunk
+        # Concurrent viewers share one upstream download
+        cached_video = await runway_video_cache.acquire(task_status.video_url)
+        try:
+            stat_result = await asyncio.to_thread(os.stat, cached_video.path)
+        except Exception:
+            runway_video_cache.release(cached_video)
+            raise
         
-        return StreamingResponse(
-            video_streamer(),
+        return file_response(
+            request,
+            str(cached_video.path),
+            stat_result,
+            etag=cached_video.etag,
             media_type="video/mp4",
             headers={
                 "Content-Disposition": f"inline; filename=runway_video_{task_id}.mp4",
-                "Cache-Control": "public, max-age=3600"
-            }
+                "Cache-Control": "private, max-age=3600"
+            },
+            # Unpin even when the viewer disconnects mid-download
+            release=lambda: runway_video_cache.release(cached_video)
         )
         
     except HTTPException:
@@ -309,26 +530,18 @@ async def cancel_task(
     Cancel a video generation task
     """
     try:
-        if task_id not in runway_gen3_service.active_tasks:
+        try:
+            await runway_gen3_service.cancel_task(task_id, str(current_user.id))
+        except LookupError:
             raise HTTPException(status_code=404, detail="Task not found")
-        
-        task_data = runway_gen3_service.active_tasks[task_id]
-        
-        # Verify task belongs to current user
-        if task_data.get("user_id") != str(current_user.id):
+        except PermissionError:
             raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Only allow cancellation of non-completed tasks
-        if task_data.get("status") in ["completed", "failed", "error", "timeout"]:
+        except ValueError:
             raise HTTPException(
                 status_code=400, 
                 detail="Cannot cancel completed or failed task"
             )
         
-        # Update task status
-        runway_gen3_service.active_tasks[task_id]["status"] = "cancelled"
-        runway_gen3_service.active_tasks[task_id]["error_message"] = "Task cancelled by user"
-        
         logger.info(f"Task {task_id} cancelled by user {current_user.id}")
         
         return JSONResponse(content={"message": "Task cancelled successfully"})
@@ -363,37 +576,53 @@ async def cleanup_old_tasks(
         raise HTTPException(status_code=500, detail=str(e))
 
 # Serve public files for image uploads
+PUBLIC_DIR = "/tmp/public"
+PUBLIC_FILENAME_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9._-]*$")
+CONTENT_ADDRESSED_PATTERN = re.compile(r"^[0-9a-f]{64}\.")
+PUBLIC_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp"
+}
+public_stat_cache = StatCache(max_entries=2048, ttl_seconds=30.0)
+# Never serve a cached stat for an image the store has just removed
+runway_gen3_service.image_store.add_removal_listener(
+    lambda path: public_stat_cache.invalidate(os.path.join(PUBLIC_DIR, path.name))
+)
+
 @router.get("/public/{filename}")
-async def serve_public_file(filename: str):
+async def serve_public_file(filename: str, request: Request):
     """Serve publicly accessible files for API consumption"""
     try:
-        file_path = Path("/tmp/public") / filename
+        # Basic security check - a plain filename cannot escape the public directory
+        if not PUBLIC_FILENAME_PATTERN.match(filename):
+            raise HTTPException(status_code=403, detail="Access denied")
         
-        if not file_path.exists():
+        file_path = os.path.join(PUBLIC_DIR, filename)
+        try:
+            cached_stat = await public_stat_cache.get(file_path)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Basic security check - prevent directory traversal
-        if not str(file_path.resolve()).startswith("/tmp/public"):
-            raise HTTPException(status_code=403, detail="Access denied")
-        
         # Determine content type based on file extension
-        content_type = "application/octet-stream"
-        if filename.lower().endswith(('.jpg', '.jpeg')):
-            content_type = "image/jpeg"
-        elif filename.lower().endswith('.png'):
-            content_type = "image/png"
-        elif filename.lower().endswith('.webp'):
-            content_type = "image/webp"
-        
-        async def file_streamer():
-            async with aiofiles.open(file_path, 'rb') as f:
-                while chunk := await f.read(8192):
-                    yield chunk
-        
-        return StreamingResponse(
-            file_streamer(),
+        content_type = PUBLIC_CONTENT_TYPES.get(Path(filename).suffix.lower(), "application/octet-stream")
+        
+        # Content-addressed uploads never change, so let caches keep them
+        if CONTENT_ADDRESSED_PATTERN.match(filename):
+            etag = f'"{filename[:64]}"'
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            etag = cached_stat.etag
+            cache_control = "public, max-age=3600"
+        
+        return file_response(
+            request,
+            file_path,
+            cached_stat.stat_result,
+            etag=etag,
             media_type=content_type,
-            headers={"Cache-Control": "public, max-age=3600"}
+            headers={"Cache-Control": cache_control}
         )
         
     except HTTPException:
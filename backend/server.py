@@ -3,10 +3,14 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from database import connect_to_mongo, db
-from config import settings
+from settings_snapshot import settings
+from utils.lazy_routers import LazyRouterRegistry, LazyRouterMiddleware
+from utils.init_graph import InitGraph
+import os
 import logging
+import importlib
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,16 +37,6 @@ from services.payment_service import PaymentService
 from services.ai_chat_service import AIChatService
 from services.ai_video_editor_service import AIVideoEditorService
 from services.elevenlabs_service import ElevenLabsService
-from services.marketing_service import marketing_service
-from services.contest_service import contest_service
-from services.showcase_service import showcase_service
-from services.video_upscaler_service import video_upscaler_service
-from services.marketplace_service import marketplace_service
-from services.artist_portfolio_service import artist_portfolio_service
-from services.video_upload_service import video_upload_service
-from services.character_singer_service import character_singer_service
-from services.software_license_service import SoftwareLicenseService
-from services.rendereel_license_service import RendereeelLicenseService
 from services.hybrid_gpu_service import get_hybrid_gpu_service
 from services.social_media_automation_service import RendereeelSocialMediaService
 
@@ -65,31 +59,31 @@ from routes.admin_system import router as admin_system_router
 from routes.ai_chat import router as ai_chat_router
 from routes.video_editor import router as video_editor_router
 from routes.music_generation import router as music_router
-from routes.marketing import router as marketing_router
-from routes.contest import router as contest_router
-from routes.showcase import router as showcase_router
-from routes.video_upscaler import router as video_upscaler_router
-from routes.marketplace import router as marketplace_router
-from routes.artist_portfolio import router as artist_portfolio_router
-from routes.video_upload import router as video_upload_router
-from routes.character_singer import router as character_singer_router
-from routes.software_license import router as software_license_router
-from routes.rendereel_license import router as rendereel_license_router
-from routes.hybrid_gpu import router as hybrid_gpu_router
-from routes.enhanced_models import router as enhanced_models_router
-from routes.enhanced_lora import router as enhanced_lora_router
 from routes.ai_chatbot import router as ai_chatbot_router
 from routes.user_catalog import router as user_catalog_router
-from routes.social_media_automation import router as social_media_automation_router
 from routes.enhanced_ai_video_editor import router as enhanced_ai_video_editor_router
 from services.comfy_studio_service import rendereel_node_studio_service
 from routes.advanced_video_generation import router as advanced_video_router
 from routes.kling_ai_routes import router as kling_ai_router
 from routes.google_ai_routes import router as google_ai_router
-from routes.runway_gen3_routes import router as runway_gen3_router
-from routes.nsfw_lora_routes import router as nsfw_lora_router
+from services.http_client_pool import http_client_pool
+from services.health_probes import health_probes
 from routes.comfyui_studio import router as rendereel_node_studio_router
 
+# Routers under a known URL prefix are imported on their first request (see
+# utils/lazy_routers.py); set LAZY_ROUTERS=0 to mount everything at startup instead
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "1").lower() not in ("0", "false", "no")
+
+# Per-service startup timeout in seconds
+SERVICE_INIT_TIMEOUT = float(os.getenv("SERVICE_INIT_TIMEOUT", "30"))
+
+def _initialize(module: str, attribute: str, method: str = "initialize"):
+    """Startup/shutdown hook that imports a service on demand and awaits one of its methods"""
+    async def hook():
+        service = getattr(importlib.import_module(module), attribute)
+        await getattr(service, method)()
+    return hook
+
 # Initialize services
 flux_service = FluxService()
 video_service = VideoGenerationService()
@@ -110,60 +104,68 @@ from services.user_catalog_service import user_catalog_service
 from services.ai_chatbot_service import RendereeelAIChatbotService
 ai_chatbot_service = RendereeelAIChatbotService()
 
+async def _ping_database():
+    await db.database.command("ping")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting AI Generation Platform...")
     
+    # Services declare what they need; independent ones initialize concurrently.
+    # Optional services keep warming in the background once the app is serving.
+    startup = InitGraph(default_timeout=SERVICE_INIT_TIMEOUT)
+    startup.add("database", connect_to_mongo)
+    startup.add("http_client_pool", http_client_pool.start)
+    startup.add("flux", flux_service.initialize, depends_on=["database", "http_client_pool"])
+    startup.add("video", video_service.initialize, depends_on=["database", "http_client_pool"])
+    startup.add("hybrid", hybrid_service.initialize, depends_on=["database"])
+    startup.add("lora", lora_service.initialize, depends_on=["database"])
+    startup.add("lora_training", lora_training_service.initialize, depends_on=["database"])
+    startup.add("lora_marketplace", lora_marketplace_service.initialize, depends_on=["database"], required=False)
+    startup.add("lora_community", lora_community_service.initialize, depends_on=["database"], required=False)
+    startup.add("forge_cloud", forge_cloud_service.initialize, depends_on=["database", "http_client_pool"])
+    startup.add("kling_lip_sync", kling_lip_sync_service.initialize,
+                depends_on=["database", "http_client_pool"], required=False)
+    startup.add("payment", payment_service.initialize, depends_on=["database"])
+    startup.add("user_catalog", user_catalog_service.initialize, depends_on=["database"])
+    startup.add("ai_chatbot", ai_chatbot_service.initialize, depends_on=["user_catalog"], required=False)
+    startup.add("hybrid_gpu", lambda: get_hybrid_gpu_service(db.database).initialize(),
+                depends_on=["database"], required=False)
+    startup.add("social_media_automation", lambda: RendereeelSocialMediaService().initialize(),
+                depends_on=["database"], required=False)
+    if not LAZY_ROUTERS:
+        startup.add("lazy_routers", lazy_routers.load_all,
+                    depends_on=["database", "http_client_pool"], timeout=SERVICE_INIT_TIMEOUT * 2)
+    app.state.startup = startup
+    
     try:
-        # Initialize database
-        await connect_to_mongo()
-        
-        # Initialize services that have initialize methods
-        await flux_service.initialize()
-        await video_service.initialize()
-        await hybrid_service.initialize()
-        await lora_service.initialize()
-        await lora_training_service.initialize()
-        await lora_marketplace_service.initialize()
-        await lora_community_service.initialize()
-        await forge_cloud_service.initialize()
-        await kling_lip_sync_service.initialize()
-        await payment_service.initialize()
-        await marketing_service.initialize()
-        await contest_service.initialize()
-        await showcase_service.initialize()
-        await video_upscaler_service.initialize()
-        await marketplace_service.initialize()
-        await artist_portfolio_service.initialize()
-        await video_upload_service.initialize()
-        await character_singer_service.initialize()
-        await user_catalog_service.initialize()
-        await ai_chatbot_service.initialize()
-        
-        # Set the chatbot service in routes
+        # Set the chatbot service in routes (it finishes warming in the background)
         from routes.ai_chatbot import set_chatbot_service
         set_chatbot_service(ai_chatbot_service)
         
-        # Initialize hybrid GPU service
-        hybrid_gpu_service = get_hybrid_gpu_service(db.database)
-        await hybrid_gpu_service.initialize()
+        await startup.run()
         
-        # Initialize social media automation service
-        social_media_service = RendereeelSocialMediaService()
-        await social_media_service.initialize()
+        # Readiness is served from these cached, background-refreshed probes
+        health_probes.register("database", _ping_database, interval=10.0, timeout=3.0)
+        await health_probes.start()
         
-        logger.info("✅ All services initialized successfully")
+        logger.info("✅ All required services initialized successfully")
         
     except Exception as e:
         logger.error(f"❌ Failed to initialize services: {e}")
+        await startup.cancel_background()
         raise
     
     yield
     
     # Shutdown
     logger.info("Shutting down AI Generation Platform...")
+    await startup.cancel_background()
+    await health_probes.stop()
+    await lazy_routers.shutdown()
+    await http_client_pool.aclose()
 
 # Create FastAPI app with lifespan
 app = FastAPI(
@@ -201,42 +203,80 @@ app.include_router(admin_system_router)
 app.include_router(ai_chat_router)
 app.include_router(video_editor_router)
 app.include_router(music_router)
-app.include_router(marketing_router, prefix="/api/marketing")
-app.include_router(contest_router, prefix="/api/contest")
-app.include_router(showcase_router, prefix="/api/showcase")
-app.include_router(video_upscaler_router, prefix="/api/video-upscaler")
-app.include_router(marketplace_router, prefix="/api/marketplace")
-app.include_router(artist_portfolio_router, prefix="/api/artist-portfolio")
-app.include_router(video_upload_router, prefix="/api/video-upload")
-app.include_router(character_singer_router, prefix="/api/character-singer")
-app.include_router(software_license_router, prefix="/api/software-license")
-app.include_router(rendereel_license_router, prefix="/api/rendereel-license")
-app.include_router(hybrid_gpu_router, prefix="/api/hybrid-gpu")
-app.include_router(enhanced_models_router, prefix="/api/enhanced-models")
-app.include_router(enhanced_lora_router, prefix="/api/enhanced-lora")
 app.include_router(user_catalog_router)
 app.include_router(ai_chatbot_router)
-app.include_router(social_media_automation_router, prefix="/api/social-media-automation")
 app.include_router(enhanced_ai_video_editor_router)
 app.include_router(rendereel_node_studio_router)
 app.include_router(advanced_video_router)
 app.include_router(kling_ai_router)
 app.include_router(google_ai_router)
-app.include_router(runway_gen3_router, prefix="/api")
-app.include_router(nsfw_lora_router, prefix="/api")
+
+# Lazily mounted routers (module, URL prefix); the service behind each one starts with it
+lazy_routers = LazyRouterRegistry(app)
+lazy_routers.add("routes.marketing", "/api/marketing",
+                 on_load=_initialize("services.marketing_service", "marketing_service"))
+lazy_routers.add("routes.contest", "/api/contest",
+                 on_load=_initialize("services.contest_service", "contest_service"))
+lazy_routers.add("routes.showcase", "/api/showcase",
+                 on_load=_initialize("services.showcase_service", "showcase_service"))
+lazy_routers.add("routes.video_upscaler", "/api/video-upscaler",
+                 on_load=_initialize("services.video_upscaler_service", "video_upscaler_service"))
+lazy_routers.add("routes.marketplace", "/api/marketplace",
+                 on_load=_initialize("services.marketplace_service", "marketplace_service"))
+lazy_routers.add("routes.artist_portfolio", "/api/artist-portfolio",
+                 on_load=_initialize("services.artist_portfolio_service", "artist_portfolio_service"))
+lazy_routers.add("routes.video_upload", "/api/video-upload",
+                 on_load=_initialize("services.video_upload_service", "video_upload_service"))
+lazy_routers.add("routes.character_singer", "/api/character-singer",
+                 on_load=_initialize("services.character_singer_service", "character_singer_service"))
+lazy_routers.add("routes.software_license", "/api/software-license")
+lazy_routers.add("routes.rendereel_license", "/api/rendereel-license")
+lazy_routers.add("routes.hybrid_gpu", "/api/hybrid-gpu")
+lazy_routers.add("routes.enhanced_models", "/api/enhanced-models")
+lazy_routers.add("routes.enhanced_lora", "/api/enhanced-lora")
+lazy_routers.add("routes.social_media_automation", "/api/social-media-automation")
+lazy_routers.add("routes.runway_gen3_routes", "/api/runway-gen3", include_prefix="/api",
+                 on_load=_initialize("services.runway_gen3_service", "runway_gen3_service"),
+                 on_shutdown=_initialize("services.runway_gen3_service", "runway_gen3_service", "shutdown"))
+lazy_routers.add("routes.nsfw_lora_routes", "/api/nsfw-loras", include_prefix="/api",
+                 on_load=_initialize("services.nsfw_lora_service", "nsfw_lora_service", "start"),
+                 on_shutdown=_initialize("services.nsfw_lora_service", "nsfw_lora_service", "stop"))
+
+# The OpenAPI schema and docs need every route, so they load all pending routers
+app.add_middleware(
+    LazyRouterMiddleware,
+    registry=lazy_routers,
+    load_all_paths=(app.openapi_url, app.docs_url, app.redoc_url)
+)
 
 # Serve uploaded files
 app.mount("/uploads", StaticFiles(directory="/app/uploads"), name="uploads")
 
-# Health check endpoint
+# Liveness body never changes, so it is encoded once
+LIVENESS_BODY = JSONResponse(content={
+    "status": "healthy",
+    "message": "AI Generation Platform is running",
+    "version": "1.0.0"
+}).body
+
+# Health check endpoints
 @app.get("/api/health")
+@app.get("/api/health/live")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "message": "AI Generation Platform is running",
-        "version": "1.0.0"
-    }
+    """Liveness: the process is up and serving requests (no dependency checks)"""
+    return Response(content=LIVENESS_BODY, media_type="application/json")
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """Readiness: cached results of the background dependency probes"""
+    readiness = health_probes.readiness()
+    startup = getattr(app.state, "startup", None)
+    if startup is not None:
+        readiness["warming"] = startup.background_pending
+    # Lazily mounted routers and their services are reported, but only load on first use
+    readiness["lazy_routers"] = lazy_routers.stats()
+    status_code = 200 if readiness["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=readiness, headers={"Cache-Control": "no-store"})
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -0,0 +1,481 @@
+"""
+Credit Ledger
+
+Credit accounting for generation endpoints, shared safely by every uvicorn worker.
+Submitting a job places a hold on the user document with one conditional update (the
+stored balance minus all holds, whichever worker placed them, must cover the cost), so
+two workers can never spend the same credits. The hold is charged when the job
+completes or released when it fails; those settlements are written behind to MongoDB
+in per-user batches on a short interval. A hold stays in place until its settlement
+has landed, so the stored balance minus holds never over-reports what can be spent.
+
+Durability: each worker appends to its own JSONL journal (`<journal_dir>/<worker>.jsonl`)
+and holds an flock on `<worker>.lock` while it runs. Holds are journaled before they are
+placed, settlements before they are acknowledged. A flush journals the batch (and
+fsyncs), applies it with one update per user guarded by the batch id, then journals
+that it was applied. On start a worker adopts the journals of workers that are gone:
+unbatched settlements are queued again, batches not known to be applied are re-sent
+with the same id (MongoDB ignores one it already saw) and holds never settled are
+released unless `hold_is_live` reports their job as still running; the worker that
+resumes such a job takes its hold over with restore().
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Applied batch ids kept on each user document for the idempotency guard
+APPLIED_BATCH_HISTORY = 50
+
+
+class InsufficientCredits(Exception):
+    """The user's available balance does not cover the reservation"""
+
+    def __init__(self, required: int, available: int):
+        super().__init__(f"Insufficient credits. Required: {required}, Available: {available}")
+        self.required = required
+        self.available = available
+
+
+class _Batch:
+    __slots__ = ("batch_id", "user_id", "delta", "txns")
+
+    def __init__(self, batch_id: str, user_id: str, delta: int, txns: List[str]):
+        self.batch_id = batch_id
+        self.user_id = user_id
+        self.delta = delta
+        self.txns = txns
+
+    @property
+    def reservation_ids(self) -> List[str]:
+        return [_reservation_of(txn) for txn in self.txns]
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"op": "batch", "batch_id": self.batch_id, "user_id": self.user_id,
+                "delta": self.delta, "txns": self.txns}
+
+
+def _reservation_of(txn: str) -> str:
+    """Settlement ids are <reservation_id>:commit or <reservation_id>:refund"""
+    return txn.rsplit(":", 1)[0]
+
+
+class CreditLedger:
+    """Holds placed atomically in MongoDB, with journaled, batched write-behind settlements"""
+
+    def __init__(
+        self,
+        journal_dir: str = "/tmp/credit_ledger",
+        flush_interval: float = 1.0,
+        collection_name: str = "users",
+        user_id_field: str = "id",
+        balance_field: str = "credits",
+        holds_field: str = "credit_holds",
+        max_journal_bytes: int = 1024 * 1024,
+        worker_id: Optional[str] = None,
+        database=None
+    ):
+        self.journal_dir = Path(journal_dir)
+        self.worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.journal_path = self.journal_dir / f"{self.worker_id}.jsonl"
+        self.flush_interval = flush_interval
+        self.collection_name = collection_name
+        self.user_id_field = user_id_field
+        self.balance_field = balance_field
+        self.holds_field = holds_field
+        self.max_journal_bytes = max_journal_bytes
+        self._database = database
+
+        # Async check whether the job behind an orphaned hold is still running
+        self.hold_is_live: Optional[Callable[[str], Awaitable[bool]]] = None
+
+        self._reservations: Dict[str, Tuple[str, int]] = {}  # reservation_id -> (user_id, amount)
+        # Settlements waiting for the next batch: user_id -> [(txn_id, delta)]
+        self._pending: Dict[str, List[Tuple[str, int]]] = {}
+        self._unapplied: Dict[str, _Batch] = {}
+        # Unsettled holds found in adopted journals: reservation_id -> (user_id, amount)
+        self._orphan_holds: Dict[str, Tuple[str, int]] = {}
+        self._journal_fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+        self.total_reserved = 0
+        self.total_committed = 0
+        self.total_refunded = 0
+        self.total_batches_applied = 0
+        self.orphan_holds_released = 0
+        self.flush_failures = 0
+
+    @property
+    def collection(self):
+        if self._database is None:
+            # Resolved lazily: the service is created before connect_to_mongo() runs
+            from database import db
+            self._database = db.database
+        return self._database[self.collection_name]
+
+    @property
+    def running(self) -> bool:
+        return self._journal_fd is not None
+
+    # Journal
+
+    def _lock_own_journal(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.journal_path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            raise RuntimeError(f"Credit ledger journal {self.journal_path} is in use by another worker")
+
+    def _open_journal(self):
+        self._journal_fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _journal(self, record: Dict[str, Any]):
+        """Append one record; a single O_APPEND write survives a process crash"""
+        if self._journal_fd is None:
+            raise RuntimeError("Credit ledger is not running")
+        os.write(self._journal_fd, (json.dumps(record, separators=(",", ":")) + "\n").encode())
+
+    def _replay(self, path: Path):
+        """Merge the outstanding work of one journal into this ledger"""
+        commits: Dict[str, Tuple[str, int]] = {}
+        batches: Dict[str, _Batch] = {}
+        applied = set()
+        holds: Dict[str, Tuple[str, int]] = {}
+        with open(path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-write; it was never acknowledged
+                    continue
+                op = record.get("op")
+                if op == "hold":
+                    holds[record["reservation_id"]] = (record["user_id"], record["amount"])
+                elif op == "commit":
+                    commits[record["txn"]] = (record["user_id"], record["delta"])
+                elif op == "batch":
+                    batches[record["batch_id"]] = _Batch(
+                        record["batch_id"], record["user_id"], record["delta"], record["txns"]
+                    )
+                elif op == "applied":
+                    applied.add(record["batch_id"])
+
+        batched = {txn for batch in batches.values() for txn in batch.txns}
+        for batch_id, batch in batches.items():
+            if batch_id not in applied:
+                self._unapplied[batch_id] = batch
+        for txn, (user_id, delta) in commits.items():
+            if txn not in batched:
+                self._pending.setdefault(user_id, []).append((txn, delta))
+        settled = {_reservation_of(txn) for txn in commits} | {_reservation_of(txn) for txn in batched}
+        for reservation_id, hold in holds.items():
+            if reservation_id not in settled and reservation_id not in self._reservations:
+                self._orphan_holds[reservation_id] = hold
+
+    def _adopt(self) -> List[Tuple[Path, int]]:
+        """
+        Replay this worker's own journal (a fixed worker_id after a restart) and those of
+        workers that are gone, i.e. whose lock can be taken. Returns the adopted journals
+        with their lock fds, to be removed once their contents are in our own journal.
+        """
+        adopted = []
+        for path in sorted(self.journal_dir.glob("*.jsonl")):
+            if path == self.journal_path:
+                self._replay(path)
+                continue
+            lock_fd = os.open(path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Its worker is still running
+                os.close(lock_fd)
+                continue
+            self._replay(path)
+            adopted.append((path, lock_fd))
+        if self._unapplied or self._pending or self._orphan_holds:
+            logger.warning(f"Credit ledger recovered {len(self._unapplied)} unapplied batches, "
+                           f"{sum(len(txns) for txns in self._pending.values())} unflushed settlements and "
+                           f"{len(self._orphan_holds)} unsettled holds from {len(adopted)} adopted journals")
+        return adopted
+
+    @staticmethod
+    def _remove_adopted(adopted: List[Tuple[Path, int]]):
+        for path, lock_fd in adopted:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".lock").unlink(missing_ok=True)
+            os.close(lock_fd)
+
+    def _compact(self):
+        """Rewrite the journal with only what is still outstanding"""
+        temp_path = self.journal_path.with_suffix(".tmp")
+        with open(temp_path, "w") as journal:
+            def write(record: Dict[str, Any]):
+                journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+            for holds in (self._reservations, self._orphan_holds):
+                for reservation_id, (user_id, amount) in holds.items():
+                    write({"op": "hold", "reservation_id": reservation_id, "user_id": user_id, "amount": amount})
+            for batch in self._unapplied.values():
+                write(batch.to_record())
+            for user_id, txns in self._pending.items():
+                for txn, delta in txns:
+                    write({"op": "commit", "txn": txn, "user_id": user_id, "delta": delta})
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.journal_path)
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+        self._open_journal()
+
+    # Lifecycle
+
+    async def start(self):
+        if self._flusher is not None:
+            return
+        await asyncio.to_thread(self._lock_own_journal)
+        adopted = await asyncio.to_thread(self._adopt)
+        # Our journal now carries everything adopted; the old files can go
+        await asyncio.to_thread(self._compact)
+        await asyncio.to_thread(self._remove_adopted, adopted)
+        self._flusher = asyncio.create_task(self._run_flusher())
+        logger.info(f"Credit ledger started (journal {self.journal_path}, flush every {self.flush_interval:g}s)")
+
+    async def stop(self):
+        """Stop the flusher after one final flush; a journal with nothing outstanding is removed"""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        await self.flush()
+        os.close(self._journal_fd)
+        self._journal_fd = None
+        if not (self._reservations or self._pending or self._unapplied or self._orphan_holds):
+            self.journal_path.unlink(missing_ok=True)
+            self.journal_path.with_suffix(".lock").unlink(missing_ok=True)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    # Reservations
+
+    def _held_expression(self) -> Dict[str, Any]:
+        """Aggregation expression: sum of all holds on the user document"""
+        return {"$sum": {"$map": {
+            "input": {"$objectToArray": {"$ifNull": [f"${self.holds_field}", {}]}},
+            "in": "$$this.v"
+        }}}
+
+    def _available_in(self, document: Optional[Dict[str, Any]]) -> int:
+        if document is None:
+            return 0
+        return (document.get(self.balance_field) or 0) - sum((document.get(self.holds_field) or {}).values())
+
+    async def available(self, user_id: str) -> int:
+        """Stored balance minus every hold (all workers)"""
+        document = await self.collection.find_one(
+            {self.user_id_field: user_id}, {self.balance_field: 1, self.holds_field: 1}
+        )
+        return self._available_in(document)
+
+    async def reserve(self, user_id: str, amount: int, reservation_id: Optional[str] = None) -> str:
+        """
+        Hold `amount` credits for a job. The check and the hold are one conditional
+        update on the user document. Raises InsufficientCredits.
+        """
+        reservation_id = reservation_id or str(uuid.uuid4())
+        if "." in reservation_id or reservation_id.startswith("$"):
+            raise ValueError(f"Invalid reservation id {reservation_id!r}")
+        if reservation_id in self._reservations:
+            raise ValueError(f"Duplicate reservation {reservation_id}")
+        # Journaled first: if we die after the update lands, the hold is found and released
+        self._journal({"op": "hold", "reservation_id": reservation_id, "user_id": user_id, "amount": amount})
+        hold_path = f"{self.holds_field}.{reservation_id}"
+        result = await self.collection.update_one(
+            {
+                self.user_id_field: user_id,
+                hold_path: {"$exists": False},
+                "$expr": {"$gte": [
+                    {"$subtract": [{"$ifNull": [f"${self.balance_field}", 0]}, self._held_expression()]},
+                    amount
+                ]}
+            },
+            {"$set": {hold_path: amount}}
+        )
+        if not result.matched_count:
+            raise InsufficientCredits(amount, await self.available(user_id))
+        self._reservations[reservation_id] = (user_id, amount)
+        self.total_reserved += 1
+        return reservation_id
+
+    def restore(self, reservation_id: str, user_id: str, amount: int) -> bool:
+        """
+        Take over the hold of a job admitted by a worker that is gone (the hold is
+        still on the user document). Returns False if it is already held here.
+        """
+        if reservation_id in self._reservations:
+            return False
+        self._journal({"op": "hold", "reservation_id": reservation_id, "user_id": user_id, "amount": amount})
+        self._orphan_holds.pop(reservation_id, None)
+        self._reservations[reservation_id] = (user_id, amount)
+        return True
+
+    def _settle(self, reservation_id: str, kind: str, delta: int) -> Tuple[str, int]:
+        if self._journal_fd is None:
+            raise RuntimeError("Credit ledger is not running")
+        user_id, reserved = self._reservations.pop(reservation_id)
+        txn = f"{reservation_id}:{kind}"
+        self._journal({"op": "commit", "txn": txn, "user_id": user_id, "delta": delta, "at": time.time()})
+        self._pending.setdefault(user_id, []).append((txn, delta))
+        return user_id, reserved
+
+    def commit(self, reservation_id: str, amount: Optional[int] = None) -> bool:
+        """
+        Charge a reservation (optionally a smaller final `amount`). Returns False if
+        it was already committed or refunded.
+        """
+        reservation = self._reservations.get(reservation_id)
+        if reservation is None:
+            return False
+        reserved = reservation[1]
+        charge = reserved if amount is None else min(amount, reserved)
+        self._settle(reservation_id, "commit", -charge)
+        self.total_committed += 1
+        return True
+
+    def refund(self, reservation_id: str) -> bool:
+        """Release a reservation without charging. Returns False if already settled."""
+        if reservation_id not in self._reservations:
+            return False
+        self._settle(reservation_id, "refund", 0)
+        self.total_refunded += 1
+        return True
+
+    # Write-behind
+
+    async def flush(self):
+        """Batch pending settlements per user, apply every unapplied batch, resolve orphaned holds"""
+        async with self._flush_lock:
+            if self._pending:
+                pending, self._pending = self._pending, {}
+                new_batches = []
+                for user_id, txns in pending.items():
+                    batch = _Batch(uuid.uuid4().hex, user_id, sum(delta for _, delta in txns),
+                                   [txn for txn, _ in txns])
+                    self._unapplied[batch.batch_id] = batch
+                    new_batches.append(batch)
+                for batch in new_batches:
+                    self._journal(batch.to_record())
+                await asyncio.to_thread(os.fsync, self._journal_fd)
+
+            applied_any = False
+            for batch in list(self._unapplied.values()):
+                try:
+                    applied = await self._apply(batch)
+                except Exception as e:
+                    self.flush_failures += 1
+                    logger.error(f"Credit ledger flush failed for user {batch.user_id}, will retry: {e}")
+                    continue
+                if not applied:
+                    self.flush_failures += 1
+                    logger.error(f"Credit ledger batch {batch.batch_id} matched no document for user "
+                                 f"{batch.user_id}; keeping it for retry")
+                    continue
+                del self._unapplied[batch.batch_id]
+                self._journal({"op": "applied", "batch_id": batch.batch_id})
+                self.total_batches_applied += 1
+                applied_any = True
+
+            if self._orphan_holds:
+                applied_any = await self._release_orphan_holds() or applied_any
+
+            # Compaction runs on the loop so no append can land in the replaced file
+            if applied_any and os.fstat(self._journal_fd).st_size > self.max_journal_bytes:
+                self._compact()
+
+    async def _apply(self, batch: _Batch) -> bool:
+        """
+        Apply a batch at most once: charge its commits and drop its holds. Returns True
+        if it is now in the user document, False if no document matched (unknown user);
+        the batch must then be kept.
+        """
+        batch_field = "credit_ledger_batches"
+        update: Dict[str, Any] = {
+            "$inc": {self.balance_field: batch.delta},
+            "$push": {batch_field: {"$each": [batch.batch_id], "$slice": -APPLIED_BATCH_HISTORY}}
+        }
+        holds = {f"{self.holds_field}.{reservation_id}": "" for reservation_id in batch.reservation_ids}
+        if holds:
+            update["$unset"] = holds
+        result = await self.collection.update_one(
+            {self.user_id_field: batch.user_id, batch_field: {"$ne": batch.batch_id}}, update
+        )
+        if result.matched_count:
+            return True
+        # Either the guard skipped a batch applied before a crash, or the user is missing
+        document = await self.collection.find_one({self.user_id_field: batch.user_id}, {batch_field: 1})
+        return document is not None and batch.batch_id in document.get(batch_field, [])
+
+    async def _release_orphan_holds(self) -> bool:
+        """Release adopted holds whose job is no longer running; returns True if any was resolved"""
+        if self.hold_is_live is None:
+            return False
+        resolved = False
+        for reservation_id, (user_id, _amount) in list(self._orphan_holds.items()):
+            try:
+                if not await self.hold_is_live(reservation_id):
+                    # Removing a hold that is already gone (or never landed) is a no-op
+                    await self.collection.update_one(
+                        {self.user_id_field: user_id},
+                        {"$unset": {f"{self.holds_field}.{reservation_id}": ""}}
+                    )
+                    self.orphan_holds_released += 1
+            except Exception as e:
+                logger.warning(f"Could not resolve orphaned credit hold {reservation_id}, will retry: {e}")
+                continue
+            # A live job's hold is taken over by whichever worker resumes it
+            self._orphan_holds.pop(reservation_id, None)
+            resolved = True
+        return resolved
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "open_reservations": len(self._reservations),
+            "reserved_credits": sum(amount for _, amount in self._reservations.values()),
+            "pending_commits": sum(len(txns) for txns in self._pending.values()),
+            "unapplied_batches": len(self._unapplied),
+            "orphan_holds": len(self._orphan_holds),
+            "total_reserved": self.total_reserved,
+            "total_committed": self.total_committed,
+            "total_refunded": self.total_refunded,
+            "total_batches_applied": self.total_batches_applied,
+            "orphan_holds_released": self.orphan_holds_released,
+            "flush_failures": self.flush_failures
+        }
+
+
+# Global service instance
+credit_ledger = CreditLedger(
+    journal_dir=os.getenv("CREDIT_LEDGER_JOURNAL_DIR", "/tmp/credit_ledger"),
+    flush_interval=float(os.getenv("CREDIT_LEDGER_FLUSH_SECONDS", "1.0")),
+    collection_name=os.getenv("CREDIT_LEDGER_COLLECTION", "users"),
+    user_id_field=os.getenv("CREDIT_LEDGER_USER_ID_FIELD", "id")
+)
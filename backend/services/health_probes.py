@@ -0,0 +1,165 @@
+"""
+Health Probe Service
+
+Readiness checks for the platform. Each dependency (database, upstream APIs) is
+probed on its own background schedule with a timeout, and the latest result is
+cached with a TTL. Readiness requests only read the cached snapshot, so load-balancer
+probing never fans out to upstream APIs or waits on them.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# A probe returns optional details on success and raises on failure
+ProbeFunction = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class ProbeResult:
+    """Outcome of the most recent run of one probe"""
+
+    __slots__ = ("status", "checked_at", "latency_ms", "details", "error")
+
+    def __init__(
+        self,
+        status: str,
+        checked_at: float,
+        latency_ms: Optional[float] = None,
+        details: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ):
+        self.status = status
+        self.checked_at = checked_at
+        self.latency_ms = latency_ms
+        self.details = details
+        self.error = error
+
+
+class HealthProbe:
+    """A registered probe and its schedule"""
+
+    __slots__ = ("name", "probe", "interval", "ttl", "timeout", "critical", "result", "task")
+
+    def __init__(self, name: str, probe: ProbeFunction, interval: float, ttl: float, timeout: float, critical: bool):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self.critical = critical
+        self.result: Optional[ProbeResult] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def status_at(self, now: float) -> str:
+        if self.result is None:
+            return "pending"
+        if now - self.result.checked_at > self.ttl:
+            return "stale"
+        return self.result.status
+
+
+class HealthProbeService:
+    """Runs probes in the background and serves cached readiness"""
+
+    def __init__(self):
+        self._probes: Dict[str, HealthProbe] = {}
+        self._running = False
+
+    def register(
+        self,
+        name: str,
+        probe: ProbeFunction,
+        interval: float = 15.0,
+        ttl: Optional[float] = None,
+        timeout: float = 5.0,
+        critical: bool = True
+    ):
+        """
+        Add (or replace) a probe. Critical probes gate readiness; others are reported
+        only. Results older than `ttl` (default three intervals) count as stale.
+        """
+        existing = self._probes.pop(name, None)
+        if existing is not None and existing.task is not None:
+            existing.task.cancel()
+        entry = HealthProbe(name, probe, interval, ttl if ttl is not None else interval * 3, timeout, critical)
+        self._probes[name] = entry
+        if self._running:
+            entry.task = asyncio.create_task(self._run(entry), name=f"health-probe:{name}")
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        for entry in self._probes.values():
+            entry.task = asyncio.create_task(self._run(entry), name=f"health-probe:{entry.name}")
+        logger.info(f"Health probes started: {', '.join(self._probes) or 'none'}")
+
+    async def stop(self):
+        self._running = False
+        tasks = [entry.task for entry in self._probes.values() if entry.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for entry in self._probes.values():
+            entry.task = None
+
+    async def _run(self, entry: HealthProbe):
+        while True:
+            await self.check(entry.name)
+            await asyncio.sleep(entry.interval)
+
+    async def check(self, name: str) -> ProbeResult:
+        """Run one probe now and cache its result"""
+        entry = self._probes[name]
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(entry.probe(), timeout=entry.timeout)
+            result = ProbeResult("healthy", time.time(), details=details)
+        except asyncio.TimeoutError:
+            result = ProbeResult("unhealthy", time.time(), error=f"timed out after {entry.timeout:g}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = ProbeResult("unhealthy", time.time(), error=str(e))
+        result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        previous = entry.result
+        if previous is None or previous.status != result.status:
+            log = logger.info if result.status == "healthy" else logger.warning
+            log(f"Health probe {name} is {result.status}" + (f": {result.error}" if result.error else ""))
+        entry.result = result
+        return result
+
+    def result(self, name: str) -> Optional[ProbeResult]:
+        """Cached result for `name`, or None if it has not run or has gone stale"""
+        entry = self._probes.get(name)
+        if entry is None or entry.status_at(time.time()) in ("pending", "stale"):
+            return None
+        return entry.result
+
+    def readiness(self) -> Dict[str, Any]:
+        """Aggregate of the cached probe results; never runs a probe"""
+        now = time.time()
+        checks = {}
+        ready = True
+        for name, entry in self._probes.items():
+            status = entry.status_at(now)
+            if entry.critical and status != "healthy":
+                ready = False
+            check = {"status": status, "critical": entry.critical}
+            result = entry.result
+            if result is not None:
+                check["checked_at"] = result.checked_at
+                check["latency_ms"] = result.latency_ms
+                if result.error:
+                    check["error"] = result.error
+            checks[name] = check
+        return {"status": "ready" if ready else "not_ready", "checks": checks, "timestamp": now}
+
+
+# Global service instance
+health_probes = HealthProbeService()
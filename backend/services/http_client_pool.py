@@ -0,0 +1,199 @@
+"""
+HTTP Client Pool
+
+One lifespan-managed httpx.AsyncClient shared by routes and services, so outbound
+requests reuse keep-alive connections instead of paying a TCP+TLS handshake each time.
+Adds per-host concurrency caps on top of httpx's global pool limits and exposes
+pool utilisation metrics. The caps are enforced in the client's transport, so they
+cover every request sent through `client` - including SDKs handed the client, such
+as the Runway SDK - and not only `stream()`/`request()`.
+"""
+
+import os
+import asyncio
+import logging
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives back its host slot when closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+class _HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Holds a per-host slot from sending a request until its response is closed"""
+
+    def __init__(self, pool: "HTTPClientPool", transport: httpx.AsyncHTTPTransport):
+        self.pool = pool
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        semaphore = self.pool._host_semaphore(host)
+        await semaphore.acquire()
+        self.pool._request_started(host)
+
+        def finished():
+            self.pool._request_finished(host)
+            semaphore.release()
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.pool.failed_requests += 1
+            finished()
+            raise
+        response.stream = _ReleasingStream(response.stream, finished)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class HTTPClientPool:
+    """Shared, pooled async HTTP client with per-host connection caps"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        per_host_limit: int = 16,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        http2: Optional[bool] = None
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.per_host_limit = per_host_limit
+        # HTTP/2 needs the optional 'h2' package
+        self.http2 = http2 if http2 is not None else importlib.util.find_spec("h2") is not None
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_in_flight: Dict[str, int] = {}
+        self.total_requests = 0
+        self.failed_requests = 0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        return httpx.AsyncClient(
+            transport=_HostLimitedTransport(self, self._transport),
+            timeout=self.timeout,
+            follow_redirects=True
+        )
+
+    async def start(self):
+        """Create the shared client (called from the application lifespan)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+            logger.info(
+                f"HTTP client pool started (max_connections={self.limits.max_connections}, "
+                f"keepalive={self.limits.max_keepalive_connections}, http2={self.http2})"
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("HTTP client pool closed")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client; created on first use when no lifespan started it"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    def _request_started(self, host: str):
+        self._host_in_flight[host] = self._host_in_flight.get(host, 0) + 1
+        self.total_requests += 1
+
+    def _request_finished(self, host: str):
+        self._host_in_flight[host] -= 1
+        if not self._host_in_flight[host]:
+            del self._host_in_flight[host]
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streaming request that holds one of the host's connection slots while open"""
+        async with self.client.stream(method, url, **kwargs) as response:
+            yield response
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Buffered request subject to the same per-host cap"""
+        async with self.stream(method, url, **kwargs) as response:
+            await response.aread()
+            return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """Pool utilisation snapshot"""
+        metrics: Dict[str, Any] = {
+            "started": self._client is not None and not self._client.is_closed,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "per_host_limit": self.per_host_limit,
+            "total_requests": self.total_requests,
+            "failed_requests": self.failed_requests,
+            "in_flight_by_host": dict(self._host_in_flight)
+        }
+        # httpcore does not publish pool stats; its private attributes may change
+        # between versions, so report them only when they look as expected
+        connections = getattr(getattr(self._transport, "_pool", None), "connections", None)
+        metrics["connection_stats_available"] = isinstance(connections, list) and all(
+            callable(getattr(connection, "is_idle", None)) for connection in connections
+        )
+        if metrics["connection_stats_available"] and self._client is not None:
+            idle = sum(1 for connection in connections if connection.is_idle())
+            metrics["open_connections"] = len(connections)
+            metrics["idle_connections"] = idle
+            metrics["active_connections"] = len(connections) - idle
+            metrics["utilisation"] = round(len(connections) / self.limits.max_connections, 3)
+        return metrics
+
+
+# Global pool instance
+http_client_pool = HTTPClientPool(
+    max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30")),
+    per_host_limit=int(os.getenv("HTTP_POOL_PER_HOST_LIMIT", "16"))
+)
+
+
+def get_http_client_pool() -> HTTPClientPool:
+    """FastAPI dependency returning the shared pool"""
+    return http_client_pool
@@ -0,0 +1,105 @@
+"""
+NSFW LoRA Compatibility Matrix
+
+Boolean LoRA x base-model matrix built once per catalog snapshot. Compatibility
+questions become NumPy row/column operations: "which models support all of these
+LoRAs" is an AND across rows, and pairwise combination checks for a whole batch are a
+single fancy-indexing expression.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Any
+
+import numpy as np
+
+
+class CompatibilityMatrix:
+    """Read-only LoRA x model compatibility matrix"""
+
+    def __init__(self, loras: Mapping[str, Any]):
+        self.lora_ids: Tuple[str, ...] = tuple(loras)
+        model_ids = dict.fromkeys(model_id for lora in loras.values() for model_id in lora.compatible_models)
+        self.model_ids: Tuple[str, ...] = tuple(model_ids)
+        self._lora_rows: Dict[str, int] = {lora_id: row for row, lora_id in enumerate(self.lora_ids)}
+        self._model_columns: Dict[str, int] = {model_id: column for column, model_id in enumerate(self.model_ids)}
+
+        matrix = np.zeros((len(self.lora_ids), len(self.model_ids)), dtype=bool)
+        for row, lora in enumerate(loras.values()):
+            matrix[row, [self._model_columns[model_id] for model_id in lora.compatible_models]] = True
+        matrix.flags.writeable = False
+        self.matrix = matrix
+        # Models supported per LoRA, used to normalise overlap scores
+        self._row_counts = matrix.sum(axis=1)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    def row(self, lora_id: str) -> Optional[int]:
+        return self._lora_rows.get(lora_id)
+
+    def column(self, model_id: str) -> Optional[int]:
+        return self._model_columns.get(model_id)
+
+    def is_compatible(self, lora_id: str, model_id: str) -> bool:
+        row = self._lora_rows.get(lora_id)
+        column = self._model_columns.get(model_id)
+        return row is not None and column is not None and bool(self.matrix[row, column])
+
+    def loras_for_model(self, model_id: str) -> List[str]:
+        column = self._model_columns.get(model_id)
+        if column is None:
+            return []
+        return [self.lora_ids[row] for row in np.flatnonzero(self.matrix[:, column])]
+
+    def models_supporting_all(self, lora_ids: Sequence[str]) -> List[str]:
+        """Base models compatible with every LoRA in `lora_ids` (unknown ids match nothing)"""
+        rows = [self._lora_rows.get(lora_id) for lora_id in lora_ids]
+        if not rows or None in rows:
+            return []
+        supported = self.matrix[rows].all(axis=0)
+        return [self.model_ids[column] for column in np.flatnonzero(supported)]
+
+    def score_pairs(self, pairs: Sequence[Tuple[str, str]], model_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Vectorised checks for many (primary, secondary) pairs at once.
+        Returns arrays aligned with `pairs`: `known` (both ids exist), `compatible`
+        (both support `model_id`, or share any model when no model is given),
+        `shared_models` and `overlap` (Jaccard index of the supported model sets).
+        """
+        count = len(pairs)
+        primary_rows = np.fromiter((self._lora_rows.get(primary, -1) for primary, _ in pairs), dtype=np.intp, count=count)
+        secondary_rows = np.fromiter((self._lora_rows.get(secondary, -1) for _, secondary in pairs), dtype=np.intp, count=count)
+        known = (primary_rows >= 0) & (secondary_rows >= 0)
+        # Index safely, then mask out rows for unknown ids
+        primary_rows = np.where(known, primary_rows, 0)
+        secondary_rows = np.where(known, secondary_rows, 0)
+
+        primary = self.matrix[primary_rows]
+        secondary = self.matrix[secondary_rows]
+        shared = (primary & secondary).sum(axis=1)
+        union = self._row_counts[primary_rows] + self._row_counts[secondary_rows] - shared
+        overlap = np.divide(shared, union, out=np.zeros(count, dtype=float), where=union > 0)
+
+        if model_id is None:
+            compatible = shared > 0
+        else:
+            column = self._model_columns.get(model_id)
+            if column is None:
+                compatible = np.zeros(count, dtype=bool)
+            else:
+                compatible = primary[:, column] & secondary[:, column]
+
+        return {
+            "known": known,
+            "compatible": compatible & known,
+            "shared_models": np.where(known, shared, 0),
+            "overlap": np.where(known, overlap, 0.0)
+        }
+
+    def shared_models(self, primary_id: str, secondary_id: str) -> List[str]:
+        primary = self._lora_rows.get(primary_id)
+        secondary = self._lora_rows.get(secondary_id)
+        if primary is None or secondary is None:
+            return []
+        both = self.matrix[primary] & self.matrix[secondary]
+        return [self.model_ids[column] for column in np.flatnonzero(both)]
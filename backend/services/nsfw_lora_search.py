@@ -0,0 +1,175 @@
+"""
+NSFW LoRA Search Index
+
+Query engine over one catalog snapshot: AND-combined facets answered by intersecting
+precomputed posting sets (smallest first), prefix-matched free text over an inverted
+token index, facet counts for the matched set, sorting and pagination.
+"""
+
+import re
+import bisect
+from typing import Dict, List, Optional, Any, Mapping, FrozenSet, Iterable, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Relevance weight of a token by the field it came from
+FIELD_WEIGHTS = (("name", 3), ("trigger_words", 2), ("id", 2), ("description", 1))
+
+FACETS = ("family", "model_id", "category", "rating", "use_case")
+
+SORT_FIELDS = ("relevance", "name", "file_size", "recommended_strength", "catalog")
+
+
+class InvalidQuery(ValueError):
+    """Raised for unknown sort fields or malformed paging"""
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LoRASearchResult:
+    """One page of matches plus the facet counts of the whole match set"""
+
+    __slots__ = ("ids", "total", "facets")
+
+    def __init__(self, ids: List[str], total: int, facets: Dict[str, Dict[str, int]]):
+        self.ids = ids
+        self.total = total
+        self.facets = facets
+
+
+class LoRASearchIndex:
+    """Immutable search structures for one catalog snapshot"""
+
+    def __init__(self, loras: Mapping[str, Any], family_by_id: Mapping[str, str],
+                 use_cases: Mapping[str, Iterable[str]]):
+        self._loras = loras
+        self._position = {lora_id: position for position, lora_id in enumerate(loras)}
+        self._all: FrozenSet[str] = frozenset(loras)
+
+        postings: Dict[str, Dict[str, set]] = {facet: {} for facet in FACETS}
+        for lora_id, lora in loras.items():
+            postings["family"].setdefault(family_by_id[lora_id], set()).add(lora_id)
+            for model_id in lora.compatible_models:
+                postings["model_id"].setdefault(model_id, set()).add(lora_id)
+            postings["category"].setdefault(lora.category.value, set()).add(lora_id)
+            postings["rating"].setdefault(lora.rating.value, set()).add(lora_id)
+        for use_case, lora_ids in use_cases.items():
+            postings["use_case"][use_case] = {lora_id for lora_id in lora_ids if lora_id in loras}
+        self._postings: Dict[str, Dict[str, FrozenSet[str]]] = {
+            facet: {value: frozenset(ids) for value, ids in values.items()}
+            for facet, values in postings.items()
+        }
+        # Reverse map for facet counting: id -> values per facet
+        self._facet_values: Dict[str, Dict[str, Tuple[str, ...]]] = {lora_id: {} for lora_id in loras}
+        for facet, values in self._postings.items():
+            for value, ids in values.items():
+                for lora_id in ids:
+                    current = self._facet_values[lora_id].get(facet, ())
+                    self._facet_values[lora_id][facet] = current + (value,)
+
+        token_weights: Dict[str, Dict[str, int]] = {}
+        for lora_id, lora in loras.items():
+            for field_name, weight in FIELD_WEIGHTS:
+                value = getattr(lora, field_name)
+                text = " ".join(value) if isinstance(value, tuple) else value
+                for token in tokenize(text):
+                    weights = token_weights.setdefault(token, {})
+                    weights[lora_id] = max(weights.get(lora_id, 0), weight)
+        self._token_weights = token_weights
+        self._tokens = sorted(token_weights)
+
+        self._sort_keys = {
+            "name": {lora_id: lora.name.lower() for lora_id, lora in loras.items()},
+            "file_size": {lora_id: lora.file_size for lora_id, lora in loras.items()},
+            "recommended_strength": {lora_id: lora.recommended_strength for lora_id, lora in loras.items()},
+            "catalog": self._position
+        }
+
+    def facet_values(self, facet: str) -> Tuple[str, ...]:
+        return tuple(self._postings[facet])
+
+    def _match_token(self, token: str) -> Dict[str, float]:
+        """Ids whose indexed tokens start with `token`, with their best field weight"""
+        exact = self._token_weights.get(token)
+        start = bisect.bisect_left(self._tokens, token)
+        matches: Dict[str, float] = dict(exact) if exact else {}
+        for candidate in self._tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            if candidate == token:
+                continue
+            for lora_id, weight in self._token_weights[candidate].items():
+                # Prefix hits rank just below whole-word hits
+                matches[lora_id] = max(matches.get(lora_id, 0), weight - 0.5)
+        return matches
+
+    def search(
+        self,
+        filters: Mapping[str, Optional[str]],
+        text: Optional[str] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> LoRASearchResult:
+        """
+        Run a query. `filters` maps facet name -> required value (None = unfiltered).
+        `sort` is one of SORT_FIELDS, optionally prefixed with "-" for descending.
+        """
+        if offset < 0 or limit < 0:
+            raise InvalidQuery("offset and limit must be non-negative")
+        descending = bool(sort) and sort.startswith("-")
+        sort_field = (sort or "").lstrip("-") or ("relevance" if text else "catalog")
+        if sort_field not in SORT_FIELDS:
+            raise InvalidQuery(f"Invalid sort: {sort}. Valid options: {', '.join(SORT_FIELDS)}")
+
+        candidate_sets: List[FrozenSet[str]] = []
+        for facet, value in filters.items():
+            if value is None:
+                continue
+            if facet not in self._postings:
+                raise InvalidQuery(f"Unknown facet: {facet}")
+            candidate_sets.append(self._postings[facet].get(value, frozenset()))
+
+        scores: Dict[str, float] = {}
+        for token in tokenize(text or ""):
+            matches = self._match_token(token)
+            candidate_sets.append(frozenset(matches))
+            for lora_id, weight in matches.items():
+                scores[lora_id] = scores.get(lora_id, 0) + weight
+
+        if candidate_sets:
+            # Intersect from the smallest posting set so the work is bounded by it
+            candidate_sets.sort(key=len)
+            matched = set(candidate_sets[0])
+            for posting in candidate_sets[1:]:
+                if not matched:
+                    break
+                matched.intersection_update(posting)
+        else:
+            matched = set(self._all)
+
+        facets: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+        for lora_id in matched:
+            for facet, values in self._facet_values[lora_id].items():
+                counts = facets[facet]
+                for value in values:
+                    counts[value] = counts.get(value, 0) + 1
+        facets = {
+            facet: dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+            for facet, counts in facets.items()
+        }
+
+        position = self._position
+        if sort_field == "relevance":
+            # Best score first; catalog order breaks ties
+            ordered = sorted(matched, key=lambda lora_id: (-scores.get(lora_id, 0), position[lora_id]))
+            if descending:
+                ordered.reverse()
+        else:
+            keys = self._sort_keys[sort_field]
+            ordered = sorted(matched, key=lambda lora_id: (keys[lora_id], position[lora_id]),
+                             reverse=descending)
+
+        return LoRASearchResult(ordered[offset:offset + limit], len(matched), facets)
@@ -3,15 +3,29 @@ NSFW LoRA Service
 
 This service manages NSFW/adult content LoRA models for FLUX, SDXL, and WAN 2.2 models.
 Provides professional adult content generation capabilities with proper age verification.
+The catalog itself is data (backend/data/nsfw_loras.json or a MongoDB collection).
 """
 
+import os
+import re
+import sys
+import json
+import asyncio
+import hashlib
 import logging
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Optional, Any, Mapping, Tuple, FrozenSet, Union, Iterable
+from dataclasses import dataclass, field
 from enum import Enum
 
+from services.nsfw_lora_search import LoRASearchIndex, LoRASearchResult
+from services.nsfw_lora_compat import CompatibilityMatrix
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parent.parent / "data" / "nsfw_loras.json"
+
 class ContentRating(Enum):
     """Content rating levels for adult content"""
     SOFTCORE = "softcore"
@@ -32,551 +46,473 @@ class LoRACategory(Enum):
     POSE_SPECIFIC = "pose_specific"
     STYLE_SPECIFIC = "style_specific"
 
-@dataclass
+_FILE_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+_FILE_SIZE_UNITS = ("", "K", "M", "G", "T")
+
+def parse_file_size(value: Union[str, int]) -> int:
+    """Parse a size like "144MB" (binary multiples) into a byte count"""
+    if isinstance(value, int):
+        return value
+    match = _FILE_SIZE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid file size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** _FILE_SIZE_UNITS.index(unit.upper()))
+
+def format_file_size(size_bytes: int) -> str:
+    """Format a byte count the way the catalog writes sizes ("144MB", "1.5GB")"""
+    size = float(size_bytes)
+    for unit in _FILE_SIZE_UNITS:
+        if size < 1024 or unit == _FILE_SIZE_UNITS[-1]:
+            break
+        size /= 1024
+    return f"{size:.1f}".rstrip("0").rstrip(".") + f"{unit}B"
+
+def _intern_all(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(value) for value in values)
+
+@dataclass(frozen=True, slots=True)
 class NSFWLoRAModel:
-    """NSFW LoRA Model configuration"""
+    """
+    NSFW LoRA Model configuration.
+    Immutable and slotted: sequences are stored as tuples, repeated strings are
+    interned and `file_size` is held as a byte count (accepts "144MB" on input).
+    """
     id: str
     name: str
     description: str
     category: LoRACategory
     rating: ContentRating
-    compatible_models: List[str]
-    strength_range: tuple
+    compatible_models: Tuple[str, ...]
+    strength_range: Tuple[float, float]
     recommended_strength: float
-    trigger_words: List[str]
-    negative_prompts: List[str]
-    sample_prompts: List[str]
+    trigger_words: Tuple[str, ...]
+    negative_prompts: Tuple[str, ...]
+    sample_prompts: Tuple[str, ...]
     creator: str
     version: str
-    file_size: str
+    file_size: int
     download_url: Optional[str] = None
+    compatible_model_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
     
-class NSFWLoRAService:
-    """Service for managing NSFW LoRA models"""
+    def __post_init__(self):
+        # Frozen dataclass: normalise fields through object.__setattr__
+        set_field = object.__setattr__
+        set_field(self, "id", sys.intern(self.id))
+        set_field(self, "creator", sys.intern(self.creator))
+        set_field(self, "version", sys.intern(self.version))
+        set_field(self, "compatible_models", _intern_all(self.compatible_models))
+        set_field(self, "strength_range", tuple(self.strength_range))
+        set_field(self, "trigger_words", _intern_all(self.trigger_words))
+        set_field(self, "negative_prompts", _intern_all(self.negative_prompts))
+        set_field(self, "sample_prompts", tuple(self.sample_prompts))
+        set_field(self, "file_size", parse_file_size(self.file_size))
+        set_field(self, "compatible_model_set", frozenset(self.compatible_models))
     
-    def __init__(self):
-        self.flux_loras = self._initialize_flux_loras()
-        self.sdxl_loras = self._initialize_sdxl_loras()
-        self.wan_loras = self._initialize_wan_loras()
-        
-    def _initialize_flux_loras(self) -> Dict[str, NSFWLoRAModel]:
-        """Initialize FLUX NSFW LoRA models"""
-        return {
-            # === FLUX REALISTIC ADULT LORAS ===
-            "flux-realistic-adult-v2": NSFWLoRAModel(
-                id="flux-realistic-adult-v2",
-                name="FLUX Realistic Adult v2.0",
-                description="High-quality photorealistic adult content generation",
-                category=LoRACategory.REALISTIC_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux2-dev", "flux2-pro"],
-                strength_range=(0.4, 1.0),
-                recommended_strength=0.7,
-                trigger_words=["nsfw", "nude", "naked", "adult", "explicit"],
-                negative_prompts=["censored", "clothed", "covered", "modest"],
-                sample_prompts=[
-                    "beautiful nude woman, photorealistic, soft lighting, nsfw",
-                    "attractive nude couple, intimate pose, bedroom setting, adult content",
-                    "sensual nude portrait, artistic lighting, explicit"
-                ],
-                creator="FluxLabs",
-                version="2.0",
-                file_size="144MB"
-            ),
-            
-            "flux-intimate-poses": NSFWLoRAModel(
-                id="flux-intimate-poses",
-                name="FLUX Intimate Poses",
-                description="Specialized for intimate and explicit poses",
-                category=LoRACategory.POSE_SPECIFIC,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux-ultra-uncensored"],
-                strength_range=(0.5, 0.9),
-                recommended_strength=0.8,
-                trigger_words=["intimate", "explicit pose", "sexual position", "adult pose"],
-                negative_prompts=["standing", "sitting normally", "casual pose"],
-                sample_prompts=[
-                    "couple in intimate pose, explicit, bedroom, nsfw",
-                    "woman in seductive pose, nude, sexual position",
-                    "adult content, intimate embrace, explicit pose"
-                ],
-                creator="PoseStudio",
-                version="1.5",
-                file_size="98MB"
-            ),
-            
-            "flux-body-enhancement": NSFWLoRAModel(
-                id="flux-body-enhancement", 
-                name="FLUX Body Enhancement",
-                description="Enhanced body proportions and features for adult content",
-                category=LoRACategory.BODY_ENHANCEMENT,
-                rating=ContentRating.SOFTCORE,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux2-dev"],
-                strength_range=(0.3, 0.8),
-                recommended_strength=0.6,
-                trigger_words=["enhanced", "perfect body", "ideal proportions", "beautiful figure"],
-                negative_prompts=["average", "normal proportions", "plain"],
-                sample_prompts=[
-                    "woman with perfect body proportions, enhanced figure, nude",
-                    "ideal female form, beautiful curves, artistic nude",
-                    "enhanced body, perfect anatomy, sensual pose"
-                ],
-                creator="BodyArt",
-                version="1.3",
-                file_size="76MB"
-            ),
-            
-            "flux-erotic-art": NSFWLoRAModel(
-                id="flux-erotic-art",
-                name="FLUX Erotic Art Style",
-                description="Artistic erotic style with painterly quality",
-                category=LoRACategory.ARTISTIC_NUDE,
-                rating=ContentRating.EROTIC_ART,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux2-pro"],
-                strength_range=(0.4, 0.9),
-                recommended_strength=0.7,
-                trigger_words=["erotic art", "sensual painting", "artistic nude", "classical nude"],
-                negative_prompts=["photorealistic", "modern", "digital"],
-                sample_prompts=[
-                    "erotic art style, classical nude painting, soft brushstrokes",
-                    "sensual artistic nude, renaissance style, oil painting",
-                    "erotic masterpiece, artistic nude, gallery quality"
-                ],
-                creator="ArtErotica",
-                version="2.1",
-                file_size="122MB"
-            ),
-            
-            # === FLUX ANIME ADULT LORAS ===
-            "flux-anime-nsfw": NSFWLoRAModel(
-                id="flux-anime-nsfw",
-                name="FLUX Anime NSFW", 
-                description="High-quality anime adult content generation",
-                category=LoRACategory.ANIME_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["flux-dev-uncensored", "flux-dev-krea", "flux2-dev"],
-                strength_range=(0.5, 1.0),
-                recommended_strength=0.8,
-                trigger_words=["anime nsfw", "hentai", "ecchi", "anime nude", "anime adult"],
-                negative_prompts=["realistic", "photorealistic", "censored", "clothed"],
-                sample_prompts=[
-                    "anime girl, nude, nsfw, detailed anime art, adult content",
-                    "hentai style, explicit anime, detailed anatomy",
-                    "anime couple, intimate pose, nsfw, detailed art"
-                ],
-                creator="AnimeStudio",
-                version="3.0",
-                file_size="156MB"
-            ),
-            
-            "flux-waifu-explicit": NSFWLoRAModel(
-                id="flux-waifu-explicit",
-                name="FLUX Waifu Explicit",
-                description="Explicit waifu-style anime characters",
-                category=LoRACategory.ANIME_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["flux-dev-krea", "flux-dev-uncensored", "flux2-dev"],
-                strength_range=(0.6, 1.0),
-                recommended_strength=0.85,
-                trigger_words=["waifu", "anime girl", "explicit", "nude anime", "detailed waifu"],
-                negative_prompts=["realistic", "censored", "clothed", "sfw"],
-                sample_prompts=[
-                    "explicit waifu, nude anime girl, detailed anatomy, nsfw",
-                    "anime waifu in sexual pose, explicit, high quality",
-                    "detailed nude waifu character, anime style, adult content"
-                ],
-                creator="WaifuLabs",
-                version="2.5",
-                file_size="134MB"
-            ),
-            
-            # === FLUX FETISH SPECIFIC LORAS ===
-            "flux-bdsm-art": NSFWLoRAModel(
-                id="flux-bdsm-art",
-                name="FLUX BDSM Art",
-                description="BDSM and fetish content generation",
-                category=LoRACategory.FETISH_SPECIFIC,
-                rating=ContentRating.EXTREME,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux-ultra-uncensored"],
-                strength_range=(0.4, 0.8),
-                recommended_strength=0.6,
-                trigger_words=["bdsm", "bondage", "fetish", "leather", "chains"],
-                negative_prompts=["vanilla", "soft", "romantic", "innocent"],
-                sample_prompts=[
-                    "bdsm scene, leather bondage, artistic lighting, fetish art",
-                    "bondage photography, professional bdsm, artistic composition",
-                    "fetish art, bdsm aesthetic, dark atmosphere"
-                ],
-                creator="FetishArt",
-                version="1.8",
-                file_size="89MB"
-            ),
-            
-            "flux-lingerie-specialist": NSFWLoRAModel(
-                id="flux-lingerie-specialist",
-                name="FLUX Lingerie Specialist",
-                description="Specialized lingerie and intimate apparel",
-                category=LoRACategory.STYLE_SPECIFIC,
-                rating=ContentRating.SOFTCORE,
-                compatible_models=["flux-dev-uncensored", "flux-pro-uncensored", "flux2-pro"],
-                strength_range=(0.3, 0.7),
-                recommended_strength=0.5,
-                trigger_words=["lingerie", "intimate apparel", "lace", "silk", "seductive outfit"],
-                negative_prompts=["fully clothed", "casual wear", "modest"],
-                sample_prompts=[
-                    "beautiful woman in elegant lingerie, seductive pose, soft lighting",
-                    "luxury lingerie photography, intimate apparel, professional shoot",
-                    "model in lace lingerie, sensual atmosphere, boudoir photography"
-                ],
-                creator="LingerieStudio",
-                version="1.4",
-                file_size="67MB"
-            )
-        }
+    @property
+    def file_size_label(self) -> str:
+        """Human-readable size, e.g. 144MB"""
+        return format_file_size(self.file_size)
     
-    def _initialize_sdxl_loras(self) -> Dict[str, NSFWLoRAModel]:
-        """Initialize SDXL NSFW LoRA models"""
-        return {
-            # === SDXL REALISTIC ADULT LORAS ===
-            "sdxl-photorealistic-nude": NSFWLoRAModel(
-                id="sdxl-photorealistic-nude",
-                name="SDXL Photorealistic Nude",
-                description="Ultra-realistic nude photography style",
-                category=LoRACategory.REALISTIC_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["sdxl-base", "sdxl-turbo", "sdxl-lightning"],
-                strength_range=(0.5, 1.0),
-                recommended_strength=0.8,
-                trigger_words=["nude photography", "naked", "photorealistic nude", "professional nude"],
-                negative_prompts=["anime", "cartoon", "clothed", "censored"],
-                sample_prompts=[
-                    "professional nude photography, beautiful woman, soft studio lighting",
-                    "artistic nude portrait, photorealistic, elegant pose",
-                    "nude model, professional photography, artistic lighting"
-                ],
-                creator="PhotoStudio",
-                version="2.3",
-                file_size="187MB"
-            ),
-            
-            "sdxl-intimate-couples": NSFWLoRAModel(
-                id="sdxl-intimate-couples",
-                name="SDXL Intimate Couples",
-                description="Realistic couple intimate scenes",
-                category=LoRACategory.REALISTIC_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["sdxl-base", "sdxl-turbo"],
-                strength_range=(0.6, 0.9),
-                recommended_strength=0.75,
-                trigger_words=["intimate couple", "romantic scene", "lovers", "passionate"],
-                negative_prompts=["single person", "platonic", "casual"],
-                sample_prompts=[
-                    "intimate couple scene, passionate embrace, bedroom setting",
-                    "romantic lovers, intimate moment, soft lighting",
-                    "couple in passionate pose, intimate atmosphere, nsfw"
-                ],
-                creator="RomanceArt",
-                version="1.7",
-                file_size="145MB"
-            ),
-            
-            "sdxl-boudoir-photography": NSFWLoRAModel(
-                id="sdxl-boudoir-photography",
-                name="SDXL Boudoir Photography",
-                description="Professional boudoir photography style",
-                category=LoRACategory.ARTISTIC_NUDE,
-                rating=ContentRating.EROTIC_ART,
-                compatible_models=["sdxl-base", "sdxl-lightning"],
-                strength_range=(0.4, 0.8),
-                recommended_strength=0.6,
-                trigger_words=["boudoir", "intimate photography", "sensual portrait", "bedroom photography"],
-                negative_prompts=["explicit", "hardcore", "vulgar"],
-                sample_prompts=[
-                    "boudoir photography, sensual portrait, elegant lighting",
-                    "intimate boudoir session, artistic nude, soft shadows",
-                    "professional boudoir, sensual pose, luxury bedroom"
-                ],
-                creator="BoudoirPro",
-                version="2.0",
-                file_size="123MB"
-            ),
-            
-            # === SDXL ANIME ADULT LORAS ===
-            "sdxl-anime-explicit": NSFWLoRAModel(
-                id="sdxl-anime-explicit",
-                name="SDXL Anime Explicit",
-                description="High-quality explicit anime content",
-                category=LoRACategory.ANIME_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["sdxl-base", "sdxl-turbo"],
-                strength_range=(0.7, 1.0),
-                recommended_strength=0.9,
-                trigger_words=["anime explicit", "hentai", "nude anime", "ecchi", "anime nsfw"],
-                negative_prompts=["realistic", "photorealistic", "censored", "sfw"],
-                sample_prompts=[
-                    "anime girl explicit, nude, detailed anatomy, hentai style",
-                    "explicit anime character, nsfw, high quality anime art",
-                    "anime couple, explicit scene, detailed hentai art"
-                ],
-                creator="AnimeXXX",
-                version="2.8",
-                file_size="167MB"
-            ),
-            
-            "sdxl-monster-girl": NSFWLoRAModel(
-                id="sdxl-monster-girl", 
-                name="SDXL Monster Girl",
-                description="Fantasy monster girl adult content",
-                category=LoRACategory.FETISH_SPECIFIC,
-                rating=ContentRating.EXTREME,
-                compatible_models=["sdxl-base", "sdxl-turbo"],
-                strength_range=(0.5, 0.9),
-                recommended_strength=0.7,
-                trigger_words=["monster girl", "fantasy creature", "succubus", "demon girl", "dragon girl"],
-                negative_prompts=["human", "normal", "realistic", "mundane"],
-                sample_prompts=[
-                    "monster girl, succubus, explicit fantasy art, detailed anatomy",
-                    "dragon girl, nude fantasy creature, adult content",
-                    "demon girl, seductive monster, fantasy nsfw art"
-                ],
-                creator="FantasyXXX",
-                version="1.9",
-                file_size="134MB"
-            ),
-            
-            # === SDXL FETISH LORAS ===
-            "sdxl-latex-fetish": NSFWLoRAModel(
-                id="sdxl-latex-fetish",
-                name="SDXL Latex Fetish",
-                description="Latex and rubber fetish content",
-                category=LoRACategory.FETISH_SPECIFIC,
-                rating=ContentRating.EXTREME,
-                compatible_models=["sdxl-base", "sdxl-lightning"],
-                strength_range=(0.4, 0.8),
-                recommended_strength=0.6,
-                trigger_words=["latex", "rubber", "shiny", "fetish wear", "dominatrix"],
-                negative_prompts=["fabric", "cotton", "normal clothing", "vanilla"],
-                sample_prompts=[
-                    "woman in latex outfit, shiny rubber, fetish photography",
-                    "dominatrix in black latex, fetish scene, professional lighting",
-                    "latex catsuit, rubber fetish, dark atmosphere"
-                ],
-                creator="LatexStudio",
-                version="1.6",
-                file_size="98MB"
-            )
+
+# Curated LoRA picks per use case and model family
+USE_CASE_RECOMMENDATIONS: Dict[str, Dict[str, List[str]]] = {
+    "realistic_nude": {
+        "flux": ["flux-realistic-adult-v2", "flux-body-enhancement"],
+        "sdxl": ["sdxl-photorealistic-nude", "sdxl-boudoir-photography"],  
+        "wan": ["wan-ultra-realistic", "wan-body-perfection"]
+    },
+    "anime_adult": {
+        "flux": ["flux-anime-nsfw", "flux-waifu-explicit"],
+        "sdxl": ["sdxl-anime-explicit"],
+        "wan": ["wan-anime-master"]
+    },
+    "artistic_nude": {
+        "flux": ["flux-erotic-art"],
+        "sdxl": ["sdxl-boudoir-photography"],
+        "wan": ["wan-artistic-erotic"]
+    },
+    "fetish_content": {
+        "flux": ["flux-bdsm-art"],
+        "sdxl": ["sdxl-latex-fetish", "sdxl-monster-girl"],
+        "wan": ["wan-fetish-specialist"]
+    },
+    "intimate_couples": {
+        "flux": ["flux-intimate-poses"],
+        "sdxl": ["sdxl-intimate-couples"],
+        "wan": ["wan-ultra-realistic"]
+    }
+}
+
+# Hand-tuned LoRA pairings, keyed by primary LoRA
+COMBINATION_SUGGESTIONS: Dict[str, List[Dict[str, Any]]] = {
+    "flux-realistic-adult-v2": [
+        {
+            "secondary": "flux-body-enhancement",
+            "primary_strength": 0.7,
+            "secondary_strength": 0.4,
+            "description": "Ultra-realistic with enhanced proportions"
+        },
+        {
+            "secondary": "flux-intimate-poses",
+            "primary_strength": 0.6,
+            "secondary_strength": 0.5,
+            "description": "Realistic adult with intimate poses"
+        }
+    ],
+    "flux-anime-nsfw": [
+        {
+            "secondary": "flux-waifu-explicit",
+            "primary_strength": 0.8,
+            "secondary_strength": 0.6,
+            "description": "Enhanced anime adult with waifu styling"
+        }
+    ],
+    "sdxl-photorealistic-nude": [
+        {
+            "secondary": "sdxl-boudoir-photography",
+            "primary_strength": 0.8,
+            "secondary_strength": 0.4,
+            "description": "Photorealistic with boudoir styling"
         }
+    ]
+}
+
+CURATED_PAIRS = frozenset(
+    (primary, combo["secondary"])
+    for primary, combos in COMBINATION_SUGGESTIONS.items()
+    for combo in combos
+)
+
+def lora_from_dict(data: Mapping[str, Any]) -> NSFWLoRAModel:
+    """Build a NSFWLoRAModel from its catalog (JSON/Mongo) representation"""
+    return NSFWLoRAModel(
+        id=data["id"],
+        name=data["name"],
+        description=data["description"],
+        category=LoRACategory(data["category"]),
+        rating=ContentRating(data["rating"]),
+        compatible_models=data["compatible_models"],
+        strength_range=data["strength_range"],
+        recommended_strength=float(data["recommended_strength"]),
+        trigger_words=data.get("trigger_words", ()),
+        negative_prompts=data.get("negative_prompts", ()),
+        sample_prompts=data.get("sample_prompts", ()),
+        creator=data["creator"],
+        version=str(data["version"]),
+        file_size=data["file_size"],
+        download_url=data.get("download_url")
+    )
+
+class CatalogState:
+    """
+    One immutable snapshot of the catalog and its lookup indexes. Reloads build a new
+    snapshot and swap it in with a single assignment, so readers never see a mix.
+    """
     
-    def _initialize_wan_loras(self) -> Dict[str, NSFWLoRAModel]:
-        """Initialize WAN 2.2 NSFW LoRA models"""
-        return {
-            # === WAN 2.2 ADULT LORAS ===
-            "wan-ultra-realistic": NSFWLoRAModel(
-                id="wan-ultra-realistic",
-                name="WAN Ultra Realistic Adult",
-                description="Ultra-realistic adult content with WAN 2.2 architecture",
-                category=LoRACategory.REALISTIC_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["wan-2.2-base", "wan-2.2-pro", "qwen-wan"],
-                strength_range=(0.5, 1.0),
-                recommended_strength=0.8,
-                trigger_words=["ultra realistic", "photorealistic nude", "professional adult"],
-                negative_prompts=["anime", "cartoon", "censored", "artistic"],
-                sample_prompts=[
-                    "ultra realistic nude woman, professional photography, perfect anatomy",
-                    "photorealistic adult scene, intimate couple, soft lighting",
-                    "realistic nude portrait, professional quality, explicit"
-                ],
-                creator="WANLabs",
-                version="2.2",
-                file_size="234MB"
-            ),
-            
-            "wan-anime-master": NSFWLoRAModel(
-                id="wan-anime-master",
-                name="WAN Anime Master NSFW",
-                description="Master-level anime adult content with WAN architecture",
-                category=LoRACategory.ANIME_ADULT,
-                rating=ContentRating.HARDCORE,
-                compatible_models=["wan-2.2-base", "qwen-wan"],
-                strength_range=(0.6, 1.0),
-                recommended_strength=0.85,
-                trigger_words=["anime master", "hentai master", "detailed anime nsfw"],
-                negative_prompts=["realistic", "photorealistic", "censored", "low quality"],
-                sample_prompts=[
-                    "anime master quality, explicit hentai, detailed anatomy",
-                    "master-level anime nsfw, perfect proportions, high detail",
-                    "anime girl master quality, explicit, detailed art"
-                ],
-                creator="WANAnime",
-                version="2.1",
-                file_size="198MB"
-            ),
-            
-            "wan-fetish-specialist": NSFWLoRAModel(
-                id="wan-fetish-specialist",
-                name="WAN Fetish Specialist",
-                description="Specialized fetish content with WAN 2.2 precision",
-                category=LoRACategory.FETISH_SPECIFIC,
-                rating=ContentRating.EXTREME,
-                compatible_models=["wan-2.2-pro", "wan-2.2-base"],
-                strength_range=(0.4, 0.9),
-                recommended_strength=0.7,
-                trigger_words=["fetish specialist", "extreme fetish", "kink art"],
-                negative_prompts=["vanilla", "normal", "mainstream", "soft"],
-                sample_prompts=[
-                    "fetish specialist art, extreme kink, professional quality",
-                    "specialized fetish scene, detailed kink art, atmospheric",
-                    "extreme fetish photography, artistic composition"
-                ],
-                creator="WANKink",
-                version="1.8",
-                file_size="156MB"
-            ),
-            
-            "wan-body-perfection": NSFWLoRAModel(
-                id="wan-body-perfection",
-                name="WAN Body Perfection",
-                description="Perfect anatomy and body proportions",
-                category=LoRACategory.BODY_ENHANCEMENT,
-                rating=ContentRating.SOFTCORE,
-                compatible_models=["wan-2.2-pro", "wan-2.2-base", "qwen-wan"],
-                strength_range=(0.3, 0.8),
-                recommended_strength=0.6,
-                trigger_words=["perfect body", "ideal anatomy", "flawless proportions"],
-                negative_prompts=["average", "imperfect", "disproportionate"],
-                sample_prompts=[
-                    "perfect female body, ideal proportions, nude art",
-                    "flawless anatomy, perfect curves, artistic nude",
-                    "ideal body perfection, sensual pose, professional"
-                ],
-                creator="WANBody",
-                version="2.0",
-                file_size="143MB"
-            ),
+    __slots__ = ("loras", "family_by_id", "ids_by_model", "ids_by_category", "ids_by_rating",
+                 "ids_by_family", "families", "search_index", "compatibility", "version", "source")
+    
+    def __init__(self, families: Mapping[str, Iterable[NSFWLoRAModel]], source: str = ""):
+        loras: Dict[str, NSFWLoRAModel] = {}
+        family_by_id: Dict[str, str] = {}
+        family_loras: Dict[str, Dict[str, NSFWLoRAModel]] = {}
+        for family, models in families.items():
+            family_loras[family] = {lora.id: lora for lora in models}
+            loras.update(family_loras[family])
+            for lora_id in family_loras[family]:
+                family_by_id[lora_id] = family
+        
+        ids_by_model: Dict[str, List[str]] = {}
+        ids_by_category: Dict[LoRACategory, List[str]] = {category: [] for category in LoRACategory}
+        ids_by_rating: Dict[ContentRating, List[str]] = {rating: [] for rating in ContentRating}
+        ids_by_family: Dict[str, List[str]] = {family: [] for family in family_loras}
+        for lora_id, lora in loras.items():
+            for model_id in dict.fromkeys(lora.compatible_models):
+                ids_by_model.setdefault(model_id, []).append(lora_id)
+            ids_by_category[lora.category].append(lora_id)
+            ids_by_rating[lora.rating].append(lora_id)
+            ids_by_family[family_by_id[lora_id]].append(lora_id)
+        
+        def freeze(index: Dict[Any, List[str]]) -> Mapping[Any, Tuple[str, ...]]:
+            return MappingProxyType({key: tuple(ids) for key, ids in index.items()})
+        
+        self.loras: Mapping[str, NSFWLoRAModel] = MappingProxyType(loras)
+        self.family_by_id: Mapping[str, str] = MappingProxyType(family_by_id)
+        self.ids_by_model = freeze(ids_by_model)
+        self.ids_by_category = freeze(ids_by_category)
+        self.ids_by_rating = freeze(ids_by_rating)
+        self.ids_by_family = freeze(ids_by_family)
+        self.families: Mapping[str, Mapping[str, NSFWLoRAModel]] = MappingProxyType(
+            {family: MappingProxyType(models) for family, models in family_loras.items()}
+        )
+        self.search_index = LoRASearchIndex(
+            self.loras,
+            self.family_by_id,
+            {
+                use_case: [lora_id for lora_ids in by_family.values() for lora_id in lora_ids]
+                for use_case, by_family in USE_CASE_RECOMMENDATIONS.items()
+            }
+        )
+        self.compatibility = CompatibilityMatrix(self.loras)
+        self.source = source
+        
+        # Fingerprint of the catalog contents; changes whenever any LoRA does
+        fingerprint = hashlib.sha256()
+        for lora_id in sorted(loras):
+            fingerprint.update(f"{family_by_id[lora_id]}:{loras[lora_id]!r}\n".encode())
+        self.version = fingerprint.hexdigest()
+    
+    @classmethod
+    def from_documents(cls, families: Mapping[str, Iterable[Mapping[str, Any]]], source: str = "") -> "CatalogState":
+        return cls(
+            {family: [lora_from_dict(data) for data in documents] for family, documents in families.items()},
+            source=source
+        )
+
+class NSFWLoRAService:
+    """
+    Service for managing NSFW LoRA models.
+    The catalog lives in a JSON data file (or a MongoDB collection) and is loaded on
+    first use; `reload()` rebuilds it off the event loop and swaps it in atomically.
+    """
+    
+    def __init__(
+        self,
+        catalog_path: Union[str, Path] = DEFAULT_CATALOG_PATH,
+        source: str = "file",
+        collection_name: str = "nsfw_loras",
+        database=None,
+        watch_interval: float = 0
+    ):
+        self.catalog_path = Path(catalog_path)
+        self.source = source
+        self.watch_interval = watch_interval
+        self.collection_name = collection_name
+        self._database = database
+        self._state: Optional[CatalogState] = None
+        self._catalog_mtime: Optional[float] = None
+        self._reload_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self.reloads = 0
+    
+    # ---- catalog loading -------------------------------------------------
+    
+    def _read_catalog_file(self) -> Tuple[Dict[str, List[Dict[str, Any]]], float]:
+        mtime = self.catalog_path.stat().st_mtime
+        with open(self.catalog_path, "r", encoding="utf-8") as f:
+            return json.load(f), mtime
+    
+    def _load_file_state(self) -> Tuple[CatalogState, float]:
+        documents, mtime = self._read_catalog_file()
+        return CatalogState.from_documents(documents, source=str(self.catalog_path)), mtime
+    
+    async def _read_catalog_mongo(self) -> Dict[str, List[Dict[str, Any]]]:
+        database = self._database
+        if database is None:
+            from database import db
+            database = db.database
+        families: Dict[str, List[Dict[str, Any]]] = {}
+        async for document in database[self.collection_name].find({}, {"_id": 0}).sort("_id", 1):
+            families.setdefault(document.pop("family"), []).append(document)
+        return families
+    
+    @property
+    def catalog(self) -> CatalogState:
+        """Current catalog snapshot, loaded synchronously from the data file on first use"""
+        state = self._state
+        if state is None:
+            # Bootstrap from the bundled file; a Mongo source replaces it on reload()
+            state, self._catalog_mtime = self._load_file_state()
+            self._state = state
+            logger.info(f"Loaded NSFW LoRA catalog ({len(state.loras)} LoRAs) from {state.source}")
+        return state
+    
+    async def reload(self) -> bool:
+        """
+        Rebuild the catalog from its source without blocking the event loop.
+        The new snapshot replaces the old one atomically; on failure the old one stays.
+        """
+        async with self._reload_lock:
+            try:
+                if self.source == "mongo":
+                    documents = await self._read_catalog_mongo()
+                    state = await asyncio.to_thread(
+                        CatalogState.from_documents, documents, f"mongo:{self.collection_name}"
+                    )
+                    mtime = self._catalog_mtime
+                else:
+                    state, mtime = await asyncio.to_thread(self._load_file_state)
+            except Exception as e:
+                logger.error(f"NSFW LoRA catalog reload failed, keeping current catalog: {e}")
+                return False
             
-            "wan-artistic-erotic": NSFWLoRAModel(
-                id="wan-artistic-erotic",
-                name="WAN Artistic Erotic",
-                description="High-art erotic content with WAN precision",
-                category=LoRACategory.ARTISTIC_NUDE,
-                rating=ContentRating.EROTIC_ART,
-                compatible_models=["wan-2.2-pro", "wan-2.2-base"],
-                strength_range=(0.4, 0.9),
-                recommended_strength=0.7,
-                trigger_words=["artistic erotic", "fine art nude", "gallery quality erotic"],
-                negative_prompts=["pornographic", "vulgar", "crude", "amateur"],
-                sample_prompts=[
-                    "artistic erotic masterpiece, fine art nude, gallery quality",
-                    "erotic art, classical nude, museum quality, elegant",
-                    "artistic nude, erotic fine art, professional composition"
-                ],
-                creator="WANArt",
-                version="1.9",
-                file_size="167MB"
-            )
-        }
+            previous = self._state
+            self._state = state
+            self._catalog_mtime = mtime
+            self.reloads += 1
+            if previous is None or previous.version != state.version:
+                logger.info(f"NSFW LoRA catalog loaded ({len(state.loras)} LoRAs, version {state.version[:12]}) from {state.source}")
+            return True
+    
+    async def _watch_catalog(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = (await asyncio.to_thread(self.catalog_path.stat)).st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime != self._catalog_mtime:
+                # Remember the mtime first so a broken file is not retried every tick
+                self._catalog_mtime = mtime
+                await self.reload()
+    
+    async def start(self):
+        """Load the catalog off the event loop and, if configured, watch the data file for changes"""
+        await self.reload()
+        if self.watch_interval > 0 and self.source == "file" and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch_catalog(self.watch_interval))
+    
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+    
+    # ---- read-only views -------------------------------------------------
+    
+    @property
+    def catalog_version(self) -> str:
+        return self.catalog.version
+    
+    @property
+    def flux_loras(self) -> Mapping[str, NSFWLoRAModel]:
+        return self.catalog.families.get("flux", MappingProxyType({}))
+    
+    @property
+    def sdxl_loras(self) -> Mapping[str, NSFWLoRAModel]:
+        return self.catalog.families.get("sdxl", MappingProxyType({}))
+    
+    @property
+    def wan_loras(self) -> Mapping[str, NSFWLoRAModel]:
+        return self.catalog.families.get("wan", MappingProxyType({}))
+    
+    @property
+    def ids_by_model(self) -> Mapping[str, Tuple[str, ...]]:
+        """Read-only model_id -> LoRA ids index"""
+        return self.catalog.ids_by_model
+    
+    @property
+    def ids_by_category(self) -> Mapping[LoRACategory, Tuple[str, ...]]:
+        """Read-only category -> LoRA ids index"""
+        return self.catalog.ids_by_category
     
-    def get_all_loras(self) -> Dict[str, NSFWLoRAModel]:
-        """Get all available NSFW LoRA models"""
-        all_loras = {}
-        all_loras.update(self.flux_loras)
-        all_loras.update(self.sdxl_loras)
-        all_loras.update(self.wan_loras)
-        return all_loras
+    @property
+    def ids_by_rating(self) -> Mapping[ContentRating, Tuple[str, ...]]:
+        """Read-only rating -> LoRA ids index"""
+        return self.catalog.ids_by_rating
+    
+    @property
+    def ids_by_family(self) -> Mapping[str, Tuple[str, ...]]:
+        """Read-only model family (flux/sdxl/wan) -> LoRA ids index"""
+        return self.catalog.ids_by_family
+    
+    def get_all_loras(self) -> Mapping[str, NSFWLoRAModel]:
+        """Get all available NSFW LoRA models (read-only view)"""
+        return self.catalog.loras
+    
+    def get_lora(self, lora_id: str) -> Optional[NSFWLoRAModel]:
+        """Get a single LoRA by id"""
+        return self.catalog.loras.get(lora_id)
+    
+    def get_lora_family(self, lora_id: str) -> Optional[str]:
+        """Get the model family (flux/sdxl/wan) a LoRA belongs to"""
+        return self.catalog.family_by_id.get(lora_id)
+    
+    @staticmethod
+    def _resolve(state: CatalogState, lora_ids: Tuple[str, ...]) -> List[NSFWLoRAModel]:
+        return [state.loras[lora_id] for lora_id in lora_ids]
     
     def get_loras_by_model(self, model_id: str) -> List[NSFWLoRAModel]:
         """Get compatible LoRAs for a specific model"""
-        compatible_loras = []
-        all_loras = self.get_all_loras()
-        
-        for lora in all_loras.values():
-            if model_id in lora.compatible_models:
-                compatible_loras.append(lora)
-        
-        return compatible_loras
+        state = self.catalog
+        return self._resolve(state, state.ids_by_model.get(model_id, ()))
     
     def get_loras_by_category(self, category: LoRACategory) -> List[NSFWLoRAModel]:
         """Get LoRAs by category"""
-        all_loras = self.get_all_loras()
-        return [lora for lora in all_loras.values() if lora.category == category]
+        state = self.catalog
+        return self._resolve(state, state.ids_by_category.get(category, ()))
     
     def get_loras_by_rating(self, rating: ContentRating) -> List[NSFWLoRAModel]:
         """Get LoRAs by content rating"""
-        all_loras = self.get_all_loras()
-        return [lora for lora in all_loras.values() if lora.rating == rating]
+        state = self.catalog
+        return self._resolve(state, state.ids_by_rating.get(rating, ()))
+    
+    def get_loras_by_family(self, family: str) -> List[NSFWLoRAModel]:
+        """Get LoRAs by model family (flux, sdxl, wan)"""
+        state = self.catalog
+        return self._resolve(state, state.ids_by_family.get(family, ()))
+    
+    def search_loras(
+        self,
+        filters: Mapping[str, Optional[str]],
+        text: Optional[str] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> Tuple[List[NSFWLoRAModel], LoRASearchResult]:
+        """Faceted search over the current catalog; raises InvalidQuery for a bad sort/paging"""
+        state = self.catalog
+        result = state.search_index.search(filters, text=text, sort=sort, offset=offset, limit=limit)
+        return self._resolve(state, result.ids), result
     
     def get_recommended_loras(self, use_case: str, model_type: str = "flux") -> List[NSFWLoRAModel]:
         """Get recommended LoRAs for specific use cases"""
-        recommendations = {
-            "realistic_nude": {
-                "flux": ["flux-realistic-adult-v2", "flux-body-enhancement"],
-                "sdxl": ["sdxl-photorealistic-nude", "sdxl-boudoir-photography"],  
-                "wan": ["wan-ultra-realistic", "wan-body-perfection"]
-            },
-            "anime_adult": {
-                "flux": ["flux-anime-nsfw", "flux-waifu-explicit"],
-                "sdxl": ["sdxl-anime-explicit"],
-                "wan": ["wan-anime-master"]
-            },
-            "artistic_nude": {
-                "flux": ["flux-erotic-art"],
-                "sdxl": ["sdxl-boudoir-photography"],
-                "wan": ["wan-artistic-erotic"]
-            },
-            "fetish_content": {
-                "flux": ["flux-bdsm-art"],
-                "sdxl": ["sdxl-latex-fetish", "sdxl-monster-girl"],
-                "wan": ["wan-fetish-specialist"]
-            },
-            "intimate_couples": {
-                "flux": ["flux-intimate-poses"],
-                "sdxl": ["sdxl-intimate-couples"],
-                "wan": ["wan-ultra-realistic"]
-            }
-        }
-        
-        lora_ids = recommendations.get(use_case, {}).get(model_type, [])
-        all_loras = self.get_all_loras()
+        lora_ids = USE_CASE_RECOMMENDATIONS.get(use_case, {}).get(model_type, [])
+        loras = self.catalog.loras
         
-        return [all_loras[lora_id] for lora_id in lora_ids if lora_id in all_loras]
+        return [loras[lora_id] for lora_id in lora_ids if lora_id in loras]
     
     def get_lora_combination_suggestions(self, primary_lora: str) -> List[Dict[str, Any]]:
-        """Get suggestions for combining LoRAs"""
-        combinations = {
-            "flux-realistic-adult-v2": [
-                {
-                    "secondary": "flux-body-enhancement",
-                    "primary_strength": 0.7,
-                    "secondary_strength": 0.4,
-                    "description": "Ultra-realistic with enhanced proportions"
-                },
-                {
-                    "secondary": "flux-intimate-poses",
-                    "primary_strength": 0.6,
-                    "secondary_strength": 0.5,
-                    "description": "Realistic adult with intimate poses"
-                }
-            ],
-            "flux-anime-nsfw": [
-                {
-                    "secondary": "flux-waifu-explicit",
-                    "primary_strength": 0.8,
-                    "secondary_strength": 0.6,
-                    "description": "Enhanced anime adult with waifu styling"
-                }
-            ],
-            "sdxl-photorealistic-nude": [
-                {
-                    "secondary": "sdxl-boudoir-photography",
-                    "primary_strength": 0.8,
-                    "secondary_strength": 0.4,
-                    "description": "Photorealistic with boudoir styling"
-                }
-            ]
-        }
-        
-        return combinations.get(primary_lora, [])
+        """Get suggestions for combining LoRAs (copies; callers may modify them)"""
+        return [dict(combo) for combo in COMBINATION_SUGGESTIONS.get(primary_lora, ())]
+    
+    @property
+    def compatibility(self) -> CompatibilityMatrix:
+        """LoRA x base-model compatibility matrix of the current catalog"""
+        return self.catalog.compatibility
+    
+    def get_models_supporting_all(self, lora_ids: List[str]) -> List[str]:
+        """Base models that every given LoRA is compatible with"""
+        return self.catalog.compatibility.models_supporting_all(lora_ids)
+    
+    def score_combinations(self, pairs: List[Tuple[str, str]], model_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Score (primary, secondary) LoRA pairs in one vectorised pass.
+        Incompatible pairs score 0; otherwise 70% model-support overlap, 30% curated pairing.
+        """
+        checks = self.catalog.compatibility.score_pairs(pairs, model_id)
+        curated = [pair in CURATED_PAIRS for pair in pairs]
+        scores = [
+            round(0.7 * float(overlap) + 0.3 * is_curated, 3) if compatible else 0.0
+            for overlap, is_curated, compatible in zip(checks["overlap"], curated, checks["compatible"])
+        ]
+        return [
+            {
+                "primary": primary,
+                "secondary": secondary,
+                "known": bool(checks["known"][index]),
+                "compatible": bool(checks["compatible"][index]),
+                "shared_models": int(checks["shared_models"][index]),
+                "overlap": round(float(checks["overlap"][index]), 3),
+                "curated": curated[index],
+                "score": scores[index]
+            }
+            for index, (primary, secondary) in enumerate(pairs)
+        ]
     
     def validate_age_verification(self, user_id: str) -> bool:
         """Validate user age verification for NSFW content access"""
@@ -586,8 +522,7 @@ class NSFWLoRAService:
     
     def get_content_warnings(self, lora_id: str) -> Dict[str, Any]:
         """Get content warnings for a specific LoRA"""
-        all_loras = self.get_all_loras()
-        lora = all_loras.get(lora_id)
+        lora = self.catalog.loras.get(lora_id)
         
         if not lora:
             return {"warning": "LoRA not found"}
@@ -623,4 +558,8 @@ class NSFWLoRAService:
         return warnings
 
 # Global service instance
-nsfw_lora_service = NSFWLoRAService()
+nsfw_lora_service = NSFWLoRAService(
+    catalog_path=os.getenv("NSFW_LORA_CATALOG_PATH", str(DEFAULT_CATALOG_PATH)),
+    source=os.getenv("NSFW_LORA_CATALOG_SOURCE", "file"),
+    watch_interval=float(os.getenv("NSFW_LORA_CATALOG_POLL_SECONDS", "5"))
+)
@@ -0,0 +1,507 @@
+"""
+Runway Admission Scheduler
+
+Fair-share admission in front of Runway submissions. A task holds a slot from the
+moment it is submitted to Runway until it reaches a final state, bounded by a global
+in-flight cap (Runway's org-level concurrency) and a per-user quota. Tasks that cannot
+start yet wait in weighted priority lanes, round-robin across users within a lane, so
+one user's burst never starves everyone else. When the queues are full the caller is
+told how long to back off instead.
+
+Batch submissions are admitted as a whole against their own, larger queue limits, so a
+queued batch neither hits the per-request cap nor crowds out a user's single requests;
+its jobs still start under the same per-user quota.
+
+Queues and per-user quotas are kept per worker process. The global cap is too unless a
+shared slot pool is configured: with the MongoDB task store every worker leases its
+in-flight slots from the same slot documents, so N workers still share one cap.
+"""
+
+import os
+import time
+import uuid
+import logging
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lane weights: under contention "priority" starts 4 tasks for every 1 "free" task
+DEFAULT_LANE_WEIGHTS: Tuple[Tuple[str, int], ...] = (
+    ("priority", 4),
+    ("standard", 2),
+    ("free", 1),
+)
+
+
+class AdmissionRejected(Exception):
+    """The scheduler's queues are full; retry after `retry_after` seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class MongoSlotPool:
+    """
+    The global in-flight cap shared by every worker: `size` slot documents that a worker
+    leases for each task it starts. Leases are renewed alongside the task leases, so
+    the slots of a worker that went away lapse and become free again.
+    """
+
+    def __init__(self, size: int, owner: str, lease_seconds: float,
+                 collection_name: str = "runway_generation_slots", database=None):
+        self.size = size
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.collection_name = collection_name
+        self._database = database
+
+    @property
+    def collection(self):
+        if self._database is None:
+            # Resolved lazily: the service is created before connect_to_mongo() runs
+            from database import db
+            self._database = db.database
+        return self._database[self.collection_name]
+
+    async def initialize(self):
+        for slot in range(self.size):
+            await self.collection.update_one(
+                {"_id": slot},
+                {"$setOnInsert": {"holder": None, "owner": None, "lease_expires_at": 0.0}},
+                upsert=True
+            )
+        await self.collection.create_index("owner")
+
+    async def acquire(self, holder: str) -> bool:
+        """Lease a free (or lapsed) slot for `holder`; False when all slots are taken"""
+        now = time.time()
+        document = await self.collection.find_one_and_update(
+            {
+                "_id": {"$in": list(range(self.size))},
+                "$or": [{"holder": None}, {"lease_expires_at": {"$lt": now}}]
+            },
+            {"$set": {"holder": holder, "owner": self.owner, "lease_expires_at": now + self.lease_seconds}}
+        )
+        return document is not None
+
+    async def release(self, holder: str):
+        await self.collection.update_one(
+            {"holder": holder, "owner": self.owner},
+            {"$set": {"holder": None, "owner": None, "lease_expires_at": 0.0}}
+        )
+
+    async def renew(self) -> int:
+        result = await self.collection.update_many(
+            {"owner": self.owner, "holder": {"$ne": None}},
+            {"$set": {"lease_expires_at": time.time() + self.lease_seconds}}
+        )
+        return result.modified_count
+
+
+def create_slot_pool(size: int, owner: str, lease_seconds: float, backend: Optional[str] = None
+                     ) -> Optional[MongoSlotPool]:
+    """Shared slot pool matching RUNWAY_TASK_STORE; None keeps the cap per process"""
+    backend = (backend or os.getenv("RUNWAY_TASK_STORE", "memory")).lower()
+    if backend != "mongo":
+        return None
+    return MongoSlotPool(size, owner, lease_seconds, os.getenv("RUNWAY_SLOT_COLLECTION", "runway_generation_slots"))
+
+
+class _Job:
+    __slots__ = ("task_id", "user_id", "lane", "start", "sequence", "batch", "queued_at")
+
+    def __init__(
+        self,
+        task_id: str,
+        user_id: str,
+        lane: str,
+        start: Callable[[], Awaitable[Any]],
+        sequence: int,
+        batch: bool = False
+    ):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.lane = lane
+        self.start = start
+        self.sequence = sequence
+        self.batch = batch
+        self.queued_at = time.monotonic()
+
+
+class _Lane:
+    """Per-user FIFO queues served round-robin"""
+
+    __slots__ = ("name", "weight", "credit", "users")
+
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.weight = weight
+        self.credit = 0
+        self.users: "OrderedDict[str, Deque[_Job]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self.users.values())
+
+
+class GenerationScheduler:
+    """Global cap + per-user quota + weighted lanes for Runway task starts"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 10,
+        per_user_in_flight: int = 2,
+        max_queued: int = 500,
+        max_queued_per_user: int = 20,
+        max_batch_queued: int = 10_000,
+        max_batch_queued_per_user: int = 2000,
+        lane_weights: Tuple[Tuple[str, int], ...] = DEFAULT_LANE_WEIGHTS,
+        default_lane: str = "free",
+        expected_task_seconds: float = 120.0,
+        slots: Optional[MongoSlotPool] = None,
+        slot_retry_seconds: float = 2.0
+    ):
+        self.max_in_flight = max_in_flight
+        self.per_user_in_flight = per_user_in_flight
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.max_batch_queued = max_batch_queued
+        self.max_batch_queued_per_user = max_batch_queued_per_user
+        self.default_lane = default_lane
+        self._lanes: Dict[str, _Lane] = {name: _Lane(name, weight) for name, weight in lane_weights}
+        if default_lane not in self._lanes:
+            raise ValueError(f"Default lane {default_lane} is not configured")
+
+        self._queued: Dict[str, _Job] = {}
+        self._in_flight: Dict[str, Tuple[str, float]] = {}  # task_id -> (user_id, started_at)
+        self._user_in_flight: Dict[str, int] = {}
+        self._user_queued: Dict[str, int] = {}
+        self._user_batch_queued: Dict[str, int] = {}
+        self._batch_queued = 0
+        self._sequence = 0
+
+        # Shared cap: slot holder token per running task, and adopted tasks still without one
+        self.slots = slots
+        self.slot_retry_seconds = slot_retry_seconds
+        self._slot_holders: Dict[str, str] = {}
+        self._unslotted: Dict[str, None] = {}
+        self._wake = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+        # Running estimate of how long a task holds its slot, for Retry-After and ETAs
+        self._avg_task_seconds = expected_task_seconds
+
+        self.total_admitted = 0
+        self.total_rejected = 0
+        self.total_started = 0
+
+    def start(self):
+        """Start dispatching against the shared slot pool (no-op without one)"""
+        if self.slots is not None and self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch_shared())
+
+    async def stop(self):
+        # Slots of tasks still running lapse with their leases, so another worker can adopt them
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    async def renew_slots(self):
+        if self.slots is not None:
+            await self.slots.renew()
+
+    def lane_for(self, lane: Optional[str]) -> str:
+        return lane if lane in self._lanes else self.default_lane
+
+    def _retry_after(self, slots: int) -> int:
+        """Seconds until one of `slots` running tasks is likely to finish and free a queue spot"""
+        return max(1, int(self._avg_task_seconds / max(slots, 1)))
+
+    def check_admission(self, user_id: str, count: int = 1, batch: bool = False):
+        """
+        Raise AdmissionRejected if `count` new tasks for `user_id` could not all be
+        queued now. Batches are checked against the batch limits.
+        """
+        if batch:
+            user_queued, user_limit = self._user_batch_queued.get(user_id, 0), self.max_batch_queued_per_user
+            queued, limit = self._batch_queued, self.max_batch_queued
+            kind = "batch generations"
+        else:
+            user_queued, user_limit = self._user_queued.get(user_id, 0), self.max_queued_per_user
+            queued, limit = len(self._queued) - self._batch_queued, self.max_queued
+            kind = "generations"
+        if user_queued + count > user_limit:
+            self.total_rejected += count
+            raise AdmissionRejected(
+                f"Too many queued {kind} (max {user_limit} per user)",
+                self._retry_after(self.per_user_in_flight)
+            )
+        if queued + count > limit:
+            self.total_rejected += count
+            raise AdmissionRejected("Generation queue is full", self._retry_after(self.max_in_flight))
+
+    def submit(
+        self,
+        task_id: str,
+        user_id: str,
+        start: Callable[[], Awaitable[Any]],
+        lane: Optional[str] = None,
+        batch: bool = False
+    ) -> int:
+        """
+        Admit a task. `start` is awaited in a background task once a slot is free.
+        Returns 0 if the task started immediately, otherwise its queue position.
+        Raises AdmissionRejected when the global or per-user queue is full.
+        """
+        self.check_admission(user_id, batch=batch)
+        lane = self.lane_for(lane)
+        self._sequence += 1
+        job = _Job(task_id, user_id, lane, start, self._sequence, batch=batch)
+        self._queued[task_id] = job
+        if batch:
+            self._user_batch_queued[user_id] = self._user_batch_queued.get(user_id, 0) + 1
+            self._batch_queued += 1
+        else:
+            self._user_queued[user_id] = self._user_queued.get(user_id, 0) + 1
+        self._lanes[lane].users.setdefault(user_id, deque()).append(job)
+        self.total_admitted += 1
+
+        self._dispatch()
+        return self.queue_position(task_id) or 0
+
+    def _eligible(self, user_id: str) -> bool:
+        return self._user_in_flight.get(user_id, 0) < self.per_user_in_flight
+
+    def _pop_from_lane(self, lane: _Lane) -> Optional[_Job]:
+        """Next job of the first user (in round-robin order) with quota to spare"""
+        for user_id in list(lane.users):
+            if not self._eligible(user_id):
+                continue
+            jobs = lane.users[user_id]
+            job = jobs.popleft()
+            # Move the user to the back of the rotation
+            del lane.users[user_id]
+            if jobs:
+                lane.users[user_id] = jobs
+            return job
+        return None
+
+    def _next_job(self) -> Optional[_Job]:
+        # Smooth weighted round-robin across lanes that have a startable job
+        candidates = [
+            lane for lane in self._lanes.values()
+            if any(self._eligible(user_id) for user_id in lane.users)
+        ]
+        if not candidates:
+            return None
+        total = sum(lane.weight for lane in candidates)
+        for lane in candidates:
+            lane.credit += lane.weight
+        chosen = max(candidates, key=lambda lane: lane.credit)
+        chosen.credit -= total
+        return self._pop_from_lane(chosen)
+
+    def _dispatch(self):
+        if self.slots is not None:
+            self._wake.set()
+            return
+        while len(self._in_flight) < self.max_in_flight:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start(job)
+
+    def _start(self, job: _Job):
+        self._dequeue(job)
+        self._mark_running(job.task_id, job.user_id)
+        self.total_started += 1
+        asyncio.create_task(self._run(job))
+
+    def _mark_running(self, task_id: str, user_id: str):
+        self._in_flight[task_id] = (user_id, time.monotonic())
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+
+    def _has_startable(self) -> bool:
+        return any(self._eligible(user_id) for lane in self._lanes.values() for user_id in lane.users)
+
+    async def _dispatch_shared(self):
+        """Start queued tasks as slots of the shared pool become free"""
+        while True:
+            self._wake.clear()
+            try:
+                # Running tasks taken over from another worker get a slot before new ones
+                for task_id in list(self._unslotted):
+                    if not await self._lease_slot(task_id):
+                        break
+                    self._unslotted.pop(task_id, None)
+                while not self._unslotted and self._has_startable():
+                    holder = uuid.uuid4().hex
+                    if not await self.slots.acquire(holder):
+                        break
+                    job = self._next_job()
+                    if job is None:
+                        await self.slots.release(holder)
+                        break
+                    self._slot_holders[job.task_id] = holder
+                    self._start(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared slot dispatch failed: {e}")
+            # Slots freed by other workers are not announced, so look again after a while
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.slot_retry_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _lease_slot(self, task_id: str) -> bool:
+        if task_id not in self._in_flight:
+            # Finished while waiting for a slot
+            return True
+        holder = uuid.uuid4().hex
+        if not await self.slots.acquire(holder):
+            return False
+        if task_id in self._in_flight:
+            self._slot_holders[task_id] = holder
+        else:
+            await self.slots.release(holder)
+        return True
+
+    async def _release_slot(self, holder: str):
+        try:
+            await self.slots.release(holder)
+        except Exception as e:
+            # The lease lapses on its own once it is no longer renewed
+            logger.error(f"Failed to release generation slot: {e}")
+        self._wake.set()
+
+    def adopt(self, task_id: str, user_id: str):
+        """
+        Count a running task taken over from another worker against the caps. It is
+        already at Runway, so it is never queued; with a shared pool it takes the next
+        free slot ahead of queued tasks.
+        """
+        if task_id in self._in_flight:
+            return
+        self._mark_running(task_id, user_id)
+        if self.slots is not None:
+            self._unslotted[task_id] = None
+            self._wake.set()
+
+    async def _run(self, job: _Job):
+        try:
+            await job.start()
+        except Exception as e:
+            # The start callable owns its error handling; never leak the slot
+            logger.error(f"Scheduled start for task {job.task_id} failed: {e}")
+            self.release(job.task_id)
+
+    def _dequeue(self, job: _Job):
+        del self._queued[job.task_id]
+        if job.batch:
+            self._decrement(self._user_batch_queued, job.user_id)
+            self._batch_queued -= 1
+        else:
+            self._decrement(self._user_queued, job.user_id)
+
+    @staticmethod
+    def _decrement(counts: Dict[str, int], user_id: str):
+        remaining = counts.get(user_id, 0) - 1
+        if remaining > 0:
+            counts[user_id] = remaining
+        else:
+            counts.pop(user_id, None)
+
+    def release(self, task_id: str) -> bool:
+        """
+        Free the task's slot once it is final, or drop it from the queue if it never
+        started (e.g. cancelled). Safe to call more than once.
+        """
+        running = self._in_flight.pop(task_id, None)
+        if running is not None:
+            user_id, started_at = running
+            self._decrement(self._user_in_flight, user_id)
+            self._avg_task_seconds = 0.9 * self._avg_task_seconds + 0.1 * (time.monotonic() - started_at)
+            self._unslotted.pop(task_id, None)
+            holder = self._slot_holders.pop(task_id, None)
+            if holder is not None:
+                release = asyncio.create_task(self._release_slot(holder))
+                self._background.add(release)
+                release.add_done_callback(self._background.discard)
+            else:
+                self._dispatch()
+            return True
+
+        job = self._queued.get(task_id)
+        if job is None:
+            return False
+        self._dequeue(job)
+        lane = self._lanes[job.lane]
+        jobs = lane.users.get(job.user_id)
+        if jobs is not None:
+            jobs.remove(job)
+            if not jobs:
+                del lane.users[job.user_id]
+        return True
+
+    def is_queued(self, task_id: str) -> bool:
+        return task_id in self._queued
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """
+        Estimated 1-based start order among queued tasks, following the round-robin
+        and lane weights (per-user quotas are ignored). None if not queued.
+        """
+        job = self._queued.get(task_id)
+        if job is None:
+            return None
+        lane = self._lanes[job.lane]
+        rounds = lane.users[job.user_id].index(job)
+
+        # Users ahead of this one in the rotation get one more turn before it
+        ahead_in_lane = 0
+        before_user = True
+        for user_id, jobs in lane.users.items():
+            if user_id == job.user_id:
+                before_user = False
+                ahead_in_lane += rounds
+            else:
+                ahead_in_lane += min(len(jobs), rounds + (1 if before_user else 0))
+
+        # Meanwhile the other lanes start tasks in proportion to their weights
+        other_lanes = [other for other in self._lanes.values() if other is not lane and other.users]
+        other_weight = sum(other.weight for other in other_lanes)
+        other_queued = sum(len(other) for other in other_lanes)
+        ahead_elsewhere = min(other_queued, int((ahead_in_lane + 1) * other_weight / lane.weight))
+        return ahead_in_lane + ahead_elsewhere + 1
+
+    def estimated_wait(self, task_id: str) -> Optional[float]:
+        position = self.queue_position(task_id)
+        if position is None:
+            return None
+        return (position / max(self.max_in_flight, 1)) * self._avg_task_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "max_in_flight": self.max_in_flight,
+            "shared_slots": self.slots is not None,
+            "awaiting_slot": len(self._unslotted),
+            "per_user_in_flight": self.per_user_in_flight,
+            "queued": len(self._queued),
+            "max_queued": self.max_queued,
+            "batch_queued": self._batch_queued,
+            "max_batch_queued": self.max_batch_queued,
+            "lanes": {name: {"weight": lane.weight, "queued": len(lane), "users": len(lane.users)}
+                      for name, lane in self._lanes.items()},
+            "active_users": len(self._user_in_flight),
+            "avg_task_seconds": round(self._avg_task_seconds, 1),
+            "total_admitted": self.total_admitted,
+            "total_started": self.total_started,
+            "total_rejected": self.total_rejected
+        }
@@ -7,19 +7,62 @@ AI video generation including text-to-video and image-to-video capabilities.
 
 import os
 import asyncio
-import aiofiles
-import aiohttp
-import json
 import time
 import uuid
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 from runwayml import AsyncRunwayML
 import logging
 
+from services.runway_task_store import (
+    TaskStore, TERMINAL_STATUSES, create_task_store, encode_task_cursor, decode_task_cursor
+)
+from services.runway_task_poller import RunwayTaskPoller
+from services.runway_task_events import TaskEventBroker
+from services.http_client_pool import HTTPClientPool, http_client_pool
+from services.runway_image_store import ImageStore
+from services.health_probes import health_probes
+from services.runway_admission import GenerationScheduler, AdmissionRejected, create_slot_pool
+from services.runway_request_dedup import RequestCoalescer, request_fingerprint
+from services.runway_result_cache import create_result_cache, result_cache_key
+from services.credit_ledger import CreditLedger, InsufficientCredits, credit_ledger
+from utils.uploads import publish_file
+
 logger = logging.getLogger(__name__)
 
+# Admission lane per subscription tier; unknown or missing tiers use the free lane
+ADMISSION_LANE_BY_TIER = {
+    "enterprise": "priority",
+    "business": "priority",
+    "pro": "priority",
+    "premium": "priority",
+    "creator": "standard",
+    "standard": "standard",
+    "basic": "standard"
+}
+
+SUPPORTED_RATIOS = ("16:9", "9:16", "1:1")
+
+# Progress reported for a task that has not recorded its own
+STATUS_PROGRESS = {
+    "queued": 0.0,
+    "initializing": 10.0,
+    "generating": 20.0,
+    "processing": 60.0,
+    "completed": 100.0,
+    "failed": 0.0,
+    "error": 0.0,
+    "timeout": 0.0,
+    "cancelled": 0.0
+}
+
+# Internal steps reported as "processing", the status the create endpoints answer with
+REPORTED_STATUS = {
+    "initializing": "processing",
+    "generating": "processing"
+}
+
 class RunwayVideoRequest(BaseModel):
     """Request model for Runway video generation"""
     prompt_text: str = Field(..., description="Text prompt for video generation")
@@ -39,6 +82,7 @@ class TaskStatusResponse(BaseModel):
     created_at: str
     estimated_completion: Optional[str] = None
     cost_credits: Optional[int] = None
+    queue_position: Optional[int] = None
 
 class RunwayVideoResponse(BaseModel):
     """Response model for video generation initiation"""
@@ -47,18 +91,114 @@ class RunwayVideoResponse(BaseModel):
     message: str
     estimated_cost: int
     estimated_duration: int
+    queue_position: Optional[int] = None
+
+class RunwaySeedRange(BaseModel):
+    """Consecutive seeds for a seed sweep"""
+    start: int = Field(default=0, ge=0, description="First seed")
+    count: int = Field(..., ge=1, description="Number of seeds")
+
+class RunwayBatchRequest(BaseModel):
+    """
+    Batch of generations: either explicit `jobs`, or one prompt template fanned out
+    over `seed_range` and/or `ratios`
+    """
+    jobs: Optional[List[RunwayVideoRequest]] = Field(None, description="Explicit job specs")
+    prompt_text: Optional[str] = Field(None, description="Template prompt (when 'jobs' is omitted)")
+    prompt_image: Optional[str] = Field(None, description="URL of the image for image-to-video")
+    duration: int = Field(default=5, ge=5, le=10, description="Video duration in seconds (5-10)")
+    ratio: str = Field(default="16:9", pattern="^(16:9|9:16|1:1)$", description="Aspect ratio")
+    ratios: Optional[List[str]] = Field(None, description="One job per aspect ratio")
+    seed: Optional[int] = Field(None, description="Seed, when no seed range is given")
+    seed_range: Optional[RunwaySeedRange] = Field(None, description="One job per seed")
+    model: str = Field(default="gen3a_turbo", description="Runway model to use")
+
+class RunwayBatchJobResult(BaseModel):
+    """Outcome of creating one job of a batch"""
+    index: int
+    task_id: Optional[str] = None
+    status: str
+    estimated_cost: int
+    queue_position: Optional[int] = None
+    error_message: Optional[str] = None
+
+class RunwayBatchResponse(BaseModel):
+    """Response model for batch submission"""
+    batch_id: str
+    status: str
+    total_jobs: int
+    accepted_jobs: int
+    estimated_cost: int
+    jobs: List[RunwayBatchJobResult]
 
 class RunwayGen3Service:
     """Runway Gen-3 Alpha Turbo video generation service"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        task_store: Optional[TaskStore] = None,
+        http_pool: Optional[HTTPClientPool] = None,
+        ledger: Optional[CreditLedger] = None
+    ):
         self.api_key = os.getenv("RUNWAY_API_KEY")
         if not self.api_key:
             raise ValueError("RUNWAY_API_KEY environment variable is required")
         
         self.base_url = "https://api.dev.runwayml.com/v1"
         self.client = None
-        self.active_tasks: Dict[str, Dict[str, Any]] = {}
+        self.http_pool = http_pool or http_client_pool
+        self.image_store = ImageStore(retention_seconds=float(os.getenv("RUNWAY_IMAGE_RETENTION_SECONDS", "3600")))
+        # task_id -> digest of the published input image this worker holds a reference on
+        self._image_refs: Dict[str, str] = {}
+        self.task_store = task_store or create_task_store()
+        self.events = TaskEventBroker()
+        self.ledger = ledger or credit_ledger
+        self.ledger.hold_is_live = self._task_holds_credits
+        self.image_store.is_referenced = self.task_store.references_image
+        
+        # Unfinished tasks are leased to the worker running them; tasks whose lease
+        # lapses (the worker stopped) are adopted by another worker or after a restart
+        self.worker_id = uuid.uuid4().hex
+        self.task_lease_seconds = float(os.getenv("RUNWAY_TASK_LEASE_SECONDS", "60"))
+        self._lease_keeper: Optional[asyncio.Task] = None
+        
+        # Fair-share admission: global in-flight cap, per-user quota, weighted lanes.
+        # With the MongoDB task store the cap is shared by every worker.
+        max_in_flight = int(os.getenv("RUNWAY_MAX_IN_FLIGHT", "10"))
+        self.scheduler = GenerationScheduler(
+            max_in_flight=max_in_flight,
+            per_user_in_flight=int(os.getenv("RUNWAY_MAX_IN_FLIGHT_PER_USER", "2")),
+            max_queued=int(os.getenv("RUNWAY_MAX_QUEUED", "500")),
+            max_queued_per_user=int(os.getenv("RUNWAY_MAX_QUEUED_PER_USER", "20")),
+            max_batch_queued=int(os.getenv("RUNWAY_MAX_BATCH_QUEUED", "10000")),
+            max_batch_queued_per_user=int(os.getenv("RUNWAY_MAX_BATCH_QUEUED_PER_USER", "2000")),
+            slots=create_slot_pool(max_in_flight, self.worker_id, self.task_lease_seconds)
+        )
+        self.max_batch_jobs = int(os.getenv("RUNWAY_BATCH_MAX_JOBS", "1000"))
+        
+        # Idempotency keys and coalescing of identical in-flight requests
+        self.coalescer = RequestCoalescer(
+            key_ttl_seconds=float(os.getenv("RUNWAY_IDEMPOTENCY_TTL_SECONDS", "86400"))
+        )
+        
+        # Completed videos of seeded requests, replayed without calling Runway (None = off)
+        self.result_cache = create_result_cache(
+            ttl_seconds=float(os.getenv("RUNWAY_RESULT_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("RUNWAY_RESULT_CACHE_MAX_ENTRIES", "10000"))
+        )
+        
+        # One shared poller for every outstanding Runway task
+        self.generation_timeout = 300  # 5 minutes maximum wait time
+        self.poller = RunwayTaskPoller(
+            get_client=self.get_client,
+            on_status=self._handle_runway_status,
+            on_error=self._handle_poll_error,
+            on_timeout=self._handle_poll_timeout,
+            batch_size=int(os.getenv("RUNWAY_POLL_BATCH_SIZE", "25")),
+            max_concurrency=int(os.getenv("RUNWAY_POLL_CONCURRENCY", "8")),
+            requests_per_second=float(os.getenv("RUNWAY_POLL_RPS", "5")),
+            timeout_seconds=self.generation_timeout
+        )
         
         # Pricing configuration (in credits)
         self.pricing = {
@@ -73,52 +213,99 @@ class RunwayGen3Service:
                 "quality": "standard"
             }
         }
+        
+        # Static part of the health report, built once
+        self._health_static = {
+            "service": "Runway Gen-3 Alpha Turbo",
+            "models_available": ["gen3a_turbo", "gen3a"],
+            "features": [
+                "Text-to-video generation",
+                "Image-to-video generation", 
+                "Professional quality output",
+                "5-10 second videos",
+                "Multiple aspect ratios",
+                "Seed support for reproducibility"
+            ],
+            "pricing": self.pricing,
+            "max_duration": 10,
+            "supported_ratios": ["16:9", "9:16", "1:1"]
+        }
+    
+    async def initialize(self):
+        """Prepare the task store backend"""
+        await self.task_store.initialize()
+        # Before task recovery, so resumed tasks re-acquire the images they still need
+        await self.image_store.initialize()
+        await self.ledger.start()
+        if self.scheduler.slots is not None:
+            await self.scheduler.slots.initialize()
+        self.scheduler.start()
+        if self.result_cache is not None:
+            await self.result_cache.initialize()
+        # Upstream reachability is checked in the background, never per request
+        health_probes.register(
+            "runway",
+            self.probe_upstream,
+            interval=float(os.getenv("RUNWAY_HEALTH_PROBE_INTERVAL", "30")),
+            critical=False
+        )
+        # The first pass adopts whatever a previous process left unfinished
+        if self._lease_keeper is None:
+            self._lease_keeper = asyncio.create_task(self._keep_task_leases())
+        logger.info(f"Runway Gen-3 service initialized with {type(self.task_store).__name__}")
+    
+    async def shutdown(self):
+        """Stop background polling and write out pending credit changes"""
+        if self._lease_keeper is not None:
+            self._lease_keeper.cancel()
+            await asyncio.gather(self._lease_keeper, return_exceptions=True)
+            self._lease_keeper = None
+        await self.scheduler.stop()
+        await self.poller.stop()
+        await self.ledger.stop()
     
     async def get_client(self) -> AsyncRunwayML:
         """Get or create async Runway client"""
         if not self.client:
-            self.client = AsyncRunwayML(api_key=self.api_key)
+            # Share the pooled connections (and their per-host caps) instead of opening a private client
+            self.client = AsyncRunwayML(api_key=self.api_key, http_client=self.http_pool.client)
         return self.client
     
+    async def probe_upstream(self) -> Dict[str, Any]:
+        """Authenticated round trip to Runway (used by the background health probe)"""
+        client = await self.get_client()
+        organization = await client.organization.retrieve()
+        return {"credit_balance": getattr(organization, "credit_balance", None)}
+    
     async def health_check(self) -> Dict[str, Any]:
-        """Check service health and connectivity"""
-        try:
-            client = await self.get_client()
-            
-            # Try to authenticate by making a simple API call
-            # This will verify the API key is working
-            health_data = {
-                "service": "Runway Gen-3 Alpha Turbo",
-                "status": "healthy",
-                "api_connected": True,
-                "models_available": ["gen3a_turbo", "gen3a"],
-                "features": [
-                    "Text-to-video generation",
-                    "Image-to-video generation", 
-                    "Professional quality output",
-                    "5-10 second videos",
-                    "Multiple aspect ratios",
-                    "Seed support for reproducibility"
-                ],
-                "pricing": self.pricing,
-                "active_tasks": len(self.active_tasks),
-                "max_duration": 10,
-                "supported_ratios": ["16:9", "9:16", "1:1"],
-                "timestamp": time.time()
-            }
-            
-            logger.info("Runway Gen-3 service health check passed")
-            return health_data
-            
-        except Exception as e:
-            logger.error(f"Runway Gen-3 service health check failed: {str(e)}")
-            return {
-                "service": "Runway Gen-3 Alpha Turbo",
-                "status": "unhealthy",
-                "api_connected": False,
-                "error": str(e),
-                "timestamp": time.time()
-            }
+        """Service health from the cached upstream probe plus local state"""
+        probe = health_probes.result("runway")
+        if probe is None:
+            status, api_connected = "unknown", None
+        else:
+            status, api_connected = probe.status, probe.status == "healthy"
+        
+        health_data = {
+            **self._health_static,
+            "status": status,
+            "api_connected": api_connected,
+            "active_tasks": await self.task_store.count(),
+            "poller": self.poller.stats(),
+            "event_stream": self.events.stats(),
+            "http_pool": self.http_pool.metrics(),
+            "image_store": self.image_store.stats(),
+            "admission": self.scheduler.stats(),
+            "deduplication": self.coalescer.stats(),
+            "credit_ledger": self.ledger.stats(),
+            "result_cache": self.result_cache.stats() if self.result_cache is not None else None,
+            "timestamp": time.time()
+        }
+        if probe is not None:
+            health_data["checked_at"] = probe.checked_at
+            health_data["upstream_latency_ms"] = probe.latency_ms
+            if probe.error:
+                health_data["error"] = probe.error
+        return health_data
     
     async def estimate_cost(self, duration: int, model: str = "gen3a_turbo") -> Dict[str, Any]:
         """Estimate generation cost in credits"""
@@ -162,15 +349,9 @@ class RunwayGen3Service:
             # This is a simplified approach - in production, use proper cloud storage
             filename = Path(image_path).name
             public_dir = Path("/tmp/public")
-            public_dir.mkdir(exist_ok=True)
-            
-            # Copy file to public directory
-            public_file_path = public_dir / filename
             
-            async with aiofiles.open(image_path, 'rb') as source:
-                content = await source.read()
-                async with aiofiles.open(public_file_path, 'wb') as destination:
-                    await destination.write(content)
+            # Hardlink (or kernel-side copy across filesystems) instead of re-reading the file
+            await publish_file(Path(image_path), public_dir / filename)
             
             # Return a public URL - in production this would be a real public URL
             # For now, we'll use a placeholder that would need to be served by the app
@@ -187,25 +368,119 @@ class RunwayGen3Service:
         self,
         request: RunwayVideoRequest,
         user_id: str,
-        image_path: Optional[str] = None
+        image_path: Optional[str] = None,
+        image_sha256: Optional[str] = None,
+        subscription_tier: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        charge_credits: bool = False
+    ) -> RunwayVideoResponse:
+        """
+        Create a new video generation task. It starts right away if the admission
+        scheduler has a slot, otherwise it waits in the "queued" state.
+        
+        A repeat of an Idempotency-Key, or a request identical to one whose task is still
+        running, returns that existing task with its current status instead.
+        With `charge_credits`, the cost is held against the user's credits in the credit
+        ledger and charged only if the task completes.
+        
+        Raises AdmissionRejected when the queues are full, InsufficientCredits when the
+        balance does not cover the cost and IdempotencyConflict when the key was used
+        for different parameters.
+        """
+        # Requests with an image file can only be matched by the image's hash
+        fingerprint = None
+        cache_key = None
+        if image_sha256 or not image_path:
+            fingerprint = request_fingerprint(user_id, request.dict(), image_sha256)
+            if self.result_cache is not None:
+                cache_key = result_cache_key(user_id, request.dict(), image_sha256)
+        
+        response, duplicate = await self.coalescer.run(
+            user_id,
+            fingerprint,
+            idempotency_key,
+            lambda: self._create_video_generation_task(
+                request, user_id, image_path, image_sha256, subscription_tier, fingerprint, cache_key,
+                charge_credits
+            )
+        )
+        if not duplicate:
+            return response
+        
+        # The duplicate's upload is not needed; the original task has its own copy
+        if image_path:
+            Path(image_path).unlink(missing_ok=True)
+        return await self._duplicate_response(response)
+    
+    async def _duplicate_response(self, original: RunwayVideoResponse) -> RunwayVideoResponse:
+        """The original creation response, refreshed with the task's current state"""
+        task_data = await self.task_store.get(original.task_id)
+        status = task_data["status"] if task_data else original.status
+        logger.info(f"Duplicate request attached to existing task {original.task_id}")
+        return RunwayVideoResponse(
+            task_id=original.task_id,
+            status=status,
+            message="Duplicate request; returning the existing task",
+            estimated_cost=original.estimated_cost,
+            estimated_duration=original.estimated_duration,
+            queue_position=self.scheduler.queue_position(original.task_id)
+        )
+    
+    async def _create_video_generation_task(
+        self,
+        request: RunwayVideoRequest,
+        user_id: str,
+        image_path: Optional[str],
+        image_sha256: Optional[str],
+        subscription_tier: Optional[str],
+        fingerprint: Optional[str],
+        cache_key: Optional[str] = None,
+        charge_credits: bool = False,
+        batch_fields: Optional[Dict[str, Any]] = None,
+        shared_image_url: Optional[str] = None
     ) -> RunwayVideoResponse:
-        """Create a new video generation task"""
+        # Seeded requests seen before complete immediately, without a slot or upload
+        if cache_key is not None:
+            cached = await self.result_cache.get(cache_key)
+            if cached is not None:
+                return await self._create_cached_task(
+                    request, user_id, image_path, fingerprint, cache_key, cached, batch_fields
+                )
+        
+        # Reject before uploading or storing anything (batches are admitted as a whole)
+        if batch_fields is None:
+            self.scheduler.check_admission(user_id)
+        
         try:
             # Generate unique task ID
             task_id = str(uuid.uuid4())
+            task_created = False
             
             # Estimate cost
             cost_estimate = await self.estimate_cost(request.duration, request.model)
             
-            # Handle image upload if provided
+            # Hold the credits before any work is done (keyed by task id)
+            if charge_credits:
+                await self.ledger.reserve(user_id, cost_estimate["cost_credits"], reservation_id=task_id)
+            
+            # Handle image upload if provided; hashed uploads are deduplicated by content
             image_url = None
-            if image_path:
+            if shared_image_url and image_sha256:
+                # Already published by the batch; each task holds its own reference
+                self.image_store.acquire(image_sha256)
+                self._image_refs[task_id] = image_sha256
+                image_url = shared_image_url
+            elif image_path and image_sha256:
+                image_url = await self.image_store.publish(Path(image_path), image_sha256)
+                self._image_refs[task_id] = image_sha256
+                image_path = None
+            elif image_path:
                 image_url = await self.upload_image_to_public_url(image_path)
             elif request.prompt_image:
                 image_url = request.prompt_image
             
             # Initialize task tracking
-            self.active_tasks[task_id] = {
+            task_data = await self.task_store.create(task_id, {
                 "status": "initializing",
                 "created_at": time.time(),
                 "user_id": user_id,
@@ -213,11 +488,44 @@ class RunwayGen3Service:
                 "image_url": image_url,
                 "cost_credits": cost_estimate["cost_credits"],
                 "estimated_completion": time.time() + 120,  # 2 minutes estimate
-                "temp_file_path": image_path
-            }
+                "temp_file_path": image_path,
+                "image_sha256": image_sha256,
+                "result_cache_key": cache_key,
+                "credits_reserved": charge_credits,
+                "owner": self.worker_id,
+                "lease_expires_at": time.time() + self.task_lease_seconds,
+                **(batch_fields or {})
+            })
+            task_created = True
+            self._publish_task_event(task_data)
+            
+            # Start generation when the scheduler grants a slot
+            self.coalescer.bind(task_id, fingerprint)
+            try:
+                queue_position = self.scheduler.submit(
+                    task_id,
+                    user_id,
+                    lambda: self._process_video_generation(task_id),
+                    lane=ADMISSION_LANE_BY_TIER.get((subscription_tier or "").lower()),
+                    batch=batch_fields is not None
+                )
+            except AdmissionRejected:
+                # Lost a race for the last queue spot since check_admission
+                await self._transition(task_id, "failed", fields={"error_message": "Generation queue is full"})
+                await self._finalize_task(task_id)
+                raise
             
-            # Start generation in background
-            asyncio.create_task(self._process_video_generation(task_id))
+            if queue_position:
+                await self._transition(task_id, "queued", from_statuses=["initializing"])
+                logger.info(f"Queued Runway video generation task {task_id} at position {queue_position}")
+                return RunwayVideoResponse(
+                    task_id=task_id,
+                    status="queued",
+                    message="Video generation queued",
+                    estimated_cost=cost_estimate["cost_credits"],
+                    estimated_duration=int(120 + (self.scheduler.estimated_wait(task_id) or 0)),
+                    queue_position=queue_position
+                )
             
             logger.info(f"Created Runway video generation task {task_id}")
             
@@ -229,20 +537,264 @@ class RunwayGen3Service:
                 estimated_duration=120
             )
             
+        except (AdmissionRejected, InsufficientCredits):
+            self.ledger.refund(task_id)
+            self._release_image_ref(task_id)
+            raise
         except Exception as e:
+            if task_created:
+                # Never leave a stored task behind in "initializing"
+                await self._transition(task_id, "failed", fields={"error_message": f"Task creation failed: {str(e)}"})
+                await self._finalize_task(task_id)
+            else:
+                self.ledger.refund(task_id)
+                self._release_image_ref(task_id)
             logger.error(f"Failed to create video generation task: {str(e)}")
             raise Exception(f"Task creation failed: {str(e)}")
     
+    async def _create_cached_task(
+        self,
+        request: RunwayVideoRequest,
+        user_id: str,
+        image_path: Optional[str],
+        fingerprint: Optional[str],
+        cache_key: str,
+        cached: Dict[str, Any],
+        batch_fields: Optional[Dict[str, Any]] = None
+    ) -> RunwayVideoResponse:
+        """Record a task that completed from the seeded result cache"""
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        task_data = await self.task_store.create(task_id, {
+            "status": "completed",
+            "created_at": now,
+            "user_id": user_id,
+            "request": request.dict(),
+            "image_url": cached.get("image_url"),
+            "video_url": cached["video_url"],
+            "progress": 100.0,
+            "cost_credits": 0,  # No Runway generation was run
+            "estimated_completion": now,
+            "temp_file_path": image_path,
+            "result_cache_key": cache_key,
+            "cache_hit": True,
+            "source_task_id": cached.get("source_task_id"),
+            **(batch_fields or {})
+        })
+        self._publish_task_event(task_data)
+        self.coalescer.bind(task_id, fingerprint)
+        await self._finalize_task(task_id)
+        
+        logger.info(f"Task {task_id} served from seeded result cache (source {cached.get('source_task_id')})")
+        return RunwayVideoResponse(
+            task_id=task_id,
+            status="completed",
+            message="Video served from the seeded result cache",
+            estimated_cost=0,
+            estimated_duration=0
+        )
+    
+    def expand_batch(self, batch: RunwayBatchRequest) -> List[RunwayVideoRequest]:
+        """
+        Turn a batch spec into its generation requests: the explicit job list, or the
+        template crossed with every ratio and seed. Raises ValueError for an empty,
+        oversized or otherwise invalid batch.
+        """
+        if batch.jobs is not None:
+            if batch.prompt_text is not None:
+                raise ValueError("Give either 'jobs' or a 'prompt_text' template, not both")
+            job_count = len(batch.jobs)
+        else:
+            if not batch.prompt_text:
+                raise ValueError("Either 'jobs' or 'prompt_text' is required")
+            ratios = batch.ratios or [batch.ratio]
+            invalid_ratios = [ratio for ratio in ratios if ratio not in SUPPORTED_RATIOS]
+            if invalid_ratios:
+                raise ValueError(f"Invalid aspect ratio: {', '.join(invalid_ratios)}")
+            if batch.seed_range is not None:
+                seeds = range(batch.seed_range.start, batch.seed_range.start + batch.seed_range.count)
+            else:
+                seeds = [batch.seed]
+            job_count = len(ratios) * len(seeds)
+        
+        # Checked before expanding so a huge seed range is never materialised
+        if job_count == 0:
+            raise ValueError("Batch has no jobs")
+        if job_count > self.max_batch_jobs:
+            raise ValueError(f"Batch has {job_count} jobs (max {self.max_batch_jobs})")
+        
+        if batch.jobs is not None:
+            requests = list(batch.jobs)
+        else:
+            requests = [
+                RunwayVideoRequest(
+                    prompt_text=batch.prompt_text,
+                    prompt_image=batch.prompt_image,
+                    duration=batch.duration,
+                    ratio=ratio,
+                    seed=seed,
+                    model=batch.model
+                )
+                for ratio in ratios
+                for seed in seeds
+            ]
+        
+        unknown_models = sorted({request.model for request in requests} - set(self.pricing))
+        if unknown_models:
+            raise ValueError(f"Unknown model: {', '.join(unknown_models)}")
+        return requests
+    
+    async def create_batch(
+        self,
+        requests: List[RunwayVideoRequest],
+        user_id: str,
+        image_path: Optional[str] = None,
+        image_sha256: Optional[str] = None,
+        subscription_tier: Optional[str] = None,
+        charge_credits: bool = False
+    ) -> RunwayBatchResponse:
+        """
+        Create one task per request under a new batch id. The whole batch is priced
+        and admitted up front, so nothing is created unless every job fits the queue
+        and the user's available credits. An uploaded image is published once and
+        shared by every job without its own prompt_image.
+        
+        Identical jobs are not coalesced (unseeded repeats are deliberate variations).
+        Jobs that still fail to be created are reported individually.
+        Raises AdmissionRejected and InsufficientCredits for the batch as a whole.
+        """
+        batch_id = str(uuid.uuid4())
+        costs = [self.pricing[request.model]["cost_per_second"] * request.duration for request in requests]
+        total_cost = sum(costs)
+        
+        if charge_credits:
+            available = await self.ledger.available(user_id)
+            if total_cost > available:
+                raise InsufficientCredits(total_cost, available)
+        self.scheduler.check_admission(user_id, count=len(requests), batch=True)
+        
+        shared_image_url = None
+        if image_path and image_sha256:
+            # The batch holds one reference until every job has taken its own
+            shared_image_url = await self.image_store.publish(Path(image_path), image_sha256)
+        
+        jobs: List[RunwayBatchJobResult] = []
+        try:
+            for index, request in enumerate(requests):
+                uses_upload = shared_image_url is not None and not request.prompt_image
+                job_image_sha256 = image_sha256 if uses_upload else None
+                cache_key = None
+                if self.result_cache is not None:
+                    cache_key = result_cache_key(user_id, request.dict(), job_image_sha256)
+                try:
+                    response = await self._create_video_generation_task(
+                        request, user_id, None, job_image_sha256, subscription_tier, None, cache_key,
+                        charge_credits,
+                        batch_fields={"batch_id": batch_id, "batch_index": index},
+                        shared_image_url=shared_image_url if uses_upload else None
+                    )
+                except (AdmissionRejected, InsufficientCredits) as e:
+                    jobs.append(RunwayBatchJobResult(
+                        index=index, status="rejected", estimated_cost=costs[index], error_message=str(e)
+                    ))
+                    continue
+                except Exception as e:
+                    jobs.append(RunwayBatchJobResult(
+                        index=index, status="failed", estimated_cost=costs[index], error_message=str(e)
+                    ))
+                    continue
+                
+                jobs.append(RunwayBatchJobResult(
+                    index=index,
+                    task_id=response.task_id,
+                    status=response.status,
+                    estimated_cost=response.estimated_cost,
+                    queue_position=response.queue_position
+                ))
+        finally:
+            if shared_image_url is not None:
+                self.image_store.release(image_sha256)
+        
+        accepted = [job for job in jobs if job.task_id is not None]
+        logger.info(f"Created Runway batch {batch_id} for user {user_id}: {len(accepted)}/{len(jobs)} jobs accepted")
+        return RunwayBatchResponse(
+            batch_id=batch_id,
+            status="accepted" if len(accepted) == len(jobs) else "partially_accepted",
+            total_jobs=len(jobs),
+            accepted_jobs=len(accepted),
+            estimated_cost=sum(job.estimated_cost for job in accepted),
+            jobs=jobs
+        )
+    
+    async def get_batch_status(self, batch_id: str, user_id: str, include_jobs: bool = True) -> Dict[str, Any]:
+        """
+        Aggregate status of the tasks created for a batch owned by `user_id`. Raises
+        LookupError if the batch is unknown or belongs to someone else.
+        """
+        tasks = await self.task_store.list_by_batch(batch_id)
+        if not tasks or tasks[0].get("user_id") != user_id:
+            raise LookupError("Batch not found")
+        
+        counts: Dict[str, int] = {}
+        progress_total = 0.0
+        for task_data in tasks:
+            status = task_data["status"]
+            reported = REPORTED_STATUS.get(status, status)
+            counts[reported] = counts.get(reported, 0) + 1
+            progress_total += task_data.get("progress", STATUS_PROGRESS.get(status, 0.0))
+        
+        finished = sum(counts.get(status, 0) for status in TERMINAL_STATUSES)
+        completed = counts.get("completed", 0)
+        if finished < len(tasks):
+            status = "queued" if counts.get("queued", 0) == len(tasks) else "processing"
+        elif completed == len(tasks):
+            status = "completed"
+        elif completed == 0:
+            status = "failed"
+        else:
+            status = "partially_completed"
+        
+        batch_status = {
+            "batch_id": batch_id,
+            "status": status,
+            "total_jobs": len(tasks),
+            "finished_jobs": finished,
+            "counts": counts,
+            "progress": round(progress_total / len(tasks), 1),
+            "cost_credits": sum(task_data.get("cost_credits") or 0 for task_data in tasks),
+            "created_at": min(task_data["created_at"] for task_data in tasks)
+        }
+        if include_jobs:
+            batch_status["jobs"] = [
+                {
+                    "index": task_data.get("batch_index"),
+                    "task_id": task_data["task_id"],
+                    "status": REPORTED_STATUS.get(task_data["status"], task_data["status"]),
+                    "progress": task_data.get("progress", STATUS_PROGRESS.get(task_data["status"], 0.0)),
+                    "video_url": task_data.get("video_url"),
+                    "error_message": task_data.get("error_message"),
+                    "queue_position": (
+                        self.scheduler.queue_position(task_data["task_id"])
+                        if task_data["status"] == "queued" else None
+                    )
+                }
+                for task_data in tasks
+            ]
+        return batch_status
+    
     async def _process_video_generation(self, task_id: str):
         """Background task for processing video generation"""
+        runway_task = None
         try:
-            task_data = self.active_tasks[task_id]
+            task_data = await self._transition(
+                task_id, "generating", from_statuses=["initializing", "queued"], fields={"progress": 20.0}
+            )
+            if task_data is None:
+                logger.info(f"Task {task_id} is no longer pending, skipping generation")
+                await self._finalize_task(task_id)
+                return
             request_data = task_data["request"]
             
-            # Update status
-            self.active_tasks[task_id]["status"] = "generating"
-            self.active_tasks[task_id]["progress"] = 20.0
-            
             # Get Runway client
             client = await self.get_client()
             
@@ -258,8 +810,8 @@ class RunwayGen3Service:
             if task_data.get("image_url"):
                 generation_params["prompt_image"] = task_data["image_url"]
             
-            # Add seed if provided
-            if request_data.get("seed"):
+            # Add seed if provided (0 is a valid seed)
+            if request_data.get("seed") is not None:
                 generation_params["seed"] = request_data["seed"]
             
             logger.info(f"Starting Runway generation for task {task_id} with params: {generation_params}")
@@ -267,103 +819,226 @@ class RunwayGen3Service:
             # Create video generation task with Runway
             runway_task = await client.image_to_video.create(**generation_params)
             
-            self.active_tasks[task_id]["runway_task_id"] = runway_task.id
-            self.active_tasks[task_id]["status"] = "processing"
-            self.active_tasks[task_id]["progress"] = 40.0
-            
-            # Poll for completion
-            max_attempts = 60  # 5 minutes maximum wait time
-            attempt = 0
-            
-            while attempt < max_attempts:
-                try:
-                    # Check task status
-                    task_status = await client.tasks.retrieve(runway_task.id)
-                    
-                    self.active_tasks[task_id]["runway_status"] = task_status.status
-                    
-                    if task_status.status == "SUCCEEDED":
-                        self.active_tasks[task_id]["status"] = "completed"
-                        self.active_tasks[task_id]["progress"] = 100.0
-                        
-                        # Extract video URL from output
-                        if hasattr(task_status, 'output') and task_status.output:
-                            if isinstance(task_status.output, list) and len(task_status.output) > 0:
-                                self.active_tasks[task_id]["video_url"] = task_status.output[0]
-                            elif isinstance(task_status.output, str):
-                                self.active_tasks[task_id]["video_url"] = task_status.output
-                            else:
-                                self.active_tasks[task_id]["video_url"] = str(task_status.output)
-                        
-                        logger.info(f"Runway generation completed for task {task_id}")
-                        break
-                        
-                    elif task_status.status == "FAILED":
-                        self.active_tasks[task_id]["status"] = "failed"
-                        self.active_tasks[task_id]["error_message"] = getattr(task_status, 'failure_reason', 'Generation failed')
-                        logger.error(f"Runway generation failed for task {task_id}: {self.active_tasks[task_id]['error_message']}")
-                        break
-                        
-                    else:
-                        # Still processing, update progress
-                        progress = min(40.0 + (attempt / max_attempts) * 50.0, 90.0)
-                        self.active_tasks[task_id]["progress"] = progress
-                        
-                        await asyncio.sleep(5)
-                        attempt += 1
-                        
-                except Exception as e:
-                    self.active_tasks[task_id]["status"] = "error"
-                    self.active_tasks[task_id]["error_message"] = f"Status check failed: {str(e)}"
-                    logger.error(f"Status check failed for task {task_id}: {str(e)}")
-                    break
+            if not await self._transition(
+                task_id, "processing", from_statuses=["generating"],
+                fields={"runway_task_id": runway_task.id, "submitted_at": time.time(), "progress": 40.0}
+            ):
+                logger.info(f"Task {task_id} was cancelled after submission to Runway")
+                # Nobody will poll or pay for it, so stop the upstream job too
+                await self._cancel_upstream(runway_task.id)
+                await self._finalize_task(task_id)
+                return
             
-            if attempt >= max_attempts:
-                self.active_tasks[task_id]["status"] = "timeout"
-                self.active_tasks[task_id]["error_message"] = "Generation timeout exceeded"
-                logger.error(f"Generation timeout exceeded for task {task_id}")
+            # Hand the Runway task to the shared poller
+            self.poller.track(task_id, runway_task.id)
                 
         except Exception as e:
-            self.active_tasks[task_id]["status"] = "failed"
-            self.active_tasks[task_id]["error_message"] = str(e)
+            await self._transition(task_id, "failed", fields={"error_message": str(e)})
             logger.error(f"Generation failed for task {task_id}: {str(e)}")
+            if runway_task is not None:
+                await self._cancel_upstream(runway_task.id)
+            await self._finalize_task(task_id)
+    
+    async def _cancel_upstream(self, runway_task_id: str):
+        """Cancel a Runway task we no longer track; failures are logged, not raised"""
+        try:
+            client = await self.get_client()
+            await client.tasks.delete(runway_task_id)
+            logger.info(f"Cancelled Runway task {runway_task_id}")
+        except Exception as e:
+            logger.warning(f"Failed to cancel Runway task {runway_task_id}: {str(e)}")
+    
+    async def _keep_task_leases(self):
+        """Renew this worker's task leases and adopt tasks whose worker went away"""
+        while True:
+            try:
+                now = time.time()
+                expires_at = now + self.task_lease_seconds
+                await self.task_store.renew_leases(self.worker_id, expires_at)
+                await self.scheduler.renew_slots()
+                for task_data in await self.task_store.claim_orphaned(self.worker_id, now, expires_at):
+                    await self._recover_task(task_data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Task lease maintenance failed: {str(e)}")
+            await asyncio.sleep(self.task_lease_seconds / 3)
+    
+    async def _task_holds_credits(self, task_id: str) -> bool:
+        """Whether an orphaned credit hold belongs to a task that can still be charged"""
+        task_data = await self.task_store.get(task_id)
+        return task_data is not None and task_data["status"] not in TERMINAL_STATUSES
+    
+    async def _recover_task(self, task_data: Dict[str, Any]):
+        """
+        Take over an unfinished task from a stopped worker: resume polling it if it
+        reached Runway, otherwise fail it. Either way its credit hold is taken over, so
+        finalizing the task charges or releases it.
+        """
+        task_id = task_data["task_id"]
+        runway_task_id = task_data.get("runway_task_id")
+        if task_data.get("credits_reserved"):
+            self.ledger.restore(task_id, task_data["user_id"], task_data.get("cost_credits") or 0)
+        if task_data["status"] == "processing" and runway_task_id:
+            digest = task_data.get("image_sha256")
+            if digest and task_data.get("image_url") and task_id not in self._image_refs:
+                self.image_store.acquire(digest)
+                self._image_refs[task_id] = digest
+            # Already running at Runway: count it against the in-flight caps
+            self.scheduler.adopt(task_id, task_data["user_id"])
+            self.poller.track(task_id, runway_task_id, submitted_at=task_data.get("submitted_at") or task_data["created_at"])
+            logger.info(f"Resumed polling orphaned task {task_id} (Runway task {runway_task_id})")
+            return
+        
+        await self._transition(task_id, "failed", fields={"error_message": "Interrupted by a server restart"})
+        logger.warning(f"Failed orphaned task {task_id} left in '{task_data['status']}'")
+        await self._finalize_task(task_id)
+    
+    async def _transition(
+        self,
+        task_id: str,
+        to_status: str,
+        from_statuses: Optional[List[str]] = None,
+        fields: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Transition a task in the store and push the change to subscribers"""
+        task_data = await self.task_store.transition(task_id, to_status, from_statuses=from_statuses, fields=fields)
+        if task_data is not None:
+            self._publish_task_event(task_data)
+        return task_data
+    
+    def _publish_task_event(self, task_data: Dict[str, Any]):
+        self.events.publish(self.task_event(task_data))
+    
+    @staticmethod
+    def task_event(task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a task pushed over the event stream"""
+        return {
+            "task_id": task_data["task_id"],
+            "user_id": task_data.get("user_id"),
+            "status": task_data.get("status"),
+            "progress": task_data.get("progress"),
+            "video_url": task_data.get("video_url"),
+            "error_message": task_data.get("error_message"),
+            "timestamp": time.time()
+        }
+    
+    async def _handle_runway_status(self, task_id: str, task_status: Any, age: float) -> bool:
+        """Apply a polled Runway status to the task; returns True once the task is final"""
+        if task_status.status == "SUCCEEDED":
+            # Extract video URL from output
+            video_url = None
+            if hasattr(task_status, 'output') and task_status.output:
+                if isinstance(task_status.output, list) and len(task_status.output) > 0:
+                    video_url = task_status.output[0]
+                elif isinstance(task_status.output, str):
+                    video_url = task_status.output
+                else:
+                    video_url = str(task_status.output)
             
-        finally:
-            # Clean up temporary files
-            temp_file_path = self.active_tasks[task_id].get("temp_file_path")
-            if temp_file_path:
-                try:
-                    Path(temp_file_path).unlink(missing_ok=True)
-                    logger.info(f"Cleaned up temporary file: {temp_file_path}")
-                except Exception as cleanup_error:
-                    logger.warning(f"Failed to clean up temporary file {temp_file_path}: {cleanup_error}")
+            completed = await self._transition(task_id, "completed", fields={
+                "runway_status": task_status.status,
+                "progress": 100.0,
+                "video_url": video_url
+            })
+            logger.info(f"Runway generation completed for task {task_id}")
+            if completed and video_url and completed.get("result_cache_key") and self.result_cache is not None:
+                await self.result_cache.put(
+                    completed["result_cache_key"],
+                    video_url,
+                    source_task_id=task_id,
+                    image_url=completed.get("image_url")
+                )
+            await self._finalize_task(task_id)
+            return True
+        
+        if task_status.status == "FAILED":
+            error_message = getattr(task_status, 'failure_reason', 'Generation failed')
+            await self._transition(task_id, "failed", fields={
+                "runway_status": task_status.status,
+                "error_message": error_message
+            })
+            logger.error(f"Runway generation failed for task {task_id}: {error_message}")
+            await self._finalize_task(task_id)
+            return True
+        
+        # Still processing, update progress
+        progress = min(40.0 + (age / self.generation_timeout) * 50.0, 90.0)
+        if not await self._transition(
+            task_id, "processing", from_statuses=["processing"],
+            fields={"runway_status": task_status.status, "progress": progress}
+        ):
+            logger.info(f"Task {task_id} left processing state, stopping poll")
+            await self._finalize_task(task_id)
+            return True
+        return False
+    
+    async def _handle_poll_error(self, task_id: str, error: Exception):
+        """Mark a task as errored after repeated status check failures"""
+        await self._transition(task_id, "error", fields={
+            "error_message": f"Status check failed: {str(error)}"
+        })
+        logger.error(f"Status check failed for task {task_id}: {str(error)}")
+        await self._finalize_task(task_id)
+    
+    async def _handle_poll_timeout(self, task_id: str):
+        """Mark a task as timed out once it exceeds the generation timeout"""
+        await self._transition(task_id, "timeout", fields={
+            "error_message": "Generation timeout exceeded"
+        })
+        logger.error(f"Generation timeout exceeded for task {task_id}")
+        await self._finalize_task(task_id)
+    
+    def _release_image_ref(self, task_id: str):
+        image_digest = self._image_refs.pop(task_id, None)
+        if image_digest:
+            self.image_store.release(image_digest)
+    
+    async def _finalize_task(self, task_id: str):
+        """Release per-task resources once a task stops generating"""
+        # Free the admission slot (or queue spot) so the next task can start
+        self.scheduler.release(task_id)
+        self.coalescer.task_finished(task_id)
+        
+        # Drop this task's reference on its deduplicated input image (at most once)
+        self._release_image_ref(task_id)
+        
+        task_data = await self.task_store.get(task_id)
+        
+        # Settle the credit reservation (no-op if there was none or it is settled)
+        if task_data and task_data.get("status") == "completed":
+            self.ledger.commit(task_id)
+        else:
+            self.ledger.refund(task_id)
+        
+        # Clean up temporary files
+        temp_file_path = task_data.get("temp_file_path") if task_data else None
+        if temp_file_path:
+            try:
+                Path(temp_file_path).unlink(missing_ok=True)
+                logger.info(f"Cleaned up temporary file: {temp_file_path}")
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to clean up temporary file {temp_file_path}: {cleanup_error}")
     
     async def get_task_status(self, task_id: str) -> TaskStatusResponse:
         """Get the status of a video generation task"""
-        if task_id not in self.active_tasks:
+        task_data = await self.task_store.get(task_id)
+        if task_data is None:
             raise Exception("Task not found")
         
-        task_data = self.active_tasks[task_id]
-        
         # Calculate progress based on status
-        progress_mapping = {
-            "initializing": 10.0,
-            "generating": 20.0,
-            "processing": 60.0,
-            "completed": 100.0,
-            "failed": 0.0,
-            "error": 0.0,
-            "timeout": 0.0
-        }
-        
-        progress = task_data.get("progress", progress_mapping.get(task_data["status"], 0.0))
+        progress = task_data.get("progress", STATUS_PROGRESS.get(task_data["status"], 0.0))
         
         # Estimate completion time for processing tasks
         estimated_completion = None
+        queue_position = None
         if task_data["status"] in ["processing", "generating"]:
             elapsed_time = time.time() - task_data["created_at"]
             estimated_remaining = max(120 - elapsed_time, 10)  # 2 minutes total estimate
             estimated_completion = time.time() + estimated_remaining
+        elif task_data["status"] == "queued":
+            queue_position = self.scheduler.queue_position(task_id)
+            estimated_completion = time.time() + (self.scheduler.estimated_wait(task_id) or 0) + 120
         
         return TaskStatusResponse(
             task_id=task_id,
@@ -373,7 +1048,8 @@ class RunwayGen3Service:
             error_message=task_data.get("error_message"),
             created_at=str(task_data["created_at"]),
             estimated_completion=str(estimated_completion) if estimated_completion else None,
-            cost_credits=task_data.get("cost_credits")
+            cost_credits=task_data.get("cost_credits"),
+            queue_position=queue_position
         )
     
     async def list_models(self) -> List[Dict[str, Any]]:
@@ -403,22 +1079,83 @@ class RunwayGen3Service:
             }
         ]
     
+    async def list_user_tasks(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        List a page of a user's tasks, newest first, with cursors for the neighbouring
+        pages. Raises ValueError for a malformed cursor.
+        """
+        before_cursor = decode_task_cursor(before) if before else None
+        after_cursor = decode_task_cursor(after) if after else None
+        
+        # Fetch one extra task to learn whether another page exists in that direction
+        tasks = await self.task_store.list_by_user(
+            user_id, status=status, limit=limit + 1, before=before_cursor, after=after_cursor
+        )
+        has_more = len(tasks) > limit
+        if has_more:
+            tasks = tasks[1:] if after_cursor else tasks[:limit]
+        
+        has_older = has_more if after_cursor is None else True
+        has_newer = before_cursor is not None or (after_cursor is not None and has_more)
+        
+        return {
+            "tasks": [
+                {
+                    "task_id": task_data["task_id"],
+                    "status": task_data.get("status"),
+                    "created_at": task_data.get("created_at"),
+                    "progress": task_data.get("progress", 0),
+                    "cost_credits": task_data.get("cost_credits"),
+                    "video_url": task_data.get("video_url"),
+                    "error_message": task_data.get("error_message")
+                }
+                for task_data in tasks
+            ],
+            "next_cursor": encode_task_cursor(tasks[-1]) if tasks and has_older else None,
+            "prev_cursor": encode_task_cursor(tasks[0]) if tasks and has_newer else None
+        }
+    
+    async def cancel_task(self, task_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        Cancel a pending task owned by `user_id`. Raises LookupError if the task is unknown,
+        PermissionError if it belongs to someone else and ValueError if it already finished.
+        """
+        task_data = await self.task_store.get(task_id)
+        if task_data is None:
+            raise LookupError("Task not found")
+        
+        if task_data.get("user_id") != user_id:
+            raise PermissionError("Access denied")
+        
+        cancelled = await self._transition(
+            task_id, "cancelled", fields={"error_message": "Task cancelled by user"}
+        )
+        if cancelled is None:
+            raise ValueError("Cannot cancel completed or failed task")
+        
+        self.poller.untrack(task_id)
+        if cancelled.get("runway_task_id"):
+            await self._cancel_upstream(cancelled["runway_task_id"])
+        await self._finalize_task(task_id)
+        return cancelled
+    
     async def cleanup_completed_tasks(self, hours_old: int = 24):
         """Clean up completed tasks older than specified hours"""
         current_time = time.time()
         cutoff_time = current_time - (hours_old * 3600)
         
-        tasks_to_remove = []
-        for task_id, task_data in self.active_tasks.items():
-            if (task_data["created_at"] < cutoff_time and 
-                task_data["status"] in ["completed", "failed", "error", "timeout"]):
-                tasks_to_remove.append(task_id)
-        
-        for task_id in tasks_to_remove:
-            del self.active_tasks[task_id]
+        removed = await self.task_store.delete_finished_before(cutoff_time)
+        for task_id in removed:
             logger.info(f"Cleaned up old task: {task_id}")
         
-        return len(tasks_to_remove)
+        return len(removed)
 
 # Global service instance
 runway_gen3_service = RunwayGen3Service()
@@ -0,0 +1,203 @@
+"""
+Runway Image Store
+
+Content-addressed store for image-to-video inputs. Uploads are published under the
+SHA-256 of their bytes, so re-submitting the same image reuses the already-public
+file and URL. Reference counts follow the task lifecycle; a file is removed once no
+task has used it for `retention_seconds`. Files left by a previous process are adopted
+at startup and removed the same way unless a resumed task takes a reference.
+
+Reference counts only cover this process, but the public directory is shared by every
+worker. Before removing a file the store therefore also checks `is_referenced` (the
+task store's view of unfinished tasks) and the file's mtime, which every reuse
+refreshes, and keeps the file while either says it is still in use.
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
+
+from utils.uploads import publish_file
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_PATTERN = re.compile(r"^\.[a-z0-9]{1,5}$")
+_STORED_FILENAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]{1,5}$")
+
+
+class ImageStore:
+    """Deduplicating public image store with reference counting"""
+
+    def __init__(
+        self,
+        public_dir: str = "/tmp/public",
+        public_base_url: str = "http://localhost:8001/public",
+        retention_seconds: float = 3600.0
+    ):
+        self.public_dir = Path(public_dir)
+        self.public_base_url = public_base_url.rstrip("/")
+        self.retention_seconds = retention_seconds
+
+        self._refcounts: Dict[str, int] = {}
+        self._filenames: Dict[str, str] = {}
+        self._pending_deletes: Dict[str, asyncio.TimerHandle] = {}
+        self._publish_locks: Dict[str, asyncio.Lock] = {}
+        self._removal_listeners: List[Callable[[Path], None]] = []
+        self._deleting: Set[asyncio.Task] = set()
+        # Whether an unfinished task of any worker still uses a digest
+        self.is_referenced: Optional[Callable[[str], Awaitable[bool]]] = None
+
+        self.publishes = 0
+        self.reuses = 0
+
+    @staticmethod
+    def filename_for(digest: str, extension: str) -> str:
+        extension = extension.lower()
+        if not _EXTENSION_PATTERN.match(extension):
+            extension = ".img"
+        return f"{digest}{extension}"
+
+    def url_for(self, filename: str) -> str:
+        return f"{self.public_base_url}/{filename}"
+
+    async def publish(self, upload_path: Path, digest: str) -> str:
+        """
+        Publish an uploaded file under its content hash and take a reference on it.
+        The upload itself is consumed: it is removed once published or found redundant.
+        """
+        filename = self._filenames.get(digest) or self.filename_for(digest, upload_path.suffix)
+        public_path = self.public_dir / filename
+
+        lock = self._publish_locks.setdefault(digest, asyncio.Lock())
+        try:
+            async with lock:
+                if await self._touch(public_path):
+                    self.reuses += 1
+                    logger.info(f"Reusing published image {filename}")
+                else:
+                    await publish_file(upload_path, public_path)
+                    self.publishes += 1
+                    logger.info(f"Published image {filename}")
+                self._filenames[digest] = filename
+                self.acquire(digest)
+        finally:
+            upload_path.unlink(missing_ok=True)
+
+        return self.url_for(filename)
+
+    @staticmethod
+    async def _touch(path: Path) -> bool:
+        """Refresh an existing file's mtime, telling other workers it is in use again"""
+        try:
+            await asyncio.to_thread(os.utime, path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def initialize(self):
+        """
+        Adopt files published by a previous process. Nothing here references them yet,
+        so each is scheduled for removal once its retention window (counted from when
+        it was written) has passed; resumed tasks cancel that by acquiring the digest.
+        """
+        found = await asyncio.to_thread(self._scan_public_dir)
+        now = time.time()
+        adopted = 0
+        for digest, filename, modified_at in found:
+            if digest in self._filenames:
+                continue
+            self._filenames[digest] = filename
+            if self._refcounts.get(digest) or digest in self._pending_deletes:
+                continue
+            self._schedule_delete(digest, max(0.0, modified_at + self.retention_seconds - now))
+            adopted += 1
+        if adopted:
+            logger.info(f"Adopted {adopted} published images from a previous run")
+
+    def _scan_public_dir(self) -> List[Tuple[str, str, float]]:
+        if not self.public_dir.is_dir():
+            return []
+        found = []
+        with os.scandir(self.public_dir) as entries:
+            for entry in entries:
+                match = _STORED_FILENAME_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    found.append((match.group(1), entry.name, entry.stat().st_mtime))
+        return found
+
+    def add_removal_listener(self, listener: Callable[[Path], None]):
+        """Call `listener(path)` whenever a published file is removed (e.g. to drop cached stats)"""
+        self._removal_listeners.append(listener)
+
+    def acquire(self, digest: str):
+        """Take a reference, cancelling any scheduled removal"""
+        pending = self._pending_deletes.pop(digest, None)
+        if pending is not None:
+            pending.cancel()
+        self._refcounts[digest] = self._refcounts.get(digest, 0) + 1
+
+    def release(self, digest: str):
+        """Drop a reference; the file is removed after the retention window if unused"""
+        count = self._refcounts.get(digest, 0) - 1
+        if count > 0:
+            self._refcounts[digest] = count
+            return
+        self._refcounts.pop(digest, None)
+        if digest in self._pending_deletes:
+            return
+        self._schedule_delete(digest, self.retention_seconds)
+
+    def _schedule_delete(self, digest: str, delay: float):
+        loop = asyncio.get_running_loop()
+        self._pending_deletes[digest] = loop.call_later(delay, self._start_delete, digest)
+
+    def _start_delete(self, digest: str):
+        self._pending_deletes.pop(digest, None)
+        task = asyncio.create_task(self._delete(digest))
+        self._deleting.add(task)
+        task.add_done_callback(self._deleting.discard)
+
+    def _in_use_here(self, digest: str) -> bool:
+        return bool(self._refcounts.get(digest)) or digest in self._pending_deletes
+
+    async def _delete(self, digest: str):
+        filename = self._filenames.get(digest)
+        if filename is None or self._in_use_here(digest):
+            return
+        path = self.public_dir / filename
+        try:
+            modified_at = (await asyncio.to_thread(path.stat)).st_mtime
+            # Reused by another worker within the retention window
+            remaining = modified_at + self.retention_seconds - time.time()
+            referenced = remaining <= 0 and self.is_referenced is not None and await self.is_referenced(digest)
+        except FileNotFoundError:
+            remaining, referenced = 0.0, False
+        except Exception as e:
+            logger.error(f"Could not check whether image {filename} is still used: {e}")
+            remaining, referenced = 0.0, True
+        # Hold the publish lock so a concurrent publish here cannot reuse the file mid-removal
+        async with self._publish_locks.setdefault(digest, asyncio.Lock()):
+            # Acquired again while checking
+            if self._in_use_here(digest):
+                return
+            if remaining > 0 or referenced:
+                self._schedule_delete(digest, remaining if remaining > 0 else self.retention_seconds)
+                return
+            self._filenames.pop(digest, None)
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+        self._publish_locks.pop(digest, None)
+        for listener in self._removal_listeners:
+            listener(path)
+        logger.info(f"Removed unused published image {filename}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "referenced_images": len(self._refcounts),
+            "pending_removal": len(self._pending_deletes),
+            "publishes": self.publishes,
+            "reuses": self.reuses
+        }
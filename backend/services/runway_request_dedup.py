@@ -0,0 +1,165 @@
+"""
+Runway Request Deduplication
+
+Stops double-clicks and client retries from creating duplicate Runway tasks. A
+request is fingerprinted by its user and generation parameters (prompt, model, ratio,
+duration, seed, image hash); while a task with the same fingerprint is still running,
+identical requests attach to it instead of creating another. Clients can also send an
+Idempotency-Key, which keeps returning the same task for that key until it expires,
+even after the task has finished.
+
+State is kept in memory per worker process.
+"""
+
+import time
+import json
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with different request parameters"""
+
+
+def request_fingerprint(user_id: str, request: Dict[str, Any], image_sha256: Optional[str] = None) -> str:
+    """Stable digest of everything that determines the generated video"""
+    payload = {
+        "user_id": user_id,
+        "prompt_text": request.get("prompt_text"),
+        "prompt_image": request.get("prompt_image"),
+        "image_sha256": image_sha256,
+        "model": request.get("model"),
+        "ratio": request.get("ratio"),
+        "duration": request.get("duration"),
+        "seed": request.get("seed")
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class _KeyEntry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future, expires_at: float):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = expires_at
+
+
+class RequestCoalescer:
+    """Maps idempotency keys and in-flight fingerprints to a single task creation"""
+
+    def __init__(self, key_ttl_seconds: float = 86400.0, max_keys: int = 100_000):
+        self.key_ttl_seconds = key_ttl_seconds
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[Tuple[str, str], _KeyEntry]" = OrderedDict()
+        # fingerprint -> future resolving to the creation result, while the task runs
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._fingerprint_by_task: Dict[str, str] = {}
+
+        self.total_created = 0
+        self.total_coalesced = 0
+        self.total_replayed = 0
+
+    def _prune_keys(self, now: float):
+        while self._keys:
+            key, entry = next(iter(self._keys.items()))
+            if entry.expires_at > now and len(self._keys) <= self.max_keys:
+                break
+            del self._keys[key]
+
+    def _lookup_key(self, user_id: str, idempotency_key: str, fingerprint: Optional[str]) -> Optional[asyncio.Future]:
+        entry = self._keys.get((user_id, idempotency_key))
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        if entry.fingerprint != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with different parameters")
+        return entry.future
+
+    async def run(
+        self,
+        user_id: str,
+        fingerprint: Optional[str],
+        idempotency_key: Optional[str],
+        create: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Return `(result, duplicate)`. `create` runs only if neither the idempotency key
+        nor an in-flight task with the same fingerprint already covers this request;
+        otherwise the earlier creation's result is returned. Pass fingerprint=None to
+        opt out of automatic coalescing. Raises IdempotencyConflict.
+        """
+        now = time.monotonic()
+        self._prune_keys(now)
+
+        existing = None
+        if idempotency_key is not None:
+            existing = self._lookup_key(user_id, idempotency_key, fingerprint)
+            if existing is not None:
+                self.total_replayed += 1
+        if existing is None and fingerprint is not None:
+            existing = self._in_flight.get(fingerprint)
+            if existing is not None:
+                self.total_coalesced += 1
+        if existing is not None:
+            if idempotency_key is not None and (user_id, idempotency_key) not in self._keys:
+                self._keys[(user_id, idempotency_key)] = _KeyEntry(fingerprint, existing, now + self.key_ttl_seconds)
+            # Shield so one cancelled waiter cannot cancel the shared creation
+            return await asyncio.shield(existing), True
+
+        future = asyncio.get_running_loop().create_future()
+        if fingerprint is not None:
+            self._in_flight[fingerprint] = future
+        if idempotency_key is not None:
+            self._keys[(user_id, idempotency_key)] = _KeyEntry(fingerprint, future, now + self.key_ttl_seconds)
+
+        try:
+            result = await create()
+        except BaseException as e:
+            # Let the next attempt retry instead of replaying the failure
+            if fingerprint is not None and self._in_flight.get(fingerprint) is future:
+                del self._in_flight[fingerprint]
+            if idempotency_key is not None:
+                entry = self._keys.get((user_id, idempotency_key))
+                if entry is not None and entry.future is future:
+                    del self._keys[(user_id, idempotency_key)]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Waiters (if any) re-raise it; don't warn when there are none
+                future.exception()
+            else:
+                future.cancel()
+            raise
+
+        future.set_result(result)
+        self.total_created += 1
+        return result, False
+
+    def bind(self, task_id: str, fingerprint: Optional[str]):
+        """
+        Associate a new task with its fingerprint; call before the task can start so
+        task_finished always sees it
+        """
+        if fingerprint is not None:
+            self._fingerprint_by_task[task_id] = fingerprint
+
+    def task_finished(self, task_id: str):
+        """Stop coalescing onto a task once it reaches a final state"""
+        fingerprint = self._fingerprint_by_task.pop(task_id, None)
+        if fingerprint is not None:
+            self._in_flight.pop(fingerprint, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight_fingerprints": len(self._in_flight),
+            "idempotency_keys": len(self._keys),
+            "total_created": self.total_created,
+            "total_coalesced": self.total_coalesced,
+            "total_replayed": self.total_replayed
+        }
@@ -0,0 +1,204 @@
+"""
+Runway Seeded Result Cache
+
+Runway generations with an explicit seed are deterministic: the same prompt, input
+image, model, ratio, duration and seed give the same video. This cache maps that tuple
+to the completed video URL, so repeat renders (template-driven workloads) finish
+instantly without another image_to_video.create call. Keys are scoped to the user, so
+a signed result URL is only replayed to the user who paid for it.
+
+Entries expire after a TTL capped below the lifetime of Runway's signed output URLs
+(a replayed URL must still download). The in-memory tier is LRU-bounded; the MongoDB
+tier shares results across workers and restarts and is bounded by a TTL index.
+"""
+
+import os
+import time
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Runway output URLs are signed and short-lived; never replay one older than this
+MAX_RESULT_TTL_SECONDS = 3600.0
+
+
+def result_cache_key(user_id: str, request: Dict[str, Any], image_sha256: Optional[str] = None) -> Optional[str]:
+    """
+    Deterministic key for a user's generation request, or None when the result is not
+    reproducible (no seed) or the input image cannot be identified by content
+    """
+    if request.get("seed") is None:
+        return None
+    if request.get("prompt_image") and not image_sha256:
+        # Remote image URLs can change content behind the same URL
+        return None
+    payload = {
+        "user_id": user_id,
+        "prompt_text": request.get("prompt_text"),
+        "image_sha256": image_sha256,
+        "model": request.get("model"),
+        "ratio": request.get("ratio"),
+        "duration": request.get("duration"),
+        "seed": request.get("seed")
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class SeededResultCache:
+    """LRU memory tier over an optional MongoDB tier, both with a TTL"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = MAX_RESULT_TTL_SECONDS,
+        max_entries: int = 10_000,
+        collection_name: Optional[str] = None,
+        database=None
+    ):
+        if ttl_seconds > MAX_RESULT_TTL_SECONDS:
+            logger.warning(
+                f"Result cache TTL {ttl_seconds}s exceeds the signed URL lifetime, "
+                f"capping at {MAX_RESULT_TTL_SECONDS}s"
+            )
+        self.ttl_seconds = min(ttl_seconds, MAX_RESULT_TTL_SECONDS)
+        self.max_entries = max_entries
+        self.collection_name = collection_name
+        self._database = database
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._indexes_ready = False
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def persistent(self) -> bool:
+        return self.collection_name is not None
+
+    @property
+    def collection(self):
+        if self._database is None:
+            # Resolved lazily: the service is created before connect_to_mongo() runs
+            from database import db
+            self._database = db.database
+        return self._database[self.collection_name]
+
+    async def initialize(self):
+        if not self.persistent or self._indexes_ready:
+            return
+        await self.collection.create_index("key", unique=True)
+        # MongoDB removes documents once expires_at has passed
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self._indexes_ready = True
+        logger.info(f"Runway result cache indexes ready on '{self.collection_name}'")
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result ({"video_url", "image_url", "source_task_id", "stored_at"}) or None"""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            del self._entries[key]
+
+        if self.persistent:
+            try:
+                document = await self.collection.find_one({"key": key}, {"_id": 0})
+            except Exception as e:
+                logger.warning(f"Result cache lookup failed: {e}")
+                document = None
+            # The TTL monitor runs about once a minute; don't trust documents past expiry
+            if document is not None and document["expires_at"].replace(tzinfo=timezone.utc).timestamp() > now:
+                entry = {
+                    "video_url": document["video_url"],
+                    "image_url": document.get("image_url"),
+                    "source_task_id": document.get("source_task_id"),
+                    "stored_at": document.get("stored_at"),
+                    "expires_at": document["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+                }
+                self._remember(key, entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    async def put(
+        self,
+        key: str,
+        video_url: str,
+        source_task_id: Optional[str] = None,
+        image_url: Optional[str] = None
+    ):
+        now = time.time()
+        entry = {
+            "video_url": video_url,
+            "image_url": image_url,
+            "source_task_id": source_task_id,
+            "stored_at": now,
+            "expires_at": now + self.ttl_seconds
+        }
+        self._remember(key, entry)
+        self.stores += 1
+
+        if self.persistent:
+            try:
+                await self.collection.update_one(
+                    {"key": key},
+                    {"$set": {
+                        "key": key,
+                        "video_url": video_url,
+                        "image_url": image_url,
+                        "source_task_id": source_task_id,
+                        "stored_at": now,
+                        "expires_at": datetime.fromtimestamp(entry["expires_at"], tz=timezone.utc)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Failed to persist result cache entry: {e}")
+
+    async def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self.persistent:
+            await self.collection.delete_one({"key": key})
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.persistent,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+def create_result_cache(backend: Optional[str] = None, **kwargs) -> Optional[SeededResultCache]:
+    """Build the cache selected by RUNWAY_RESULT_CACHE ("memory", "mongo" or "off")"""
+    backend = (backend or os.getenv("RUNWAY_RESULT_CACHE", "memory")).lower()
+    if backend == "off":
+        return None
+    if backend == "mongo":
+        return SeededResultCache(
+            collection_name=os.getenv("RUNWAY_RESULT_CACHE_COLLECTION", "runway_result_cache"),
+            **kwargs
+        )
+    if backend != "memory":
+        logger.warning(f"Unknown RUNWAY_RESULT_CACHE '{backend}', falling back to in-memory cache")
+    return SeededResultCache(**kwargs)
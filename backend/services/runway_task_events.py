@@ -0,0 +1,91 @@
+"""
+Runway Task Events
+
+In-process publish/subscribe broker for Runway task status and progress changes.
+RunwayGen3Service publishes an event whenever a task moves, and streaming endpoints
+subscribe to a single task or to all of a user's tasks instead of polling.
+"""
+
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSubscription:
+    """A bounded queue of task events for one subscriber"""
+
+    def __init__(self, broker: "TaskEventBroker", task_id: Optional[str], user_id: Optional[str], queue_size: int):
+        self.broker = broker
+        self.task_id = task_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, event: Dict[str, Any]):
+        """Enqueue without blocking the publisher; slow consumers lose the oldest event"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self) -> "TaskSubscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TaskEventBroker:
+    """Fans task events out to per-task and per-user subscribers"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._by_task: Dict[str, Set[TaskSubscription]] = {}
+        self._by_user: Dict[str, Set[TaskSubscription]] = {}
+        self.published = 0
+
+    def subscribe(self, task_id: Optional[str] = None, user_id: Optional[str] = None) -> TaskSubscription:
+        """Subscribe to one task (`task_id`) or to every task of a user (`user_id`)"""
+        if (task_id is None) == (user_id is None):
+            raise ValueError("Subscribe to exactly one of task_id or user_id")
+        subscription = TaskSubscription(self, task_id, user_id, self.queue_size)
+        if task_id is not None:
+            self._by_task.setdefault(task_id, set()).add(subscription)
+        else:
+            self._by_user.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription):
+        for index, key in ((self._by_task, subscription.task_id), (self._by_user, subscription.user_id)):
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del index[key]
+
+    def publish(self, event: Dict[str, Any]):
+        """Deliver an event to everyone watching its task or its owner"""
+        self.published += 1
+        for subscription in self._by_task.get(event.get("task_id"), ()):
+            subscription.push(event)
+        for subscription in self._by_user.get(event.get("user_id"), ()):
+            subscription.push(event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "task_subscriptions": sum(len(subs) for subs in self._by_task.values()),
+            "user_subscriptions": sum(len(subs) for subs in self._by_user.values()),
+            "events_published": self.published
+        }
@@ -0,0 +1,207 @@
+"""
+Runway Task Poller
+
+A single scheduler that owns every outstanding Runway task id and polls them in
+rate-limited batches, instead of one sleep loop per generation. Poll intervals grow
+with task age and stretch further when the backlog would exceed the request budget.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# (max task age in seconds, poll interval in seconds), checked in order
+DEFAULT_INTERVAL_SCHEDULE: Tuple[Tuple[float, float], ...] = (
+    (60.0, 5.0),
+    (180.0, 10.0),
+    (float("inf"), 20.0),
+)
+
+
+class _TrackedTask:
+    """Bookkeeping for one outstanding Runway task"""
+
+    __slots__ = ("task_id", "runway_task_id", "submitted_at", "next_poll_at", "polls", "errors")
+
+    def __init__(self, task_id: str, runway_task_id: str, submitted_at: float):
+        self.task_id = task_id
+        self.runway_task_id = runway_task_id
+        self.submitted_at = submitted_at
+        self.next_poll_at = submitted_at
+        self.polls = 0
+        self.errors = 0
+
+
+class RunwayTaskPoller:
+    """Centralized, batched poller for Runway task status"""
+
+    def __init__(
+        self,
+        get_client: Callable[[], Awaitable[Any]],
+        on_status: Callable[[str, Any, float], Awaitable[bool]],
+        on_error: Callable[[str, Exception], Awaitable[None]],
+        on_timeout: Callable[[str], Awaitable[None]],
+        batch_size: int = 25,
+        max_concurrency: int = 8,
+        requests_per_second: float = 5.0,
+        timeout_seconds: float = 300.0,
+        max_consecutive_errors: int = 3,
+        interval_schedule: Tuple[Tuple[float, float], ...] = DEFAULT_INTERVAL_SCHEDULE
+    ):
+        """
+        `on_status` receives (task_id, runway_status, age_seconds) and returns True once
+        the task reached a final state. `on_error` is called after too many consecutive
+        retrieve failures and `on_timeout` once a task exceeds `timeout_seconds`.
+        """
+        self.get_client = get_client
+        self.on_status = on_status
+        self.on_error = on_error
+        self.on_timeout = on_timeout
+        self.batch_size = batch_size
+        self.requests_per_second = requests_per_second
+        self.timeout_seconds = timeout_seconds
+        self.max_consecutive_errors = max_consecutive_errors
+        self.interval_schedule = interval_schedule
+
+        self._tracked: Dict[str, _TrackedTask] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._rate_lock = asyncio.Lock()
+        self._next_request_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+        self.total_requests = 0
+        self.total_batches = 0
+
+    def track(self, task_id: str, runway_task_id: str, submitted_at: Optional[float] = None):
+        """Start polling a submitted Runway task"""
+        entry = _TrackedTask(task_id, runway_task_id, submitted_at or time.time())
+        entry.next_poll_at = entry.submitted_at + self._poll_interval(0.0)
+        self._tracked[task_id] = entry
+        heapq.heappush(self._schedule, (entry.next_poll_at, task_id))
+        self._ensure_running()
+        self._wakeup.set()
+
+    def untrack(self, task_id: str):
+        """Stop polling a task (stale heap entries are skipped lazily)"""
+        self._tracked.pop(task_id, None)
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._tracked)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding_tasks": len(self._tracked),
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "requests_per_second": self.requests_per_second,
+            "batch_size": self.batch_size,
+            "running": self._runner is not None and not self._runner.done()
+        }
+
+    async def stop(self):
+        """Cancel the scheduler loop; tracked tasks are kept for a later restart"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    def _poll_interval(self, age: float) -> float:
+        """Age-based interval, stretched so the whole backlog fits the request budget"""
+        interval = self.interval_schedule[-1][1]
+        for max_age, candidate in self.interval_schedule:
+            if age < max_age:
+                interval = candidate
+                break
+        budget_interval = len(self._tracked) / self.requests_per_second if self.requests_per_second else 0.0
+        return max(interval, budget_interval)
+
+    async def _run(self):
+        logger.info("Runway task poller started")
+        while self._tracked:
+            now = time.time()
+            batch = self._pop_due(now)
+            if batch:
+                self.total_batches += 1
+                await asyncio.gather(*(self._poll(entry) for entry in batch))
+                continue
+
+            # Sleep until the next scheduled poll or until a new task is tracked
+            self._wakeup.clear()
+            delay = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("Runway task poller idle, no outstanding tasks")
+
+    def _pop_due(self, now: float) -> List[_TrackedTask]:
+        batch = []
+        while self._schedule and self._schedule[0][0] <= now and len(batch) < self.batch_size:
+            due_at, task_id = heapq.heappop(self._schedule)
+            entry = self._tracked.get(task_id)
+            # Skip entries that were untracked or rescheduled since being pushed
+            if entry is not None and entry.next_poll_at == due_at:
+                batch.append(entry)
+        return batch
+
+    async def _throttle(self):
+        """Space request starts evenly at `requests_per_second`"""
+        if not self.requests_per_second:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1.0 / self.requests_per_second
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _poll(self, entry: _TrackedTask):
+        age = time.time() - entry.submitted_at
+        if age > self.timeout_seconds:
+            self.untrack(entry.task_id)
+            await self._safe_callback(self.on_timeout(entry.task_id), entry.task_id)
+            return
+
+        finished = False
+        async with self._semaphore:
+            await self._throttle()
+            try:
+                client = await self.get_client()
+                self.total_requests += 1
+                entry.polls += 1
+                task_status = await client.tasks.retrieve(entry.runway_task_id)
+                entry.errors = 0
+                finished = await self.on_status(entry.task_id, task_status, age)
+            except Exception as e:
+                entry.errors += 1
+                logger.warning(f"Status check failed for task {entry.task_id} ({entry.errors}): {str(e)}")
+                if entry.errors >= self.max_consecutive_errors:
+                    self.untrack(entry.task_id)
+                    await self._safe_callback(self.on_error(entry.task_id, e), entry.task_id)
+                    return
+
+        if finished:
+            self.untrack(entry.task_id)
+        elif entry.task_id in self._tracked:
+            entry.next_poll_at = time.time() + self._poll_interval(time.time() - entry.submitted_at)
+            heapq.heappush(self._schedule, (entry.next_poll_at, entry.task_id))
+
+    async def _safe_callback(self, callback: Awaitable[None], task_id: str):
+        try:
+            await callback
+        except Exception as e:
+            logger.error(f"Poller callback failed for task {task_id}: {str(e)}")
@@ -0,0 +1,443 @@
+"""
+Runway Task Store
+
+Pluggable persistence for Runway Gen-3 generation tasks. The in-memory backend keeps
+the previous single-process behaviour, while the MongoDB backend (via motor) lets every
+uvicorn worker see the same tasks and survives restarts.
+"""
+
+import os
+import copy
+import bisect
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a task never changes again
+TERMINAL_STATUSES = ("completed", "failed", "error", "timeout", "cancelled")
+
+# Pagination position within a user's tasks: (created_at, task_id)
+TaskCursor = Tuple[float, str]
+
+
+def encode_task_cursor(task_data: Dict[str, Any]) -> str:
+    """Opaque cursor string pointing at a task in its owner's timeline"""
+    return f"{task_data['created_at']!r}:{task_data['task_id']}"
+
+
+def decode_task_cursor(cursor: str) -> TaskCursor:
+    """Parse a cursor produced by encode_task_cursor; raises ValueError if malformed"""
+    created_at, separator, task_id = cursor.partition(":")
+    if not separator or not task_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return float(created_at), task_id
+
+
+class TaskStore(ABC):
+    """Abstract task store used by RunwayGen3Service"""
+
+    async def initialize(self):
+        """Prepare the backend (create indexes, open connections)"""
+
+    @abstractmethod
+    async def create(self, task_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a new task document"""
+
+    @abstractmethod
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the task document, or None if unknown"""
+
+    @abstractmethod
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set fields on a task unconditionally and return the updated document"""
+
+    @abstractmethod
+    async def transition(
+        self,
+        task_id: str,
+        to_status: str,
+        from_statuses: Optional[Iterable[str]] = None,
+        fields: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move a task to `to_status` if its current status is one of
+        `from_statuses` (any non-terminal status when omitted). Returns the updated
+        document, or None when the task is unknown or the precondition failed.
+        """
+
+    @abstractmethod
+    async def list_by_user(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[TaskCursor] = None,
+        after: Optional[TaskCursor] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        List a user's tasks, newest first. `before` returns the page of tasks older than
+        the cursor, `after` the page of tasks newer than it.
+        """
+
+    @abstractmethod
+    async def list_by_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Every task created for a batch submission, in batch order"""
+
+    @abstractmethod
+    async def renew_leases(self, owner: str, expires_at: float) -> int:
+        """Extend the lease on every unfinished task held by `owner`; returns how many"""
+
+    @abstractmethod
+    async def claim_orphaned(self, owner: str, now: float, expires_at: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Atomically take over unfinished tasks whose lease expired before `now` (or that
+        never had one) and return them, now leased to `owner` until `expires_at`
+        """
+
+    @abstractmethod
+    async def delete_finished_before(self, cutoff_time: float) -> List[str]:
+        """Delete terminal tasks created before `cutoff_time` and return their ids"""
+
+    @abstractmethod
+    async def references_image(self, image_sha256: str) -> bool:
+        """Whether an unfinished task still uses the published image with this digest"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of tasks held by the store"""
+
+
+class InMemoryTaskStore(TaskStore):
+    """Process-local task store; tasks are lost on restart"""
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # Secondary indexes, each list sorted ascending by (created_at, task_id)
+        self._by_user: Dict[str, List[TaskCursor]] = {}
+        self._by_user_status: Dict[Tuple[str, str], List[TaskCursor]] = {}
+        self._by_batch: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def _index_key(document: Dict[str, Any]) -> TaskCursor:
+        return (document["created_at"], document["task_id"])
+
+    @staticmethod
+    def _index_add(index: Dict[Any, List[TaskCursor]], key: Any, entry: TaskCursor):
+        bisect.insort(index.setdefault(key, []), entry)
+
+    @staticmethod
+    def _index_remove(index: Dict[Any, List[TaskCursor]], key: Any, entry: TaskCursor):
+        entries = index.get(key)
+        if not entries:
+            return
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+        if not entries:
+            del index[key]
+
+    def _reindex_status(self, document: Dict[str, Any], old_status: Optional[str]):
+        if document.get("status") == old_status:
+            return
+        user_id = document.get("user_id")
+        entry = self._index_key(document)
+        self._index_remove(self._by_user_status, (user_id, old_status), entry)
+        self._index_add(self._by_user_status, (user_id, document.get("status")), entry)
+
+    async def create(self, task_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        if task_id in self._tasks:
+            raise ValueError(f"Task {task_id} already exists")
+        document = {**task_data, "task_id": task_id}
+        self._tasks[task_id] = document
+        entry = self._index_key(document)
+        self._index_add(self._by_user, document.get("user_id"), entry)
+        self._index_add(self._by_user_status, (document.get("user_id"), document.get("status")), entry)
+        if document.get("batch_id") is not None:
+            self._by_batch.setdefault(document["batch_id"], []).append(task_id)
+        return copy.deepcopy(document)
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        document = self._tasks.get(task_id)
+        return copy.deepcopy(document) if document is not None else None
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        document = self._tasks.get(task_id)
+        if document is None:
+            return None
+        old_status = document.get("status")
+        document.update(fields)
+        self._reindex_status(document, old_status)
+        return copy.deepcopy(document)
+
+    async def transition(
+        self,
+        task_id: str,
+        to_status: str,
+        from_statuses: Optional[Iterable[str]] = None,
+        fields: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        # No awaits between the check and the write, so this is atomic on the event loop
+        document = self._tasks.get(task_id)
+        if document is None:
+            return None
+        if from_statuses is None:
+            if document.get("status") in TERMINAL_STATUSES:
+                return None
+        elif document.get("status") not in from_statuses:
+            return None
+        old_status = document.get("status")
+        document.update(fields or {})
+        document["status"] = to_status
+        self._reindex_status(document, old_status)
+        return copy.deepcopy(document)
+
+    async def list_by_user(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[TaskCursor] = None,
+        after: Optional[TaskCursor] = None
+    ) -> List[Dict[str, Any]]:
+        if status is None:
+            entries = self._by_user.get(user_id, [])
+        else:
+            entries = self._by_user_status.get((user_id, status), [])
+
+        # Cost is O(log n + limit): bisect to the cursor and slice one page
+        if before is not None:
+            end = bisect.bisect_left(entries, before)
+            page = entries[max(0, end - limit):end]
+        elif after is not None:
+            start = bisect.bisect_right(entries, after)
+            page = entries[start:start + limit]
+        else:
+            page = entries[-limit:] if limit > 0 else []
+
+        return [copy.deepcopy(self._tasks[task_id]) for _, task_id in reversed(page)]
+
+    async def list_by_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        tasks = [copy.deepcopy(self._tasks[task_id]) for task_id in self._by_batch.get(batch_id, [])]
+        tasks.sort(key=lambda task: task.get("batch_index", 0))
+        return tasks
+
+    async def renew_leases(self, owner: str, expires_at: float) -> int:
+        renewed = 0
+        for document in self._tasks.values():
+            if document.get("owner") == owner and document.get("status") not in TERMINAL_STATUSES:
+                document["lease_expires_at"] = expires_at
+                renewed += 1
+        return renewed
+
+    async def claim_orphaned(self, owner: str, now: float, expires_at: float, limit: int = 100) -> List[Dict[str, Any]]:
+        claimed = []
+        for document in self._tasks.values():
+            if document.get("status") in TERMINAL_STATUSES or document.get("lease_expires_at", 0.0) >= now:
+                continue
+            document["owner"] = owner
+            document["lease_expires_at"] = expires_at
+            claimed.append(copy.deepcopy(document))
+            if len(claimed) >= limit:
+                break
+        return claimed
+
+    async def delete_finished_before(self, cutoff_time: float) -> List[str]:
+        removed = [
+            task_id for task_id, task in self._tasks.items()
+            if task["created_at"] < cutoff_time and task["status"] in TERMINAL_STATUSES
+        ]
+        for task_id in removed:
+            document = self._tasks.pop(task_id)
+            entry = self._index_key(document)
+            self._index_remove(self._by_user, document.get("user_id"), entry)
+            self._index_remove(self._by_user_status, (document.get("user_id"), document.get("status")), entry)
+            batch_id = document.get("batch_id")
+            if batch_id is not None:
+                batch_tasks = self._by_batch.get(batch_id, [])
+                if task_id in batch_tasks:
+                    batch_tasks.remove(task_id)
+                if not batch_tasks:
+                    self._by_batch.pop(batch_id, None)
+        return removed
+
+    async def references_image(self, image_sha256: str) -> bool:
+        return any(
+            document.get("image_sha256") == image_sha256 and document.get("status") not in TERMINAL_STATUSES
+            for document in self._tasks.values()
+        )
+
+    async def count(self) -> int:
+        return len(self._tasks)
+
+
+class MongoTaskStore(TaskStore):
+    """MongoDB-backed task store shared by every worker"""
+
+    def __init__(self, collection_name: str = "runway_tasks", database=None):
+        self.collection_name = collection_name
+        self._database = database
+        self._indexes_ready = False
+        self._index_lock = asyncio.Lock()
+
+    @property
+    def collection(self):
+        if self._database is None:
+            # Resolved lazily: the service is created before connect_to_mongo() runs
+            from database import db
+            self._database = db.database
+        return self._database[self.collection_name]
+
+    async def initialize(self):
+        async with self._index_lock:
+            if self._indexes_ready:
+                return
+            await self.collection.create_index("task_id", unique=True)
+            await self.collection.create_index([("user_id", 1), ("created_at", -1), ("task_id", -1)])
+            await self.collection.create_index([("user_id", 1), ("status", 1), ("created_at", -1), ("task_id", -1)])
+            await self.collection.create_index("status")
+            await self.collection.create_index([("owner", 1), ("status", 1)])
+            await self.collection.create_index(
+                [("batch_id", 1), ("batch_index", 1)],
+                partialFilterExpression={"batch_id": {"$exists": True}}
+            )
+            await self.collection.create_index(
+                [("image_sha256", 1), ("status", 1)],
+                partialFilterExpression={"image_sha256": {"$type": "string"}}
+            )
+            self._indexes_ready = True
+            logger.info(f"Runway task store indexes ready on '{self.collection_name}'")
+
+    async def create(self, task_id: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+        document = {**task_data, "task_id": task_id}
+        await self.collection.insert_one(dict(document))
+        return document
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"task_id": task_id}, {"_id": 0})
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+        return await self.collection.find_one_and_update(
+            {"task_id": task_id},
+            {"$set": fields},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def transition(
+        self,
+        task_id: str,
+        to_status: str,
+        from_statuses: Optional[Iterable[str]] = None,
+        fields: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+        if from_statuses is None:
+            status_filter = {"$nin": list(TERMINAL_STATUSES)}
+        else:
+            status_filter = {"$in": list(from_statuses)}
+        return await self.collection.find_one_and_update(
+            {"task_id": task_id, "status": status_filter},
+            {"$set": {**(fields or {}), "status": to_status}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def list_by_user(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
+        limit: int = 20,
+        before: Optional[TaskCursor] = None,
+        after: Optional[TaskCursor] = None
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"user_id": user_id}
+        if status is not None:
+            query["status"] = status
+
+        direction = -1
+        if before is not None:
+            created_at, task_id = before
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "task_id": {"$lt": task_id}}
+            ]
+        elif after is not None:
+            # Walk forward from the cursor, then flip back to newest-first
+            created_at, task_id = after
+            query["$or"] = [
+                {"created_at": {"$gt": created_at}},
+                {"created_at": created_at, "task_id": {"$gt": task_id}}
+            ]
+            direction = 1
+
+        cursor = (
+            self.collection.find(query, {"_id": 0})
+            .sort([("created_at", direction), ("task_id", direction)])
+            .limit(limit)
+        )
+        tasks = await cursor.to_list(length=limit)
+        if direction == 1:
+            tasks.reverse()
+        return tasks
+
+    async def list_by_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"batch_id": batch_id}, {"_id": 0}).sort("batch_index", 1)
+        return await cursor.to_list(length=None)
+
+    async def renew_leases(self, owner: str, expires_at: float) -> int:
+        result = await self.collection.update_many(
+            {"owner": owner, "status": {"$nin": list(TERMINAL_STATUSES)}},
+            {"$set": {"lease_expires_at": expires_at}}
+        )
+        return result.modified_count
+
+    async def claim_orphaned(self, owner: str, now: float, expires_at: float, limit: int = 100) -> List[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+        query = {
+            "status": {"$nin": list(TERMINAL_STATUSES)},
+            "$or": [{"lease_expires_at": {"$lt": now}}, {"lease_expires_at": {"$exists": False}}]
+        }
+        candidates = await self.collection.find(query, {"task_id": 1}).limit(limit).to_list(length=limit)
+        claimed = []
+        for candidate in candidates:
+            # Re-check the lease in the update so two workers never claim the same task
+            document = await self.collection.find_one_and_update(
+                {**query, "task_id": candidate["task_id"]},
+                {"$set": {"owner": owner, "lease_expires_at": expires_at}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if document is not None:
+                claimed.append(document)
+        return claimed
+
+    async def delete_finished_before(self, cutoff_time: float) -> List[str]:
+        query = {"created_at": {"$lt": cutoff_time}, "status": {"$in": list(TERMINAL_STATUSES)}}
+        removed = [doc["task_id"] async for doc in self.collection.find(query, {"task_id": 1})]
+        if removed:
+            await self.collection.delete_many({"task_id": {"$in": removed}})
+        return removed
+
+    async def references_image(self, image_sha256: str) -> bool:
+        document = await self.collection.find_one(
+            {"image_sha256": image_sha256, "status": {"$nin": list(TERMINAL_STATUSES)}},
+            {"_id": 1}
+        )
+        return document is not None
+
+    async def count(self) -> int:
+        return await self.collection.count_documents({})
+
+
+def create_task_store(backend: Optional[str] = None) -> TaskStore:
+    """Build the task store selected by RUNWAY_TASK_STORE ("memory" or "mongo")"""
+    backend = (backend or os.getenv("RUNWAY_TASK_STORE", "memory")).lower()
+    if backend == "mongo":
+        return MongoTaskStore(os.getenv("RUNWAY_TASK_COLLECTION", "runway_tasks"))
+    if backend != "memory":
+        logger.warning(f"Unknown RUNWAY_TASK_STORE '{backend}', falling back to in-memory store")
+    return InMemoryTaskStore()
@@ -0,0 +1,347 @@
+"""
+Runway Video Cache
+
+Local, content-addressed cache for generated Runway videos. Each upstream URL is
+downloaded once (concurrent viewers share the same fetch), stored under the SHA-256 of
+its bytes, evicted least-recently-used once the cache exceeds its size budget and
+revalidated upstream with ETag/Last-Modified when it gets old.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+import aiofiles
+
+from services.http_client_pool import HTTPClientPool, http_client_pool
+
+logger = logging.getLogger(__name__)
+
+
+class CachedVideo:
+    """A video file held by the cache"""
+
+    __slots__ = ("digest", "path", "size", "urls", "upstream_etag", "upstream_last_modified",
+                 "validated_at", "pins")
+
+    def __init__(self, digest: str, path: Path, size: int):
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.urls: Set[str] = set()
+        self.upstream_etag: Optional[str] = None
+        self.upstream_last_modified: Optional[str] = None
+        self.validated_at = time.time()
+        self.pins = 0
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag derived from the content hash"""
+        return f'"{self.digest}"'
+
+    def to_meta(self) -> Dict[str, Any]:
+        return {
+            "digest": self.digest,
+            "size": self.size,
+            "urls": sorted(self.urls),
+            "upstream_etag": self.upstream_etag,
+            "upstream_last_modified": self.upstream_last_modified,
+            "validated_at": self.validated_at
+        }
+
+
+class _Flight:
+    """One in-progress download and the callers waiting for it"""
+
+    __slots__ = ("task", "waiters", "granted")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.granted = False
+
+
+class VideoCache:
+    """Size-bounded LRU cache of upstream videos on local disk"""
+
+    def __init__(
+        self,
+        http_pool: HTTPClientPool,
+        cache_dir: str = "/tmp/runway_video_cache",
+        max_bytes: int = 5 * 1024 ** 3,
+        revalidate_after: float = 3600.0
+    ):
+        self.http_pool = http_pool
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+
+        self._entries: "OrderedDict[str, CachedVideo]" = OrderedDict()
+        self._url_index: Dict[str, str] = {}
+        self._inflight: Dict[str, _Flight] = {}
+        # Files of evicted entries being removed off the event loop, and digests whose
+        # file is being moved into place (never evicted meanwhile)
+        self._removing: Dict[str, asyncio.Task] = {}
+        self._placing: Set[str] = set()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def _scan_existing(self) -> List[Tuple[Dict[str, Any], Path]]:
+        """Read metadata left by a previous process (runs in a worker thread)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        metas = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+                video_path = self.cache_dir / f"{meta['digest']}.mp4"
+                if video_path.exists():
+                    metas.append((meta, video_path))
+                    continue
+            except Exception as e:
+                logger.warning(f"Discarding unreadable video cache metadata {meta_path}: {e}")
+            meta_path.unlink(missing_ok=True)
+        for leftover in (*self.cache_dir.glob("*.part"), *self.cache_dir.glob("*.tmp")):
+            leftover.unlink(missing_ok=True)
+        return metas
+
+    async def _load_existing(self):
+        """Adopt files left by a previous process so they count toward the budget"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            metas = await asyncio.to_thread(self._scan_existing)
+
+            # Oldest validation first, so LRU order roughly survives restarts
+            for meta, video_path in sorted(metas, key=lambda item: item[0].get("validated_at", 0)):
+                entry = CachedVideo(meta["digest"], video_path, meta["size"])
+                entry.urls = set(meta.get("urls", []))
+                entry.upstream_etag = meta.get("upstream_etag")
+                entry.upstream_last_modified = meta.get("upstream_last_modified")
+                entry.validated_at = meta.get("validated_at", 0)
+                self._add_entry(entry)
+            self._loaded = True
+            self._evict()
+
+    async def acquire(self, url: str) -> CachedVideo:
+        """
+        Return a pinned cache entry for `url`, downloading or revalidating it if needed.
+        Callers must `release()` the entry once the file has been served.
+        """
+        await self._load_existing()
+        digest = self._url_index.get(url)
+        entry = self._entries.get(digest) if digest else None
+
+        if entry is not None and time.time() - entry.validated_at < self.revalidate_after:
+            self.hits += 1
+            entry.pins += 1
+        else:
+            if entry is None:
+                self.misses += 1
+            # Returned already pinned on our behalf
+            entry = await self._single_flight(url)
+
+        if entry.digest in self._entries:
+            self._entries.move_to_end(entry.digest)
+        self._evict()
+        return entry
+
+    def release(self, entry: CachedVideo):
+        entry.pins = max(entry.pins - 1, 0)
+        self._evict()
+
+    async def _single_flight(self, url: str) -> CachedVideo:
+        flight = self._inflight.get(url)
+        if flight is None:
+            flight = self._inflight[url] = _Flight()
+            flight.task = asyncio.create_task(self._fetch(url, flight))
+            flight.task.add_done_callback(
+                lambda _: self._inflight.pop(url, None) if self._inflight.get(url) is flight else None
+            )
+        flight.waiters += 1
+        try:
+            # Shield so one viewer disconnecting does not cancel everyone's download
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # Give back the pin taken for us, or make sure none is taken
+            if flight.granted:
+                self.release(flight.task.result())
+            else:
+                flight.waiters -= 1
+            raise
+
+    def _grant(self, url: str, flight: _Flight, entry: CachedVideo):
+        """
+        Pin `entry` once per waiter. Must run in the same loop step that inserts or
+        selects the entry, so eviction can never remove it before waiters resume.
+        """
+        if self._inflight.get(url) is flight:
+            del self._inflight[url]
+        entry.pins += flight.waiters
+        flight.granted = True
+
+    async def _fetch(self, url: str, flight: _Flight) -> CachedVideo:
+        digest = self._url_index.get(url)
+        current = self._entries.get(digest) if digest else None
+
+        request_headers = {}
+        if current is not None:
+            self.revalidations += 1
+            if current.upstream_etag:
+                request_headers["If-None-Match"] = current.upstream_etag
+            if current.upstream_last_modified:
+                request_headers["If-Modified-Since"] = current.upstream_last_modified
+
+        partial_path = self.cache_dir / f"{uuid.uuid4().hex}.part"
+        try:
+            async with self.http_pool.stream("GET", url, headers=request_headers) as response:
+                if current is not None and response.status_code == 304:
+                    current.validated_at = time.time()
+                    self._grant(url, flight, current)
+                    await self._write_meta(current)
+                    return current
+                if current is not None and response.status_code >= 400:
+                    # Signed upstream URLs expire; keep serving the copy we have
+                    logger.warning(f"Revalidation of cached video failed ({response.status_code}), serving cached copy")
+                    current.validated_at = time.time()
+                    self._grant(url, flight, current)
+                    return current
+                response.raise_for_status()
+
+                hasher = hashlib.sha256()
+                size = 0
+                async with aiofiles.open(partial_path, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        hasher.update(chunk)
+                        size += len(chunk)
+                        await f.write(chunk)
+                upstream_etag = response.headers.get("etag")
+                upstream_last_modified = response.headers.get("last-modified")
+        except Exception:
+            await asyncio.to_thread(partial_path.unlink, missing_ok=True)
+            if current is not None and not flight.granted:
+                logger.warning(f"Revalidation of cached video failed, serving cached copy of {url}")
+                self._grant(url, flight, current)
+                return current
+            raise
+
+        digest = hasher.hexdigest()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            # Pinned before awaiting, so it cannot be evicted meanwhile
+            self._grant(url, flight, entry)
+            await asyncio.to_thread(partial_path.unlink, missing_ok=True)
+        else:
+            self._placing.add(digest)
+            try:
+                # An earlier copy may still be on its way out under the same name
+                removal = self._removing.get(digest)
+                if removal is not None:
+                    await asyncio.shield(removal)
+                final_path = self.cache_dir / f"{digest}.mp4"
+                await asyncio.to_thread(os.replace, partial_path, final_path)
+            finally:
+                self._placing.discard(digest)
+            # Another URL with the same bytes may have been stored meanwhile
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = CachedVideo(digest, final_path, size)
+                self._add_entry(entry)
+            self._grant(url, flight, entry)
+
+        if current is not None and current is not entry:
+            current.urls.discard(url)
+        entry.urls.add(url)
+        entry.upstream_etag = upstream_etag
+        entry.upstream_last_modified = upstream_last_modified
+        entry.validated_at = time.time()
+        self._url_index[url] = digest
+        await self._write_meta(entry)
+        return entry
+
+    def _add_entry(self, entry: CachedVideo):
+        self._entries[entry.digest] = entry
+        self.total_bytes += entry.size
+        for url in entry.urls:
+            self._url_index[url] = entry.digest
+
+    async def _write_meta(self, entry: CachedVideo):
+        # Best effort: losing metadata only means the file is re-fetched after a restart
+        try:
+            await asyncio.to_thread(self._write_meta_file, entry.digest, entry.to_meta())
+        except Exception as e:
+            logger.warning(f"Failed to write video cache metadata for {entry.digest}: {e}")
+
+    def _write_meta_file(self, digest: str, meta: Dict[str, Any]):
+        meta_path = self.cache_dir / f"{digest}.json"
+        temp_path = self.cache_dir / f"{digest}.{uuid.uuid4().hex}.tmp"
+        temp_path.write_text(json.dumps(meta))
+        os.replace(temp_path, meta_path)
+
+    def _evict(self):
+        """
+        Drop least-recently-used, unpinned entries until under the size budget. The
+        bookkeeping happens right away; the files are removed in a worker thread.
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+        for digest in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            entry = self._entries[digest]
+            if entry.pins or digest in self._placing:
+                continue
+            del self._entries[digest]
+            self.total_bytes -= entry.size
+            for url in entry.urls:
+                if self._url_index.get(url) == digest:
+                    del self._url_index[url]
+            self._removing[digest] = asyncio.create_task(self._remove_files(entry))
+
+    async def _remove_files(self, entry: CachedVideo):
+        try:
+            await asyncio.to_thread(self._unlink_files, entry.path, self.cache_dir / f"{entry.digest}.json")
+            logger.info(f"Evicted cached video {entry.digest} ({entry.size} bytes)")
+        except Exception as e:
+            logger.warning(f"Failed to remove evicted video {entry.digest}: {e}")
+        finally:
+            if self._removing.get(entry.digest) is asyncio.current_task():
+                del self._removing[entry.digest]
+
+    @staticmethod
+    def _unlink_files(*paths: Path):
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "inflight_downloads": len(self._inflight)
+        }
+
+
+# Global cache instance
+runway_video_cache = VideoCache(
+    http_pool=http_client_pool,
+    cache_dir=os.getenv("RUNWAY_VIDEO_CACHE_DIR", "/tmp/runway_video_cache"),
+    max_bytes=int(os.getenv("RUNWAY_VIDEO_CACHE_MAX_BYTES", str(5 * 1024 ** 3))),
+    revalidate_after=float(os.getenv("RUNWAY_VIDEO_CACHE_REVALIDATE_SECONDS", "3600"))
+)
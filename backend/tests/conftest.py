@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules import each other relative to backend/ (e.g. `from services.x import ...`)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,286 @@
+"""
+Credit ledger: holds shared by workers, write-behind flushes and journal adoption
+"""
+
+import os
+import json
+import asyncio
+
+import pytest
+
+from services.credit_ledger import CreditLedger, InsufficientCredits
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int):
+        self.matched_count = matched_count
+
+
+def evaluate(expression, document, variables=None):
+    """The aggregation operators CreditLedger uses in $expr"""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, path = expression[2:].partition(".")
+        value = variables[name]
+        return value[path] if path else value
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if not isinstance(expression, dict) or not expression:
+        return expression
+    (operator, argument), = expression.items()
+    if operator == "$map":
+        items = evaluate(argument["input"], document, variables)
+        return [evaluate(argument["in"], document, {**variables, "this": item}) for item in items]
+    if operator == "$objectToArray":
+        return [{"k": key, "v": value} for key, value in evaluate(argument, document, variables).items()]
+    if operator == "$sum":
+        return sum(evaluate(argument, document, variables))
+    values = [evaluate(item, document, variables) for item in argument]
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if operator == "$subtract":
+        return values[0] - values[1]
+    if operator == "$gte":
+        return values[0] >= values[1]
+    raise NotImplementedError(operator)
+
+
+def lookup(document, path):
+    for part in path.split("."):
+        if not isinstance(document, dict) or part not in document:
+            return None, False
+        document = document[part]
+    return document, True
+
+
+class FakeUsers:
+    """Just enough of a motor collection for CreditLedger"""
+
+    def __init__(self, users):
+        self.documents = {user_id: {"id": user_id, "credits": credits} for user_id, credits in users.items()}
+        self.available = True
+
+    def _matches(self, document, query):
+        for key, condition in query.items():
+            if key == "$expr":
+                if not evaluate(condition, document):
+                    return False
+                continue
+            value, exists = lookup(document, key)
+            if isinstance(condition, dict) and "$exists" in condition:
+                if exists != condition["$exists"]:
+                    return False
+            elif isinstance(condition, dict) and "$ne" in condition:
+                if condition["$ne"] in (value or []):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    async def update_one(self, query, update):
+        if not self.available:
+            raise ConnectionError("MongoDB unavailable")
+        document = self.documents.get(query["id"])
+        if document is None or not self._matches(document, query):
+            return UpdateResult(0)
+        for path, value in update.get("$set", {}).items():
+            parent, _, key = path.rpartition(".")
+            document.setdefault(parent, {})[key] = value
+        for path in update.get("$unset", {}):
+            parent, _, key = path.rpartition(".")
+            document.get(parent, {}).pop(key, None)
+        for field, delta in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + delta
+        for field, push in update.get("$push", {}).items():
+            document[field] = (document.get(field, []) + push["$each"])[push["$slice"]:]
+        return UpdateResult(1)
+
+    async def find_one(self, query, projection=None):
+        if not self.available:
+            raise ConnectionError("MongoDB unavailable")
+        return self.documents.get(query["id"])
+
+
+class FakeDatabase:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+def make_ledger(tmp_path, users, worker_id=None):
+    return CreditLedger(journal_dir=str(tmp_path), flush_interval=3600, worker_id=worker_id,
+                        database=FakeDatabase(users))
+
+
+def crash(ledger):
+    """Simulate the worker process dying: no final flush, its lock is gone"""
+    ledger._flusher.cancel()
+    os.close(ledger._journal_fd)
+    os.close(ledger._lock_fd)
+
+
+def test_reserve_commit_refund_flush(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        ledger = make_ledger(tmp_path, users)
+        await ledger.start()
+
+        await ledger.reserve("u1", 30, reservation_id="a")
+        await ledger.reserve("u1", 50, reservation_id="b")
+        with pytest.raises(InsufficientCredits):
+            await ledger.reserve("u1", 30, reservation_id="c")
+
+        assert ledger.commit("a")
+        assert ledger.refund("b")
+        assert not ledger.commit("b")
+        # Settlements hold their credits until they are written
+        assert await ledger.available("u1") == 20
+
+        await ledger.flush()
+        assert users.documents["u1"]["credits"] == 70
+        assert users.documents["u1"]["credit_holds"] == {}
+        assert await ledger.available("u1") == 70
+        assert ledger.stats()["unapplied_batches"] == 0
+        assert ledger.stats()["open_reservations"] == 0
+        await ledger.stop()
+        # Nothing outstanding: the worker's journal is removed
+        assert not list(tmp_path.glob("*.jsonl"))
+
+    asyncio.run(scenario())
+
+
+def test_workers_cannot_spend_the_same_credits(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        first = make_ledger(tmp_path, users)
+        second = make_ledger(tmp_path, users)
+        await first.start()
+        await second.start()
+
+        await first.reserve("u1", 60, reservation_id="a")
+        with pytest.raises(InsufficientCredits) as rejected:
+            await second.reserve("u1", 60, reservation_id="b")
+        assert rejected.value.available == 40
+
+        # A running worker's journal is never adopted
+        assert first.journal_path.exists() and second.journal_path.exists()
+        await first.stop()
+        await second.stop()
+
+    asyncio.run(scenario())
+
+
+def test_dead_worker_journal_is_adopted(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        ledger = make_ledger(tmp_path, users)
+        await ledger.start()
+        await ledger.reserve("u1", 25, reservation_id="a")
+        ledger.commit("a")
+        users.available = False
+        await ledger.flush()
+        assert ledger.stats()["unapplied_batches"] == 1
+        crash(ledger)
+
+        users.available = True
+        restarted = make_ledger(tmp_path, users)
+        restarted.hold_is_live = lambda reservation_id: asyncio.sleep(0, result=False)
+        await restarted.start()
+        assert not ledger.journal_path.exists()
+        await restarted.flush()
+        assert users.documents["u1"]["credits"] == 75
+        assert users.documents["u1"]["credit_holds"] == {}
+        assert restarted.stats()["unapplied_batches"] == 0
+        await restarted.stop()
+
+    asyncio.run(scenario())
+
+
+def test_replayed_batch_is_applied_once(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        ledger = make_ledger(tmp_path, users)
+        await ledger.start()
+        await ledger.reserve("u1", 10, reservation_id="a")
+        ledger.commit("a")
+        await ledger.flush()
+        assert users.documents["u1"]["credits"] == 90
+        await ledger.stop()
+
+        # A worker died after MongoDB applied the batch but before "applied" was journaled
+        batch_id = users.documents["u1"]["credit_ledger_batches"][-1]
+        record = {"op": "batch", "batch_id": batch_id, "user_id": "u1", "delta": -10, "txns": ["a:commit"]}
+        (tmp_path / "dead.jsonl").write_text(json.dumps(record) + "\n")
+        restarted = make_ledger(tmp_path, users)
+        await restarted.start()
+        await restarted.flush()
+        assert users.documents["u1"]["credits"] == 90
+        assert restarted.stats()["unapplied_batches"] == 0
+        await restarted.stop()
+
+    asyncio.run(scenario())
+
+
+def test_batch_for_unknown_user_is_kept(tmp_path):
+    async def scenario():
+        users = FakeUsers({})
+        record = {"op": "batch", "batch_id": "b1", "user_id": "ghost", "delta": -10, "txns": ["a:commit"]}
+        (tmp_path / "dead.jsonl").write_text(json.dumps(record) + "\n")
+        ledger = make_ledger(tmp_path, users)
+        await ledger.start()
+        await ledger.flush()
+        assert ledger.stats()["unapplied_batches"] == 1
+        assert ledger.stats()["flush_failures"] == 1
+        await ledger.stop()
+        # Still outstanding, so the journal stays for the next worker
+        assert ledger.journal_path.exists()
+
+    asyncio.run(scenario())
+
+
+def test_orphaned_holds_are_released_unless_their_job_runs(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        users.documents["u1"]["credit_holds"] = {"running": 20, "gone": 30}
+        records = [
+            {"op": "hold", "reservation_id": "running", "user_id": "u1", "amount": 20},
+            {"op": "hold", "reservation_id": "gone", "user_id": "u1", "amount": 30},
+            {"op": "hold", "reservation_id": "settled", "user_id": "u1", "amount": 5},
+            {"op": "commit", "txn": "settled:refund", "user_id": "u1", "delta": 0}
+        ]
+        (tmp_path / "dead.jsonl").write_text("".join(json.dumps(record) + "\n" for record in records))
+
+        ledger = make_ledger(tmp_path, users)
+        ledger.hold_is_live = lambda reservation_id: asyncio.sleep(0, result=reservation_id == "running")
+        await ledger.start()
+        assert ledger.stats()["orphan_holds"] == 2
+        await ledger.flush()
+        assert users.documents["u1"]["credit_holds"] == {"running": 20}
+        assert ledger.stats()["orphan_holds"] == 0
+
+        # The worker resuming the running job takes its hold over and settles it
+        assert ledger.restore("running", "u1", 20)
+        ledger.commit("running")
+        await ledger.flush()
+        assert users.documents["u1"]["credits"] == 80
+        assert users.documents["u1"]["credit_holds"] == {}
+        await ledger.stop()
+
+    asyncio.run(scenario())
+
+
+def test_settling_after_stop_raises(tmp_path):
+    async def scenario():
+        users = FakeUsers({"u1": 100})
+        ledger = make_ledger(tmp_path, users)
+        await ledger.start()
+        await ledger.reserve("u1", 10, reservation_id="a")
+        await ledger.stop()
+        with pytest.raises(RuntimeError, match="not running"):
+            ledger.commit("a")
+        # The reservation is not lost by the failed attempt
+        assert ledger.stats()["open_reservations"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+"""
+Byte-range parsing and range responses for files served from disk
+"""
+
+import os
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from utils.http_files import RangeNotSatisfiable, file_response, parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=95-500", (95, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=0-1,5-6", None),
+    ("bytes=abc", None),
+    ("bytes=5", None),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=9-5", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 100)
+
+
+@pytest.mark.parametrize("header", ["bytes=0-", "bytes=-5", "bytes=0-1,3-4"])
+def test_no_range_of_an_empty_file_is_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, 0)
+
+
+def serve(path, range_header=None, extensions=None):
+    """Run file_response for a GET and collect the status, headers and body"""
+    headers = [(b"range", range_header.encode())] if range_header else []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""}
+    if extensions:
+        scope["extensions"] = extensions
+    released = []
+    response = file_response(Request(scope), str(path), os.stat(path), '"etag"', "application/octet-stream",
+                             release=lambda: released.append(True))
+    sent = {"body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+            sent["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            sent["body"] += message["body"]
+        elif message["type"] == "http.response.zerocopysend":
+            message["file"].seek(message["offset"])
+            sent["body"] += message["file"].read(message["count"])
+            sent["zerocopy"] = True
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    asyncio.run(response(scope, receive, send))
+    sent["released"] = released == [True]
+    return sent
+
+
+def test_range_response_reads_only_the_range(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 4)
+
+    sent = serve(path, "bytes=10-19")
+    assert sent["status"] == 206
+    assert sent["headers"]["content-range"] == "bytes 10-19/1024"
+    assert sent["headers"]["content-length"] == "10"
+    assert sent["body"] == bytes(range(10, 20))
+    assert sent["released"]
+
+
+def test_range_response_uses_zero_copy_send(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 4)
+
+    sent = serve(path, "bytes=-4", extensions={"http.response.zerocopysend": {}})
+    assert sent["status"] == 206 and sent.get("zerocopy")
+    assert sent["body"] == bytes([252, 253, 254, 255])
+
+
+def test_empty_file_range_is_416(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+
+    sent = serve(path, "bytes=-5")
+    assert sent["status"] == 416
+    assert sent["headers"]["content-range"] == "bytes */0"
+    assert serve(path)["status"] == 200
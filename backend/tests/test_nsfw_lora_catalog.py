@@ -0,0 +1,117 @@
+"""
+NSFW LoRA catalog: faceted search and the compatibility matrix
+"""
+
+import pytest
+
+from services.nsfw_lora_search import InvalidQuery
+from services.nsfw_lora_service import CatalogState
+
+
+def lora(lora_id, name, category, rating, models, file_size="100MB", strength=0.7, triggers=(), description=""):
+    return {
+        "id": lora_id,
+        "name": name,
+        "description": description or name,
+        "category": category,
+        "rating": rating,
+        "compatible_models": list(models),
+        "strength_range": [0.3, 1.0],
+        "recommended_strength": strength,
+        "trigger_words": list(triggers),
+        "creator": "tests",
+        "version": "1.0",
+        "file_size": file_size
+    }
+
+
+@pytest.fixture
+def catalog():
+    return CatalogState.from_documents({
+        "flux": [
+            lora("flux-realistic", "Realistic Portrait", "realistic_adult", "softcore", ["flux-dev", "flux-pro"],
+                 file_size="144MB", strength=0.7, triggers=["photoreal"]),
+            lora("flux-anime", "Anime Style", "anime_adult", "softcore", ["flux-dev"],
+                 file_size="80MB", strength=0.9, triggers=["anime"]),
+            lora("flux-boudoir", "Boudoir Photography", "realistic_adult", "artistic_nude", ["flux-pro"],
+                 file_size="1GB", strength=0.5, description="Soft realistic lighting")
+        ],
+        "sdxl": [
+            lora("sdxl-anime", "Anime XL", "anime_adult", "hardcore", ["sdxl-base"], file_size="200MB", strength=0.6)
+        ]
+    })
+
+
+def search(catalog, filters=None, **kwargs):
+    return catalog.search_index.search(filters or {}, **kwargs)
+
+
+def test_facet_filters_are_combined(catalog):
+    result = search(catalog, {"family": "flux", "category": "realistic_adult"})
+    assert result.ids == ["flux-realistic", "flux-boudoir"]
+    assert result.total == 2
+
+    result = search(catalog, {"family": "flux", "model_id": "flux-dev", "category": "realistic_adult"})
+    assert result.ids == ["flux-realistic"]
+    assert search(catalog, {"family": "sdxl", "model_id": "flux-dev"}).total == 0
+    # None means the facet is not filtered
+    assert search(catalog, {"family": None}).total == 4
+
+
+def test_facet_counts_cover_the_whole_match_set(catalog):
+    result = search(catalog, {"category": "anime_adult"}, limit=1)
+    assert len(result.ids) == 1 and result.total == 2
+    assert result.facets["family"] == {"flux": 1, "sdxl": 1}
+    assert result.facets["rating"] == {"hardcore": 1, "softcore": 1}
+    assert result.facets["model_id"] == {"flux-dev": 1, "sdxl-base": 1}
+
+
+def test_text_search_ranks_names_above_descriptions(catalog):
+    result = search(catalog, text="realistic")
+    # "Realistic" in the name outranks it in the description only
+    assert result.ids == ["flux-realistic", "flux-boudoir"]
+    # Prefixes match too, and every token must match
+    assert search(catalog, text="anim").ids == ["flux-anime", "sdxl-anime"]
+    assert search(catalog, text="anime xl").ids == ["sdxl-anime"]
+    assert search(catalog, text="nothing-like-this").total == 0
+
+
+def test_sorting_and_paging(catalog):
+    assert search(catalog, sort="file_size").ids == ["flux-anime", "flux-realistic", "sdxl-anime", "flux-boudoir"]
+    assert search(catalog, sort="-recommended_strength", limit=2).ids == ["flux-anime", "flux-realistic"]
+    assert search(catalog, sort="name", offset=1, limit=2).ids == ["sdxl-anime", "flux-boudoir"]
+    # Catalog order by default
+    assert search(catalog).ids == ["flux-realistic", "flux-anime", "flux-boudoir", "sdxl-anime"]
+
+
+def test_invalid_queries_are_rejected(catalog):
+    with pytest.raises(InvalidQuery):
+        search(catalog, sort="popularity")
+    with pytest.raises(InvalidQuery):
+        search(catalog, {"creator": "tests"})
+    with pytest.raises(InvalidQuery):
+        search(catalog, offset=-1)
+
+
+def test_compatibility_matrix(catalog):
+    matrix = catalog.compatibility
+    assert matrix.shape == (4, 3)
+    assert matrix.is_compatible("flux-realistic", "flux-pro")
+    assert not matrix.is_compatible("flux-anime", "flux-pro")
+    assert not matrix.is_compatible("unknown", "flux-pro")
+    assert matrix.loras_for_model("flux-dev") == ["flux-realistic", "flux-anime"]
+    assert matrix.models_supporting_all(["flux-realistic", "flux-boudoir"]) == ["flux-pro"]
+    assert matrix.models_supporting_all(["flux-realistic", "unknown"]) == []
+    assert matrix.shared_models("flux-anime", "sdxl-anime") == []
+
+
+def test_pair_scores_are_vectorised(catalog):
+    pairs = [("flux-realistic", "flux-anime"), ("flux-anime", "sdxl-anime"), ("flux-realistic", "missing")]
+    checks = catalog.compatibility.score_pairs(pairs)
+    assert checks["known"].tolist() == [True, True, False]
+    assert checks["compatible"].tolist() == [True, False, False]
+    assert checks["shared_models"].tolist() == [1, 0, 0]
+    assert checks["overlap"].tolist() == [0.5, 0.0, 0.0]
+
+    on_pro = catalog.compatibility.score_pairs(pairs, model_id="flux-pro")
+    assert on_pro["compatible"].tolist() == [False, False, False]
@@ -0,0 +1,253 @@
+"""
+Generation scheduler: caps, per-user fairness, lane weights and the shared slot pool
+"""
+
+import asyncio
+
+import pytest
+
+from services.runway_admission import AdmissionRejected, GenerationScheduler, MongoSlotPool
+
+
+class Recorder:
+    """Start callables that only record which task started"""
+
+    def __init__(self):
+        self.started = []
+
+    def job(self, task_id):
+        async def start():
+            self.started.append(task_id)
+        return start
+
+
+def test_cap_and_per_user_quota():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=3, per_user_in_flight=2)
+        positions = [scheduler.submit(f"a{index}", "alice", recorder.job(f"a{index}")) for index in range(3)]
+        positions.append(scheduler.submit("b0", "bob", recorder.job("b0")))
+        await asyncio.sleep(0)
+
+        # alice's third task waits for her quota even though the cap has room
+        assert positions[:2] == [0, 0] and positions[2] > 0 and positions[3] == 0
+        assert recorder.started == ["a0", "a1", "b0"]
+        assert scheduler.is_queued("a2")
+
+        scheduler.release("a0")
+        await asyncio.sleep(0)
+        assert recorder.started[-1] == "a2"
+        assert scheduler.stats()["in_flight"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_users_are_served_round_robin():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1, per_user_in_flight=5)
+        scheduler.submit("blocker", "carol", recorder.job("blocker"))
+        for index in range(3):
+            scheduler.submit(f"a{index}", "alice", recorder.job(f"a{index}"))
+        scheduler.submit("b0", "bob", recorder.job("b0"))
+
+        for task_id in ["blocker", "a0", "b0", "a1"]:
+            await asyncio.sleep(0)
+            scheduler.release(task_id)
+        await asyncio.sleep(0)
+        # bob's single task is not stuck behind alice's burst
+        assert recorder.started == ["blocker", "a0", "b0", "a1", "a2"]
+
+    asyncio.run(scenario())
+
+
+def test_lanes_start_tasks_by_weight():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1, per_user_in_flight=100)
+        scheduler.submit("blocker", "x", recorder.job("blocker"), lane="priority")
+        for index in range(10):
+            scheduler.submit(f"p{index}", f"p-user{index}", recorder.job(f"p{index}"), lane="priority")
+            scheduler.submit(f"f{index}", f"f-user{index}", recorder.job(f"f{index}"), lane="free")
+
+        for _ in range(10):
+            await asyncio.sleep(0)
+            scheduler.release(recorder.started[-1])
+        await asyncio.sleep(0)
+        started = recorder.started[1:11]
+        # priority (weight 4) gets four starts for every one in free (weight 1)
+        assert sum(task_id.startswith("p") for task_id in started) == 8
+        assert sum(task_id.startswith("f") for task_id in started) == 2
+
+    asyncio.run(scenario())
+
+
+def test_full_queues_are_rejected_with_retry_after():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1, per_user_in_flight=1, max_queued=2,
+                                        max_queued_per_user=1, expected_task_seconds=60)
+        scheduler.submit("a0", "alice", recorder.job("a0"))
+        scheduler.submit("a1", "alice", recorder.job("a1"))
+        with pytest.raises(AdmissionRejected) as per_user:
+            scheduler.submit("a2", "alice", recorder.job("a2"))
+        assert per_user.value.retry_after == 60
+
+        scheduler.submit("b0", "bob", recorder.job("b0"))
+        with pytest.raises(AdmissionRejected, match="queue is full"):
+            scheduler.submit("c0", "carol", recorder.job("c0"))
+        # Batches are admitted against their own limits
+        scheduler.check_admission("carol", count=5, batch=True)
+        assert scheduler.stats()["total_rejected"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_queued_task_leaves_the_queue():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1)
+        scheduler.submit("a0", "alice", recorder.job("a0"))
+        scheduler.submit("b0", "bob", recorder.job("b0"))
+        assert scheduler.queue_position("b0") == 1
+        assert scheduler.release("b0")
+        assert scheduler.queue_position("b0") is None
+        assert not scheduler.release("b0")
+        assert scheduler.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_adopted_tasks_count_against_the_caps():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1)
+        scheduler.adopt("recovered", "alice")
+        assert scheduler.submit("b0", "bob", recorder.job("b0")) == 1
+        await asyncio.sleep(0)
+        assert recorder.started == []
+
+        scheduler.release("recovered")
+        await asyncio.sleep(0)
+        assert recorder.started == ["b0"]
+
+    asyncio.run(scenario())
+
+
+class UpdateResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeSlots:
+    """Just enough of a motor collection for MongoSlotPool"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def _matches(self, document, query):
+        for key, condition in query.items():
+            if key == "$or":
+                if not any(self._matches(document, option) for option in condition):
+                    return False
+            elif isinstance(condition, dict):
+                value = document.get(key)
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+                if "$lt" in condition and not value < condition["$lt"]:
+                    return False
+                if "$ne" in condition and value == condition["$ne"]:
+                    return False
+            elif document.get(key) != condition:
+                return False
+        return True
+
+    async def update_one(self, query, update, upsert=False):
+        if upsert and query["_id"] not in self.documents:
+            self.documents[query["_id"]] = {"_id": query["_id"], **update["$setOnInsert"]}
+            return UpdateResult(1)
+        for document in self.documents.values():
+            if self._matches(document, query):
+                document.update(update.get("$set", {}))
+                return UpdateResult(1)
+        return UpdateResult(0)
+
+    async def update_many(self, query, update):
+        matched = [document for document in self.documents.values() if self._matches(document, query)]
+        for document in matched:
+            document.update(update["$set"])
+        return UpdateResult(len(matched))
+
+    async def find_one_and_update(self, query, update):
+        for document in self.documents.values():
+            if self._matches(document, query):
+                document.update(update["$set"])
+                return dict(document)
+        return None
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+def test_workers_share_one_in_flight_cap():
+    async def scenario():
+        slots = FakeSlots()
+        recorder = Recorder()
+        schedulers = []
+        for worker in ("w1", "w2"):
+            pool = MongoSlotPool(2, worker, lease_seconds=60, database=FakeDatabase(slots))
+            await pool.initialize()
+            scheduler = GenerationScheduler(max_in_flight=2, per_user_in_flight=5, slots=pool,
+                                            slot_retry_seconds=0.01)
+            scheduler.start()
+            schedulers.append(scheduler)
+
+        for worker, scheduler in zip(("w1", "w2"), schedulers):
+            for index in range(2):
+                scheduler.submit(f"{worker}-{index}", f"user-{worker}", recorder.job(f"{worker}-{index}"))
+        await asyncio.sleep(0.05)
+        assert len(recorder.started) == 2
+
+        # A slot freed on one worker is picked up by whichever worker has work queued
+        first = recorder.started[0]
+        owner = schedulers[0] if first.startswith("w1") else schedulers[1]
+        owner.release(first)
+        await asyncio.sleep(0.05)
+        assert len(recorder.started) == 3
+        assert sum(document["holder"] is not None for document in slots.documents.values()) == 2
+
+        for scheduler in schedulers:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_recovered_task_takes_the_next_shared_slot():
+    async def scenario():
+        slots = FakeSlots()
+        pool = MongoSlotPool(1, "w1", lease_seconds=60, database=FakeDatabase(slots))
+        await pool.initialize()
+        recorder = Recorder()
+        scheduler = GenerationScheduler(max_in_flight=1, slots=pool, slot_retry_seconds=0.01)
+        scheduler.start()
+
+        scheduler.adopt("recovered", "alice")
+        scheduler.submit("new", "bob", recorder.job("new"))
+        await asyncio.sleep(0.05)
+        assert recorder.started == []
+        assert slots.documents[0]["holder"] is not None
+
+        scheduler.release("recovered")
+        await asyncio.sleep(0.05)
+        assert recorder.started == ["new"]
+        await scheduler.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+"""
+Request coalescing and idempotency keys for Runway task creation
+"""
+
+import asyncio
+
+import pytest
+
+from services.runway_request_dedup import IdempotencyConflict, RequestCoalescer, request_fingerprint
+
+
+def counting_create(result="task-1", delay=0.01):
+    calls = []
+
+    async def create():
+        calls.append(result)
+        await asyncio.sleep(delay)
+        return result
+
+    return create, calls
+
+
+def test_fingerprint_depends_on_user_and_parameters():
+    request = {"prompt_text": "a cat", "seed": 1, "duration": 5}
+    assert request_fingerprint("u1", request) == request_fingerprint("u1", dict(reversed(request.items())))
+    assert request_fingerprint("u1", request) != request_fingerprint("u2", request)
+    assert request_fingerprint("u1", request) != request_fingerprint("u1", request, image_sha256="abc")
+
+
+def test_identical_in_flight_requests_share_one_creation():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        create, calls = counting_create()
+        results = await asyncio.gather(*(coalescer.run("u1", "fp", None, create) for _ in range(3)))
+
+        assert calls == ["task-1"]
+        assert sorted(results, key=lambda result: result[1]) == [
+            ("task-1", False), ("task-1", True), ("task-1", True)
+        ]
+        # Coalescing ends once the task is final
+        coalescer.bind("task-1", "fp")
+        coalescer.task_finished("task-1")
+        await coalescer.run("u1", "fp", None, create)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_idempotency_key_replays_and_rejects_other_parameters():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        create, calls = counting_create()
+        assert await coalescer.run("u1", "fp", "key-1", create) == ("task-1", False)
+        coalescer.bind("task-1", "fp")
+        coalescer.task_finished("task-1")
+
+        # The key outlives the task, so a retry never creates a second one
+        assert await coalescer.run("u1", "fp", "key-1", create) == ("task-1", True)
+        assert calls == ["task-1"]
+        with pytest.raises(IdempotencyConflict):
+            await coalescer.run("u1", "other-fp", "key-1", create)
+        # Keys are scoped per user
+        assert await coalescer.run("u2", "fp", "key-1", create) == ("task-1", False)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_failed_creation_is_not_replayed():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        attempts = []
+
+        async def failing():
+            attempts.append(1)
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            await coalescer.run("u1", "fp", "key-1", failing)
+        create, calls = counting_create()
+        assert await coalescer.run("u1", "fp", "key-1", create) == ("task-1", False)
+        assert attempts == [1] and calls == ["task-1"]
+
+    asyncio.run(scenario())
+
+
+def test_expired_keys_are_pruned():
+    async def scenario():
+        coalescer = RequestCoalescer(key_ttl_seconds=0.01)
+        create, calls = counting_create(delay=0)
+        await coalescer.run("u1", None, "key-1", create)
+        await asyncio.sleep(0.02)
+        await coalescer.run("u1", None, "key-1", create)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
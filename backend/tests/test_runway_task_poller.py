@@ -0,0 +1,134 @@
+"""
+Runway task poller: batched polling until final, error and timeout handling
+"""
+
+import time
+import asyncio
+from types import SimpleNamespace
+
+from services.runway_task_poller import RunwayTaskPoller
+
+FAST_SCHEDULE = ((float("inf"), 0.01),)
+
+
+class FakeTasks:
+    """Runway `client.tasks` returning scripted statuses per Runway task id"""
+
+    def __init__(self, statuses):
+        self.statuses = {task_id: list(script) for task_id, script in statuses.items()}
+        self.calls = []
+
+    async def retrieve(self, runway_task_id):
+        self.calls.append(runway_task_id)
+        script = self.statuses[runway_task_id]
+        status = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(status, Exception):
+            raise status
+        return SimpleNamespace(status=status)
+
+
+def make_poller(tasks, **kwargs):
+    events = []
+    client = SimpleNamespace(tasks=tasks)
+
+    async def get_client():
+        return client
+
+    async def on_status(task_id, task_status, age):
+        events.append(("status", task_id, task_status.status))
+        return task_status.status in ("SUCCEEDED", "FAILED")
+
+    async def on_error(task_id, error):
+        events.append(("error", task_id, str(error)))
+
+    async def on_timeout(task_id):
+        events.append(("timeout", task_id))
+
+    options = {"requests_per_second": 0, "interval_schedule": FAST_SCHEDULE, **kwargs}
+    poller = RunwayTaskPoller(get_client, on_status, on_error, on_timeout, **options)
+    return poller, events
+
+
+async def wait_until_idle(poller, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while poller.outstanding and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_tasks_are_polled_until_final():
+    async def scenario():
+        tasks = FakeTasks({"r1": ["PENDING", "RUNNING", "SUCCEEDED"], "r2": ["FAILED"]})
+        poller, events = make_poller(tasks)
+        poller.track("t1", "r1")
+        poller.track("t2", "r2")
+        await wait_until_idle(poller)
+
+        assert [event for event in events if event[1] == "t1"] == [
+            ("status", "t1", "PENDING"), ("status", "t1", "RUNNING"), ("status", "t1", "SUCCEEDED")
+        ]
+        assert [event for event in events if event[1] == "t2"] == [("status", "t2", "FAILED")]
+        # Final tasks are dropped and the loop goes idle
+        assert poller.outstanding == 0
+        await asyncio.sleep(0.05)
+        assert not poller.stats()["running"]
+        await poller.stop()
+
+    asyncio.run(scenario())
+
+
+def test_repeated_failures_are_reported_once():
+    async def scenario():
+        tasks = FakeTasks({"r1": [RuntimeError("upstream down")]})
+        poller, events = make_poller(tasks, max_consecutive_errors=3)
+        poller.track("t1", "r1")
+        await wait_until_idle(poller)
+
+        assert len(tasks.calls) == 3
+        assert events == [("error", "t1", "upstream down")]
+        await poller.stop()
+
+    asyncio.run(scenario())
+
+
+def test_a_recovered_error_resets_the_count():
+    async def scenario():
+        flaky = RuntimeError("blip")
+        tasks = FakeTasks({"r1": [flaky, flaky, "RUNNING", flaky, flaky, "SUCCEEDED"]})
+        poller, events = make_poller(tasks, max_consecutive_errors=3)
+        poller.track("t1", "r1")
+        await wait_until_idle(poller)
+
+        assert events == [("status", "t1", "RUNNING"), ("status", "t1", "SUCCEEDED")]
+        await poller.stop()
+
+    asyncio.run(scenario())
+
+
+def test_old_tasks_time_out_without_a_request():
+    async def scenario():
+        tasks = FakeTasks({"r1": ["RUNNING"]})
+        poller, events = make_poller(tasks, timeout_seconds=60)
+        poller.track("t1", "r1", submitted_at=time.time() - 120)
+        await wait_until_idle(poller)
+
+        assert events == [("timeout", "t1")]
+        assert tasks.calls == []
+        await poller.stop()
+
+    asyncio.run(scenario())
+
+
+def test_interval_grows_with_age_and_backlog():
+    async def scenario():
+        poller, _ = make_poller(FakeTasks({}), requests_per_second=2,
+                                interval_schedule=((60.0, 5.0), (float("inf"), 20.0)))
+        assert poller._poll_interval(10) == 5.0
+        assert poller._poll_interval(600) == 20.0
+
+        # 40 outstanding tasks at 2 requests/s need at least 20s between polls of each
+        for index in range(40):
+            poller.track(f"t{index}", f"r{index}", submitted_at=time.time() + 3600)
+        assert poller._poll_interval(10) == 20.0
+        await poller.stop()
+
+    asyncio.run(scenario())
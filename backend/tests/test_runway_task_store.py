@@ -0,0 +1,126 @@
+"""
+In-memory Runway task store: guarded transitions, cursor paging and leases
+"""
+
+import asyncio
+
+import pytest
+
+from services.runway_task_store import InMemoryTaskStore, encode_task_cursor, decode_task_cursor
+
+
+def make_store(tasks):
+    """Store holding (task_id, user_id, created_at, status) tuples"""
+    store = InMemoryTaskStore()
+
+    async def fill():
+        for task_id, user_id, created_at, status in tasks:
+            await store.create(task_id, {"user_id": user_id, "created_at": created_at, "status": status})
+
+    asyncio.run(fill())
+    return store
+
+
+def test_transition_only_from_allowed_statuses():
+    async def scenario():
+        store = InMemoryTaskStore()
+        await store.create("t1", {"user_id": "u1", "created_at": 1.0, "status": "initializing"})
+
+        assert await store.transition("t1", "generating", from_statuses=["queued"]) is None
+        moved = await store.transition("t1", "generating", from_statuses=["initializing", "queued"],
+                                       fields={"progress": 20.0})
+        assert moved["status"] == "generating" and moved["progress"] == 20.0
+
+        assert (await store.transition("t1", "completed"))["status"] == "completed"
+        # Terminal tasks never change again
+        assert await store.transition("t1", "failed") is None
+        assert await store.transition("missing", "failed") is None
+
+        # The status index follows transitions
+        assert [task["task_id"] for task in await store.list_by_user("u1", status="completed")] == ["t1"]
+        assert await store.list_by_user("u1", status="initializing") == []
+
+    asyncio.run(scenario())
+
+
+def test_create_rejects_duplicates_and_returns_copies():
+    async def scenario():
+        store = InMemoryTaskStore()
+        created = await store.create("t1", {"user_id": "u1", "created_at": 1.0, "status": "queued", "request": {}})
+        created["request"]["prompt_text"] = "changed"
+        assert (await store.get("t1"))["request"] == {}
+        with pytest.raises(ValueError):
+            await store.create("t1", {"user_id": "u1", "created_at": 2.0, "status": "queued"})
+
+    asyncio.run(scenario())
+
+
+def test_cursor_paging_walks_newest_first():
+    # Another user's task in between must not show up
+    store = make_store([(f"t{index}", "u1", float(index), "completed") for index in range(7)]
+                       + [("x", "u2", 3.5, "completed")])
+
+    async def walk():
+        pages = []
+        before = None
+        while True:
+            page = await store.list_by_user("u1", limit=3, before=before)
+            if not page:
+                return pages
+            pages.append([task["task_id"] for task in page])
+            before = decode_task_cursor(encode_task_cursor(page[-1]))
+
+    assert asyncio.run(walk()) == [["t6", "t5", "t4"], ["t3", "t2", "t1"], ["t0"]]
+
+    async def newer():
+        cursor = decode_task_cursor(encode_task_cursor(await store.get("t2")))
+        return [task["task_id"] for task in await store.list_by_user("u1", limit=2, after=cursor)]
+
+    # `after` returns the page just newer than the cursor, still newest first
+    assert asyncio.run(newer()) == ["t4", "t3"]
+
+
+def test_cursor_ties_are_broken_by_task_id():
+    store = make_store([("a", "u1", 5.0, "queued"), ("b", "u1", 5.0, "queued"), ("c", "u1", 5.0, "queued")])
+
+    async def scenario():
+        first = await store.list_by_user("u1", limit=2)
+        rest = await store.list_by_user("u1", limit=2, before=decode_task_cursor(encode_task_cursor(first[-1])))
+        return [task["task_id"] for task in first], [task["task_id"] for task in rest]
+
+    assert asyncio.run(scenario()) == (["c", "b"], ["a"])
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_task_cursor("not-a-cursor")
+
+
+def test_orphaned_tasks_are_claimed_once():
+    async def scenario():
+        store = InMemoryTaskStore()
+        await store.create("live", {"user_id": "u1", "created_at": 1.0, "status": "processing",
+                                    "owner": "w1", "lease_expires_at": 200.0})
+        await store.create("orphan", {"user_id": "u1", "created_at": 2.0, "status": "processing",
+                                      "owner": "w1", "lease_expires_at": 50.0})
+        await store.create("done", {"user_id": "u1", "created_at": 3.0, "status": "completed",
+                                    "owner": "w1", "lease_expires_at": 50.0})
+
+        claimed = await store.claim_orphaned("w2", now=100.0, expires_at=160.0)
+        assert [task["task_id"] for task in claimed] == ["orphan"]
+        assert await store.claim_orphaned("w3", now=100.0, expires_at=160.0) == []
+        assert await store.renew_leases("w2", 220.0) == 1
+        assert (await store.get("orphan"))["lease_expires_at"] == 220.0
+
+    asyncio.run(scenario())
+
+
+def test_references_image_only_counts_unfinished_tasks():
+    async def scenario():
+        store = InMemoryTaskStore()
+        await store.create("t1", {"user_id": "u1", "created_at": 1.0, "status": "processing", "image_sha256": "abc"})
+        assert await store.references_image("abc")
+        await store.transition("t1", "completed")
+        assert not await store.references_image("abc")
+
+    asyncio.run(scenario())
@@ -0,0 +1,270 @@
+"""
+HTTP File Helpers
+
+Shared helpers for serving files from disk with conditional requests
+(If-None-Match / If-Modified-Since) and single byte-range (206) responses. Ranges are
+handed to sendfile() when the server supports the ASGI zero-copy send extension.
+"""
+
+import os
+import stat
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple, Mapping, NamedTuple
+
+import anyio
+from fastapi import Request
+from fastapi.responses import Response, FileResponse
+from starlette.background import BackgroundTask
+
+# Read size for ranges on servers without zero-copy send
+RANGE_CHUNK_SIZE = 256 * 1024
+
+
+class CachedStat(NamedTuple):
+    stat_result: os.stat_result
+    etag: str
+    cached_at: float
+
+
+class StatCache:
+    """
+    Small LRU of stat() results with a TTL, so hot files are served without touching
+    the filesystem metadata on every request. Missing files are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedStat]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag_for(stat_result: os.stat_result) -> str:
+        base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}-{stat_result.st_ino}"
+        return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
+
+    async def get(self, path: str) -> CachedStat:
+        """Return the (possibly cached) stat of a regular file; raises FileNotFoundError"""
+        entry = self._entries.get(path)
+        if entry is not None and time.monotonic() - entry.cached_at < self.ttl_seconds:
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        stat_result = await asyncio.to_thread(os.stat, path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise FileNotFoundError(path)
+        entry = CachedStat(stat_result, self.etag_for(stat_result), time.monotonic())
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, path: str):
+        self._entries.pop(path, None)
+
+
+class _ReleasingMixin:
+    """Runs `release` once the response is over, even when the client disconnects mid-body"""
+
+    release: Optional[Callable[[], Any]] = None
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.release is not None:
+                self.release()
+
+
+class _FileRangeResponse(FileResponse):
+    """206 response for one byte range of a file"""
+
+    chunk_size = RANGE_CHUNK_SIZE
+
+    def __init__(self, path: str, start: int, end: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.start = start
+        self.count = end - start + 1
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.count
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if self.background is not None:
+            await self.background()
+
+
+class _ReleasingResponse(_ReleasingMixin, Response):
+    pass
+
+
+class _ReleasingFileResponse(_ReleasingMixin, FileResponse):
+    pass
+
+
+class _ReleasingFileRangeResponse(_ReleasingMixin, _FileRangeResponse):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for the file size"""
+
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into inclusive (start, end) offsets.
+    Returns None when there is no usable range (the full file should be sent);
+    multi-range requests are answered with the full file as RFC 9110 allows.
+    No range of an empty file is satisfiable.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable(range_header)
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start_text, separator, end_text = spec.partition("-")
+    if not separator:
+        return None
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(range_header)
+    return start, min(end, size - 1)
+
+
+def format_http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a representation"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        weak_etag = f"W/{etag}"
+        return "*" in candidates or etag in candidates or weak_etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= int(since)
+    return False
+
+
+def file_response(
+    request: Request,
+    path: str,
+    stat_result: os.stat_result,
+    etag: str,
+    media_type: str,
+    headers: Optional[Mapping[str, str]] = None,
+    background: Optional[BackgroundTask] = None,
+    release: Optional[Callable[[], Any]] = None
+) -> Response:
+    """
+    Build the right response for a file on disk: 304 when the client copy is current,
+    206/416 for byte ranges, otherwise a FileResponse (which the server may hand to
+    the OS with sendfile via the ASGI pathsend extension). `release` runs once the
+    response is finished or abandoned, unlike `background`, which a disconnect skips.
+    """
+    size = stat_result.st_size
+    last_modified = stat_result.st_mtime
+    base_headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": format_http_date(last_modified),
+        "Accept-Ranges": "bytes"
+    }
+
+    if is_not_modified(request, etag, last_modified):
+        response = _ReleasingResponse(status_code=304, headers=base_headers, background=background)
+        response.release = release
+        return response
+
+    # If-Range: only honour the range when the client's validator still matches
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        response = _ReleasingResponse(
+            status_code=416,
+            headers={**base_headers, "Content-Range": f"bytes */{size}"},
+            background=background
+        )
+        response.release = release
+        return response
+
+    if byte_range is None:
+        response = _ReleasingFileResponse(
+            path,
+            headers=base_headers,
+            media_type=media_type,
+            stat_result=stat_result,
+            background=background
+        )
+        response.release = release
+        return response
+
+    start, end = byte_range
+    response = _ReleasingFileRangeResponse(
+        path,
+        start,
+        end,
+        headers={
+            **base_headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1)
+        },
+        media_type=media_type,
+        stat_result=stat_result,
+        background=background
+    )
+    response.release = release
+    return response
@@ -0,0 +1,199 @@
+"""
+Service Initialization Graph
+
+Startup steps declare the steps they depend on; everything whose dependencies are
+satisfied starts concurrently, so startup takes as long as the slowest dependency chain
+rather than the sum of every initialize(). Each step runs under its own timeout and is
+timed. Required steps must finish before the app serves traffic; optional steps keep
+warming in the background and only log on failure.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+StepFunction = Callable[[], Awaitable[Any]]
+
+
+class InitStepError(RuntimeError):
+    """A required startup step failed, timed out, or depends on a step that did"""
+
+    def __init__(self, step: str, reason: str):
+        super().__init__(f"{step}: {reason}")
+        self.step = step
+        self.reason = reason
+
+
+class InitStep:
+    """One startup step and its outcome"""
+
+    __slots__ = ("name", "func", "depends_on", "timeout", "required",
+                 "status", "error", "started_at", "duration")
+
+    def __init__(self, name: str, func: StepFunction, depends_on: Iterable[str], timeout: float, required: bool):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+        self.required = required
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+
+
+class InitGraph:
+    """Dependency-ordered, concurrent runner for startup steps"""
+
+    def __init__(self, default_timeout: float = 30.0):
+        self.default_timeout = default_timeout
+        self._steps: Dict[str, InitStep] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started: Optional[float] = None
+
+    def add(
+        self,
+        name: str,
+        func: StepFunction,
+        depends_on: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        required: bool = True
+    ):
+        """Register a step; `func` is an async callable with no arguments"""
+        if name in self._steps:
+            raise ValueError(f"Duplicate init step: {name}")
+        self._steps[name] = InitStep(
+            name, func, depends_on, self.default_timeout if timeout is None else timeout, required
+        )
+
+    def _validate(self):
+        for step in self._steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self._steps:
+                    raise ValueError(f"Init step {step.name} depends on unknown step {dependency}")
+                if step.required and not self._steps[dependency].required:
+                    raise ValueError(f"Required init step {step.name} cannot depend on optional step {dependency}")
+
+        # Depth-first search for cycles
+        visiting, done = set(), set()
+
+        def visit(name: str, path: List[str]):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Init dependency cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in self._steps[name].depends_on:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._steps:
+            visit(name, [])
+
+    async def _run_step(self, step: InitStep):
+        for dependency in step.depends_on:
+            # Dependencies never raise out of their task; check the recorded status
+            await asyncio.shield(self._tasks[dependency])
+            if self._steps[dependency].status != "ok":
+                step.status = "skipped"
+                step.error = f"dependency {dependency} {self._steps[dependency].status}"
+                return
+
+        step.status = "running"
+        step.started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(step.func(), timeout=step.timeout)
+            step.status = "ok"
+        except asyncio.TimeoutError:
+            step.status = "timeout"
+            step.error = f"timed out after {step.timeout:g}s"
+        except Exception as e:
+            step.status = "failed"
+            step.error = str(e)
+        finally:
+            step.duration = time.perf_counter() - step.started_at
+
+        if step.status != "ok":
+            log = logger.error if step.required else logger.warning
+            log(f"Init step {step.name} {step.status}: {step.error}")
+
+    async def run(self):
+        """
+        Start every step and wait for the required ones. Optional steps keep running in
+        the background; raises InitStepError if any required step did not succeed.
+        """
+        self._validate()
+        self._started = time.perf_counter()
+        for name, step in self._steps.items():
+            self._tasks[name] = asyncio.create_task(self._run_step(step), name=f"init:{name}")
+
+        await asyncio.gather(*(self._tasks[name] for name, step in self._steps.items() if step.required))
+
+        required_seconds = time.perf_counter() - self._started
+        logger.info(f"Required startup steps finished in {required_seconds * 1000:.0f}ms "
+                    f"({self.background_pending} optional still warming)")
+        for line in self.format_report():
+            logger.info(line)
+
+        for step in self._steps.values():
+            if step.required and step.status != "ok":
+                raise InitStepError(step.name, step.error or step.status)
+
+        background = [task for name, task in self._tasks.items() if not self._steps[name].required]
+        if background:
+            asyncio.create_task(self._report_background(background), name="init:background-report")
+
+    async def _report_background(self, tasks: List[asyncio.Task]):
+        await asyncio.gather(*tasks, return_exceptions=True)
+        warmed = sum(1 for step in self._steps.values() if not step.required and step.status == "ok")
+        total = sum(1 for step in self._steps.values() if not step.required)
+        logger.info(f"Background warm-up finished: {warmed}/{total} optional services ready")
+
+    async def wait_background(self, timeout: Optional[float] = None):
+        """Wait for optional steps still running (e.g. before shutdown)"""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+    async def cancel_background(self):
+        """Cancel optional steps that are still warming"""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    @property
+    def background_pending(self) -> int:
+        return sum(1 for name, task in self._tasks.items() if not task.done() and not self._steps[name].required)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-step status and timings, in start order"""
+        steps = sorted(self._steps.values(), key=lambda step: (step.started_at is None, step.started_at or 0))
+        return [
+            {
+                "name": step.name,
+                "status": step.status,
+                "required": step.required,
+                "depends_on": list(step.depends_on),
+                "started_ms": round((step.started_at - self._started) * 1000, 1)
+                if step.started_at is not None and self._started is not None else None,
+                "duration_ms": round(step.duration * 1000, 1) if step.duration is not None else None,
+                "error": step.error
+            }
+            for step in steps
+        ]
+
+    def format_report(self) -> List[str]:
+        lines = []
+        for entry in self.report():
+            timing = (f"+{entry['started_ms']:7.1f}ms {entry['duration_ms']:8.1f}ms"
+                      if entry["duration_ms"] is not None else f"{'':19s}")
+            kind = "required" if entry["required"] else "optional"
+            suffix = f"  ({entry['error']})" if entry["error"] else ""
+            lines.append(f"  {entry['name']:28s} {kind:8s} {entry['status']:8s} {timing}{suffix}")
+        return lines
@@ -0,0 +1,178 @@
+"""
+Lazy Router Mounting
+
+Registers routers by module path and URL prefix without importing them. The first
+request under a prefix imports the module (off the event loop), includes its router,
+starts the service behind it and then lets routing proceed as usual, so a cold start
+only pays for the routers and services it actually serves. A service whose startup hook
+fails answers 503 and is retried on the next request under its prefix.
+"""
+
+import time
+import asyncio
+import logging
+import importlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Awaitable[Any]]
+
+
+class LazyRouter:
+    """A router that is imported and included on the first request under its prefix"""
+
+    __slots__ = ("module", "trigger_prefix", "include_prefix", "attribute", "on_load", "on_shutdown",
+                 "loaded", "started", "error", "load_seconds", "lock")
+
+    def __init__(
+        self,
+        module: str,
+        trigger_prefix: str,
+        include_prefix: str = "",
+        attribute: str = "router",
+        on_load: Optional[Hook] = None,
+        on_shutdown: Optional[Hook] = None
+    ):
+        self.module = module
+        self.trigger_prefix = trigger_prefix.rstrip("/")
+        self.include_prefix = include_prefix
+        self.attribute = attribute
+        self.on_load = on_load
+        self.on_shutdown = on_shutdown
+        self.loaded = False
+        self.started = on_load is None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and self.started
+
+    def matches(self, path: str) -> bool:
+        return path == self.trigger_prefix or path.startswith(self.trigger_prefix + "/")
+
+
+class LazyRouterRegistry:
+    """Tracks lazily mounted routers for one application"""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self._routers: List[LazyRouter] = []
+
+    def add(
+        self,
+        module: str,
+        prefix: str,
+        include_prefix: Optional[str] = None,
+        attribute: str = "router",
+        on_load: Optional[Hook] = None,
+        on_shutdown: Optional[Hook] = None
+    ):
+        """
+        Mount `module.<attribute>` lazily. `prefix` is the full URL prefix that triggers
+        loading; `include_prefix` is passed to include_router (defaults to `prefix`).
+        """
+        self._routers.append(LazyRouter(
+            module,
+            prefix,
+            prefix if include_prefix is None else include_prefix,
+            attribute,
+            on_load,
+            on_shutdown
+        ))
+
+    @property
+    def pending(self) -> bool:
+        return any(not router.ready for router in self._routers)
+
+    async def _load(self, router: LazyRouter) -> bool:
+        """Include the router and start its service; returns False if the service failed to start"""
+        async with router.lock:
+            if router.ready:
+                return True
+            started = time.perf_counter()
+            if not router.loaded:
+                module = await asyncio.to_thread(importlib.import_module, router.module)
+                self.app.include_router(getattr(module, router.attribute), prefix=router.include_prefix)
+                # Routes are in place now; never include them twice even if the hook fails
+                router.loaded = True
+                # Regenerate the OpenAPI schema with the new routes
+                self.app.openapi_schema = None
+            if not router.started:
+                try:
+                    await router.on_load()
+                except Exception as e:
+                    router.error = str(e)
+                    logger.error(f"Startup hook for {router.module} failed: {e}")
+                    return False
+                router.started = True
+                router.error = None
+            router.load_seconds = time.perf_counter() - started
+            logger.info(f"Mounted {router.module} at {router.trigger_prefix} in {router.load_seconds * 1000:.0f}ms")
+            return True
+
+    async def ensure_loaded(self, path: str) -> bool:
+        """Load every pending router whose prefix covers `path`; False if one of them failed"""
+        ok = True
+        for router in self._routers:
+            if not router.ready and router.matches(path):
+                ok = await self._load(router) and ok
+        return ok
+
+    async def load_all(self):
+        failed = [router.module for router in self._routers if not router.ready and not await self._load(router)]
+        if failed:
+            raise RuntimeError(f"Lazy router services failed to start: {', '.join(failed)}")
+
+    async def shutdown(self):
+        for router in self._routers:
+            if router.ready and router.on_shutdown is not None:
+                try:
+                    await router.on_shutdown()
+                except Exception as e:
+                    logger.error(f"Shutdown hook for {router.module} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            router.trigger_prefix: {
+                "module": router.module,
+                "loaded": router.loaded,
+                "started": router.started,
+                "error": router.error,
+                "load_ms": round(router.load_seconds * 1000, 1) if router.load_seconds is not None else None
+            }
+            for router in self._routers
+        }
+
+
+class LazyRouterMiddleware:
+    """
+    ASGI middleware that mounts pending routers before a matching request is routed, and
+    answers 503 while the service behind a prefix cannot start
+    """
+
+    def __init__(self, app, registry: LazyRouterRegistry, load_all_paths: tuple = ()):
+        self.app = app
+        self.registry = registry
+        self.load_all_paths = load_all_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.registry.pending:
+            path = scope["path"]
+            if path in self.load_all_paths:
+                # Docs only need the routes, so a service that cannot start does not hide them
+                try:
+                    await self.registry.load_all()
+                except RuntimeError as e:
+                    logger.warning(str(e))
+            elif not await self.registry.ensure_loaded(path):
+                response = JSONResponse(status_code=503, content={"detail": "Service is starting, try again"},
+                                        headers={"Retry-After": "5"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,105 @@
+"""
+Encoded Response Cache
+
+Keeps ready-encoded JSON response bodies for endpoints whose answer only depends on a
+data version (e.g. a catalog fingerprint). Entries carry a strong ETag derived from
+that version, so repeat requests are a dict lookup plus a socket write, and clients
+holding a current copy get a 304.
+"""
+
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple, Optional, Mapping
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+class EncodedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def encode_json(content: Any) -> bytes:
+    """Encode exactly like starlette's JSONResponse.render"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class EncodedResponseCache:
+    """Version-keyed LRU of encoded JSON bodies; a version change drops every entry"""
+
+    def __init__(
+        self,
+        version: Callable[[], str],
+        max_entries: int = 512,
+        cache_control: str = "private, no-cache"
+    ):
+        self._version = version
+        self.max_entries = max_entries
+        self.cache_control = cache_control
+        self._entries: "OrderedDict[Hashable, EncodedBody]" = OrderedDict()
+        self._entries_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> EncodedBody:
+        """Return the encoded body for `key`, calling `build()` only on a miss"""
+        version = self._version()
+        if version != self._entries_version:
+            self._entries.clear()
+            self._entries_version = version
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        body = encode_json(build())
+        body_hash = hashlib.sha256(body).hexdigest()[:16]
+        entry = EncodedBody(body, f'"{version[:16]}-{body_hash}"')
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        build: Callable[[], Any],
+        headers: Optional[Mapping[str, str]] = None
+    ) -> Response:
+        """Serve `key` from cache: 304 when the client's ETag is current, else the bytes"""
+        entry = self.get(key, build)
+        response_headers = {**(headers or {}), "ETag": entry.etag, "Cache-Control": self.cache_control}
+        if etag_matches(request, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=response_headers)
+        return Response(content=entry.body, media_type="application/json", headers=response_headers)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "version": self._entries_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
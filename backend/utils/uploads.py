@@ -0,0 +1,106 @@
+"""
+Upload Helpers
+
+Chunked, hashing writes for multipart uploads and zero-copy publishing of files
+between directories (hardlink when possible, kernel-side copy otherwise).
+"""
+
+import os
+import errno
+import shutil
+import hashlib
+import asyncio
+import logging
+from pathlib import Path
+from typing import NamedTuple
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its size limit while streaming"""
+
+
+class StoredUpload(NamedTuple):
+    path: Path
+    sha256: str
+    size: int
+
+
+async def save_upload_streaming(
+    upload: UploadFile,
+    destination: Path,
+    max_bytes: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> StoredUpload:
+    """
+    Write an UploadFile to `destination` chunk by chunk, hashing as it streams, so
+    the whole file is never held in memory. The partial file is removed on failure.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(destination, "wb") as f:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return StoredUpload(destination, hasher.hexdigest(), size)
+
+
+def _copy_file_range(source: Path, destination: Path) -> bool:
+    """Copy with copy_file_range(2); returns False when the kernel cannot do it"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                return False
+            raise
+    return True
+
+
+def _kernel_copy(source: Path, destination: Path):
+    """Copy without pulling file data through Python buffers"""
+    if not _copy_file_range(source, destination):
+        # shutil.copyfile uses os.sendfile on Linux
+        shutil.copyfile(source, destination)
+
+
+def _publish_sync(source: Path, destination: Path):
+    temp_destination = destination.with_name(f".{destination.name}.tmp")
+    temp_destination.unlink(missing_ok=True)
+    try:
+        os.link(source, temp_destination)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        _kernel_copy(source, temp_destination)
+    # Atomic swap so readers never see a partially written file
+    os.replace(temp_destination, destination)
+
+
+async def publish_file(source: Path, destination: Path):
+    """
+    Make `source` available at `destination` without a user-space copy: a hardlink on
+    the same filesystem, copy_file_range/sendfile across filesystems.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(_publish_sync, source, destination)
@@ -0,0 +1,259 @@
+"""
+Model Registry
+
+Typed, indexed view over `Settings.image_models` and `Settings.video_models`. The raw
+config dicts are parsed once into slotted ModelSpec records with secondary indexes by
+provider, model family, capability flag, quality tier and aspect ratio, and the cheapest/fastest model
+per capability is precomputed, so routing and listing never scan the config dicts.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple
+
+MODEL_KINDS = ("image", "video")
+
+# Boolean config keys that are not named supports_* but still describe a capability
+EXTRA_CAPABILITY_FLAGS = ("uncensored", "nsfw_enabled", "coming_soon")
+
+# Models without an explicit provider (all image models) are served through fal.ai
+DEFAULT_PROVIDER = "fal"
+
+# Quality-tier words that mark a speed-optimised variant
+FAST_TIER_HINTS = ("fast", "turbo", "lite", "schnell")
+
+
+@dataclass(frozen=True, slots=True)
+class ModelSpec:
+    """One generation model from the settings"""
+    model_id: str
+    kind: str
+    provider: str
+    family: str
+    endpoint: str
+    cost_per_generation: float
+    quality: str
+    description: str
+    capabilities: FrozenSet[str]
+    aspect_ratios: Tuple[str, ...] = ()
+    special_features: Tuple[str, ...] = ()
+    recommended_loras: Tuple[str, ...] = ()
+    max_duration: Optional[int] = None
+    max_resolution: Optional[str] = None
+    max_steps: Optional[int] = None
+    default_steps: Optional[int] = None
+    age_restriction: Optional[str] = None
+    config: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}), repr=False, compare=False)
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    @property
+    def speed_rank(self) -> Tuple[int, int, float]:
+        """Lower is faster: speed-tier variants first, then fewer default steps, then cost"""
+        fast_tier = any(hint in self.quality or hint in self.model_id for hint in FAST_TIER_HINTS)
+        return (0 if fast_tier else 1, self.default_steps or 0, self.cost_per_generation)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.model_id, "kind": self.kind, "provider": self.provider, "family": self.family,
+                **self.config}
+
+    @classmethod
+    def from_config(cls, model_id: str, kind: str, config: Mapping[str, Any]) -> "ModelSpec":
+        capabilities = {
+            key for key, value in config.items()
+            if value is True and (key.startswith("supports_") or key in EXTRA_CAPABILITY_FLAGS)
+        }
+        if kind == "video":
+            capabilities.add("video_generation")
+        else:
+            capabilities.add("image_generation")
+        return cls(
+            model_id=model_id,
+            kind=kind,
+            provider=config.get("provider") or DEFAULT_PROVIDER,
+            # Model ids are "<family>-<variant>", e.g. "flux-kontext-pro"
+            family=model_id.split("-", 1)[0],
+            endpoint=config.get("endpoint", ""),
+            cost_per_generation=float(config.get("cost_per_generation", 0)),
+            quality=config.get("quality", ""),
+            description=config.get("description", ""),
+            capabilities=frozenset(capabilities),
+            aspect_ratios=tuple(config.get("aspect_ratios", ())),
+            special_features=tuple(config.get("special_features", ())),
+            recommended_loras=tuple(config.get("recommended_loras", ())),
+            max_duration=config.get("max_duration"),
+            max_resolution=config.get("max_resolution"),
+            max_steps=config.get("max_steps"),
+            default_steps=config.get("default_steps"),
+            age_restriction=config.get("age_restriction"),
+            config=MappingProxyType(dict(config))
+        )
+
+
+def _freeze(index: Dict[str, List[str]]) -> Mapping[str, Tuple[str, ...]]:
+    return MappingProxyType({key: tuple(ids) for key, ids in index.items()})
+
+
+class ModelRegistry:
+    """Immutable registry of ModelSpecs with O(1) indexed lookups"""
+
+    def __init__(self, specs: Iterable[ModelSpec]):
+        models: Dict[str, ModelSpec] = {}
+        by_kind: Dict[str, List[str]] = {kind: [] for kind in MODEL_KINDS}
+        by_provider: Dict[str, List[str]] = {}
+        by_family: Dict[str, List[str]] = {}
+        by_capability: Dict[str, List[str]] = {}
+        by_quality: Dict[str, List[str]] = {}
+        by_aspect_ratio: Dict[str, List[str]] = {}
+        for spec in specs:
+            models[spec.model_id] = spec
+            by_kind.setdefault(spec.kind, []).append(spec.model_id)
+            by_provider.setdefault(spec.provider, []).append(spec.model_id)
+            by_family.setdefault(spec.family, []).append(spec.model_id)
+            by_quality.setdefault(spec.quality, []).append(spec.model_id)
+            for capability in sorted(spec.capabilities):
+                by_capability.setdefault(capability, []).append(spec.model_id)
+            for aspect_ratio in spec.aspect_ratios:
+                by_aspect_ratio.setdefault(aspect_ratio, []).append(spec.model_id)
+
+        self._models: Mapping[str, ModelSpec] = MappingProxyType(models)
+        self._by_kind = _freeze(by_kind)
+        self._by_provider = _freeze(by_provider)
+        self._by_family = _freeze(by_family)
+        self._by_capability = _freeze(by_capability)
+        self._by_quality = _freeze(by_quality)
+        self._by_aspect_ratio = _freeze(by_aspect_ratio)
+
+        # Precomputed answers keyed by (kind or None, capability)
+        cheapest: Dict[Tuple[Optional[str], str], str] = {}
+        fastest: Dict[Tuple[Optional[str], str], str] = {}
+        for capability, model_ids in by_capability.items():
+            for kind in (None, *MODEL_KINDS):
+                candidates = [models[model_id] for model_id in model_ids
+                              if kind is None or models[model_id].kind == kind]
+                # Announced-but-unreleased models are never the routing answer
+                available = [spec for spec in candidates if not spec.supports("coming_soon")] or candidates
+                if not available:
+                    continue
+                cheapest[(kind, capability)] = min(
+                    available, key=lambda spec: (spec.cost_per_generation, spec.model_id)).model_id
+                fastest[(kind, capability)] = min(
+                    available, key=lambda spec: (spec.speed_rank, spec.model_id)).model_id
+        self._cheapest: Mapping[Tuple[Optional[str], str], str] = MappingProxyType(cheapest)
+        self._fastest: Mapping[Tuple[Optional[str], str], str] = MappingProxyType(fastest)
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "ModelRegistry":
+        specs = [ModelSpec.from_config(model_id, "image", config)
+                 for model_id, config in getattr(settings, "image_models", {}).items()]
+        specs += [ModelSpec.from_config(model_id, "video", config)
+                  for model_id, config in getattr(settings, "video_models", {}).items()]
+        return cls(specs)
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._models
+
+    def get(self, model_id: str) -> Optional[ModelSpec]:
+        return self._models.get(model_id)
+
+    def all(self, kind: Optional[str] = None) -> List[ModelSpec]:
+        if kind is None:
+            return list(self._models.values())
+        return self._resolve(self._by_kind.get(kind, ()))
+
+    def _resolve(self, model_ids: Iterable[str]) -> List[ModelSpec]:
+        return [self._models[model_id] for model_id in model_ids]
+
+    def by_provider(self, provider: str) -> List[ModelSpec]:
+        return self._resolve(self._by_provider.get(provider, ()))
+
+    def by_family(self, family: str) -> List[ModelSpec]:
+        return self._resolve(self._by_family.get(family, ()))
+
+    def with_capability(self, capability: str) -> List[ModelSpec]:
+        return self._resolve(self._by_capability.get(capability, ()))
+
+    def by_quality(self, quality: str) -> List[ModelSpec]:
+        return self._resolve(self._by_quality.get(quality, ()))
+
+    def by_aspect_ratio(self, aspect_ratio: str) -> List[ModelSpec]:
+        return self._resolve(self._by_aspect_ratio.get(aspect_ratio, ()))
+
+    @property
+    def providers(self) -> Tuple[str, ...]:
+        return tuple(self._by_provider)
+
+    @property
+    def families(self) -> Tuple[str, ...]:
+        return tuple(self._by_family)
+
+    @property
+    def capabilities(self) -> Tuple[str, ...]:
+        return tuple(self._by_capability)
+
+    @property
+    def quality_tiers(self) -> Tuple[str, ...]:
+        return tuple(self._by_quality)
+
+    def query(
+        self,
+        kind: Optional[str] = None,
+        provider: Optional[str] = None,
+        family: Optional[str] = None,
+        capabilities: Iterable[str] = (),
+        quality: Optional[str] = None,
+        aspect_ratio: Optional[str] = None
+    ) -> List[ModelSpec]:
+        """AND-combined lookup across the indexes, in settings order"""
+        postings: List[Tuple[str, ...]] = []
+        if kind is not None:
+            postings.append(self._by_kind.get(kind, ()))
+        if provider is not None:
+            postings.append(self._by_provider.get(provider, ()))
+        if family is not None:
+            postings.append(self._by_family.get(family, ()))
+        if quality is not None:
+            postings.append(self._by_quality.get(quality, ()))
+        if aspect_ratio is not None:
+            postings.append(self._by_aspect_ratio.get(aspect_ratio, ()))
+        for capability in capabilities:
+            postings.append(self._by_capability.get(capability, ()))
+        if not postings:
+            return self.all()
+
+        postings.sort(key=len)
+        matched: Set[str] = set(postings[0])
+        for posting in postings[1:]:
+            matched.intersection_update(posting)
+        # Keep the order of the smallest posting list, which follows settings order
+        return [self._models[model_id] for model_id in postings[0] if model_id in matched]
+
+    def cheapest(self, capability: str, kind: Optional[str] = None) -> Optional[ModelSpec]:
+        """Lowest-cost released model with `capability`"""
+        model_id = self._cheapest.get((kind, capability))
+        return self._models[model_id] if model_id else None
+
+    def fastest(self, capability: str, kind: Optional[str] = None) -> Optional[ModelSpec]:
+        """Speed-tier / fewest-step released model with `capability`"""
+        model_id = self._fastest.get((kind, capability))
+        return self._models[model_id] if model_id else None
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Process-wide registry, built from the (snapshot-backed) settings on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from settings_snapshot import settings
+                _registry = ModelRegistry.from_settings(settings)
+    return _registry
@@ -0,0 +1,257 @@
+"""
+Settings Snapshot
+
+Fast-start access to `config.settings`. Building `Settings()` validates every nested
+model definition at import time; on cold starts that cost is paid before the first
+request. This module loads a snapshot compiled at build time instead:
+
+- the large static sections (image_models, video_models, ...) are stored one JSON file
+  each and only read and parsed the first time that attribute is accessed;
+- scalar fields keep their runtime semantics: the environment (and .env) is consulted
+  on access, falling back to the class default recorded in the snapshot;
+- anything else, or a snapshot whose fingerprint no longer matches config.py, falls
+  back transparently to the fully validated `config.settings`.
+
+Compile with:  python settings_snapshot.py [output_dir]
+(best effort: a failed compile warns and exits 0, so it never breaks a deploy)
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+
+    def _loads(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    def _loads(data: bytes) -> Any:
+        return json.loads(data)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = Path(__file__).resolve().parent / "config.py"
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent / ".settings_snapshot"
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_VERSION = 1
+
+# Field names that must never be written to disk, whatever their type
+SECRET_MARKERS = ("key", "secret", "token", "password", "credential", "dsn", "uri", "url")
+
+_TRUE_VALUES = {"1", "true", "yes", "on", "y", "t"}
+_FALSE_VALUES = {"0", "false", "no", "off", "n", "f", ""}
+
+
+def config_fingerprint(config_path: Path = CONFIG_PATH) -> str:
+    return hashlib.sha256(config_path.read_bytes()).hexdigest()
+
+
+def _is_secret(name: str) -> bool:
+    lowered = name.lower()
+    return any(marker in lowered for marker in SECRET_MARKERS)
+
+
+def _field_defaults(settings_cls: type) -> Dict[str, Any]:
+    """
+    Class-level defaults of fields read from an env var named after the field, for
+    pydantic v2 or v1 settings classes. Aliased fields are left to config.settings.
+    """
+    fields = getattr(settings_cls, "model_fields", None)
+    if fields is not None:
+        return {
+            name: field.default for name, field in fields.items()
+            if field.alias is None and field.validation_alias is None
+        }
+    return {
+        name: field.default for name, field in getattr(settings_cls, "__fields__", {}).items()
+        if "env" not in field.field_info.extra
+    }
+
+
+def _env_prefix(settings_cls: type) -> str:
+    model_config = getattr(settings_cls, "model_config", None)
+    if isinstance(model_config, dict) and "env_prefix" in model_config:
+        return model_config["env_prefix"] or ""
+    return getattr(getattr(settings_cls, "Config", None), "env_prefix", "") or ""
+
+
+def _scalar_type(value: Any) -> Optional[str]:
+    for type_name, python_type in (("bool", bool), ("int", int), ("float", float), ("str", str)):
+        if isinstance(value, python_type):
+            return type_name
+    return None
+
+
+def compile_snapshot(output_dir: Path = DEFAULT_SNAPSHOT_DIR) -> Dict[str, Any]:
+    """
+    Import and validate config.settings once (build time) and write the snapshot.
+    Compound sections get one file each; scalars only record their class default.
+    """
+    from config import settings
+
+    values = settings.model_dump() if hasattr(settings, "model_dump") else settings.dict()
+    defaults = _field_defaults(type(settings))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sections: Dict[str, str] = {}
+    scalars: Dict[str, Dict[str, Any]] = {}
+    for name, value in values.items():
+        if _is_secret(name):
+            continue
+        if isinstance(value, (dict, list)):
+            filename = f"{name}.json"
+            (output_dir / filename).write_text(json.dumps(value, separators=(",", ":")))
+            sections[name] = filename
+            continue
+        default = defaults.get(name)
+        type_name = _scalar_type(default) if default is not None else None
+        if type_name is not None:
+            scalars[name] = {"default": default, "type": type_name}
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": config_fingerprint(),
+        "env_prefix": _env_prefix(type(settings)),
+        "sections": sections,
+        "scalars": scalars
+    }
+    temp_path = output_dir / f"{MANIFEST_NAME}.tmp"
+    temp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(temp_path, output_dir / MANIFEST_NAME)
+    return manifest
+
+
+def _coerce(raw: str, type_name: str) -> Any:
+    if type_name == "bool":
+        lowered = raw.strip().lower()
+        if lowered in _TRUE_VALUES:
+            return True
+        if lowered in _FALSE_VALUES:
+            return False
+        raise ValueError(f"Invalid boolean value: {raw!r}")
+    if type_name == "int":
+        return int(raw)
+    if type_name == "float":
+        return float(raw)
+    return raw
+
+
+class LazySettings:
+    """Attribute-compatible stand-in for config.settings backed by the snapshot"""
+
+    def __init__(self, snapshot_dir: Path = DEFAULT_SNAPSHOT_DIR, env_file: str = ".env"):
+        self._snapshot_dir = Path(snapshot_dir)
+        self._env_file = env_file
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_loaded = False
+        self._environment: Optional[Dict[str, str]] = None
+        self._values: Dict[str, Any] = {}
+        self._full_settings: Any = None
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Optional[Dict[str, Any]]:
+        if self._manifest_loaded:
+            return self._manifest
+        with self._lock:
+            if not self._manifest_loaded:
+                self._manifest = self._read_manifest()
+                self._manifest_loaded = True
+        return self._manifest
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        manifest_path = self._snapshot_dir / MANIFEST_NAME
+        try:
+            manifest = _loads(manifest_path.read_bytes())
+        except FileNotFoundError:
+            logger.info("No settings snapshot found, using config.settings")
+            return None
+        except Exception as e:
+            logger.warning(f"Unreadable settings snapshot, using config.settings: {e}")
+            return None
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            logger.warning("Settings snapshot format is outdated, using config.settings")
+            return None
+        if CONFIG_PATH.exists() and manifest.get("fingerprint") != config_fingerprint():
+            logger.warning("Settings snapshot is stale (config.py changed), using config.settings")
+            return None
+        return manifest
+
+    def _environ(self) -> Dict[str, str]:
+        """Process environment over .env, keyed case-insensitively like BaseSettings"""
+        if self._environment is None:
+            environment: Dict[str, str] = {}
+            if self._env_file and os.path.exists(self._env_file):
+                try:
+                    from dotenv import dotenv_values
+                    environment.update({key.lower(): value for key, value in dotenv_values(self._env_file).items()
+                                        if value is not None})
+                except ImportError:
+                    pass
+            environment.update({key.lower(): value for key, value in os.environ.items()})
+            self._environment = environment
+        return self._environment
+
+    def _full(self) -> Any:
+        if self._full_settings is None:
+            with self._lock:
+                if self._full_settings is None:
+                    from config import settings
+                    self._full_settings = settings
+        return self._full_settings
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        values = self._values
+        if name in values:
+            return values[name]
+
+        manifest = self._load_manifest()
+        if manifest is None:
+            return getattr(self._full(), name)
+
+        section_file = manifest["sections"].get(name)
+        if section_file is not None:
+            value = _loads((self._snapshot_dir / section_file).read_bytes())
+        elif name in manifest["scalars"]:
+            scalar = manifest["scalars"][name]
+            raw = self._environ().get(f"{manifest.get('env_prefix', '')}{name}".lower())
+            value = scalar["default"] if raw is None else _coerce(raw, scalar["type"])
+        else:
+            return getattr(self._full(), name)
+
+        values[name] = value
+        return value
+
+    def section(self, name: str) -> Any:
+        """Explicit per-section access (same as attribute access)"""
+        return getattr(self, name)
+
+    @property
+    def from_snapshot(self) -> bool:
+        return self._load_manifest() is not None
+
+
+# Global lazy settings instance
+settings = LazySettings(
+    snapshot_dir=Path(os.getenv("SETTINGS_SNAPSHOT_DIR", str(DEFAULT_SNAPSHOT_DIR)))
+)
+
+
+if __name__ == "__main__":
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SNAPSHOT_DIR
+    try:
+        written = compile_snapshot(target)
+    except Exception as e:
+        # Without a snapshot the app falls back to config.settings at runtime
+        print(f"Warning: settings snapshot not written, using config.settings at runtime: {e!r}",
+              file=sys.stderr)
+        sys.exit(0)
+    print(f"Wrote settings snapshot to {target}: "
+          f"{len(written['sections'])} sections, {len(written['scalars'])} scalars")